@@ -1,33 +1,685 @@
-from flask import Flask, render_template, request, jsonify, session, send_file, after_this_request, make_response
+from flask import Flask, render_template, request, jsonify, session, Response, g
 from werkzeug.utils import secure_filename
 import os
+import json
+import time
+import itertools
+import zlib
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
+from frame_cache import FrameCache
+from working_store import (working_filename, write_working_file, read_working_file, iter_working_file, file_version,
+                           working_schema, working_row_count, read_working_columns, read_working_rows)
+from ingest import ingest_csv
+from cleaning import DateParser
+from column_profile import ColumnProfile
+from classify import suggest_classification
+from row_index import RowHashIndex, SpilledRowHashIndex
+from jobs import JobQueue, JobLimitError, SharedJobStore
+from metrics import Metrics
+from sessions import ServerSideSessionInterface, SessionStore, SharedSessionStore, Sweeper
+from locks import SessionLocks, FileSessionLocks, LockTimeout
+import parallel
+from pipeline import Plan
+from chunked import chunked_operation, run_chunked, index_working_file, OperationError
+from operations import (STEP_OPERATIONS, FRAME_OPERATIONS, apply_operation, operation_columns, name_empty_steps, name_format_steps,
+                        format_steps, empty_steps, date_empty_steps, standardization_steps)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'csv'}
+app.config['INGEST_CHUNK_ROWS'] = 100000  # Rows parsed at a time when converting an upload
+app.config['FRAME_CACHE_MAX_BYTES'] = 1024 * 1024 * 1024  # In-memory budget for working DataFrames
+app.config['DOWNLOAD_CHUNK_ROWS'] = 50000  # Rows serialized at a time when streaming a download
+app.config['MAX_PREVIEW_ROWS'] = 500  # Largest row window a single /rows request may return
+app.config['MAX_UNIQUE_VALUES'] = 1000  # Most distinct values /get-unique-values returns per column
+app.config['JOB_WORKERS'] = 2  # Threads running cleaning operations submitted with ?async=true
+app.config['JOBS_PER_SESSION'] = 1  # Unfinished background jobs a session may have at once
+app.config['JOB_RETENTION_SECONDS'] = 600  # How long a finished job's result can be collected
+app.config['COLUMN_WORKERS'] = os.cpu_count()  # Threads that transform the columns of one operation in parallel
+app.config['PARALLEL_MIN_ROWS'] = 50000  # Frames with fewer rows transform their columns one at a time
+app.config['METRICS_ENABLED'] = False  # Time request phases for Server-Timing headers and /metrics
+app.config['SESSION_TTL_SECONDS'] = 3600  # Idle time after which a session and its working file are removed
+app.config['SESSION_SWEEP_SECONDS'] = 60  # How often expired sessions and abandoned files are cleaned up
+app.config['UPLOAD_DISK_QUOTA_BYTES'] = 10 * 1024 * 1024 * 1024  # Disk all working files together may use
+app.config['SESSION_EVICT_IDLE_SECONDS'] = 300  # Sessions idle this long may be evicted to make room for an upload
+app.config['SESSION_LOCK_TIMEOUT_SECONDS'] = 30  # How long a change waits for other requests of its session to finish
+app.config['FRAME_WRITE_BACK_SECONDS'] = 10  # Changes held in memory longer than this are written to the working file
+app.config['SHARED_WORKING_STORE'] = False  # Publish every change so several worker processes can serve a session
+app.config['SHARED_SESSION_INDEX'] = 'sessions.sqlite'  # Session database the worker processes share
+app.config['LAZY_PIPELINE'] = False  # Record row-local cleaning steps and apply them once
+app.config['OUT_OF_CORE_MIN_BYTES'] = 2 * 1024 * 1024 * 1024  # Working files this large are cleaned a chunk at a time, never loaded whole
+app.config['OUT_OF_CORE_CHUNK_ROWS'] = 65536  # Rows in memory at a time when cleaning a working file chunk by chunk
 app.secret_key = 'your-secret-key-here'  # Change this to a secure random key
 
+# Session values stay on the server, the cookie only carries a signed session id
+session_store = SessionStore(app.config['SESSION_TTL_SECONDS'])
+app.session_interface = ServerSideSessionInterface(session_store)
+
+# Requests that change a session's data run one at a time per session
+session_locks = SessionLocks()
+
+def use_shared_store(index_path, lock_folder=None):
+    """Let several worker processes (e.g. gunicorn workers) serve any session.
+
+    Sessions move to a SQLite file all workers open, and every change to
+    a working file is published at once as a new version of the file, so
+    any worker can memory-map the latest version instead of one worker
+    holding unsaved changes in memory. Session locks become lock files in
+    lock_folder, next to the session database unless given. Job state is
+    kept in the session database too, so any worker can answer a poll.
+    """
+    global session_store, session_locks
+    app.config['SHARED_WORKING_STORE'] = True
+    session_store = SharedSessionStore(index_path, app.config['SESSION_TTL_SECONDS'])
+    app.session_interface = ServerSideSessionInterface(session_store)
+    job_queue.store = SharedJobStore(index_path)
+    if lock_folder is None:
+        lock_folder = os.path.join(os.path.dirname(os.path.abspath(index_path)), 'session_locks')
+    session_locks = FileSessionLocks(lock_folder)
+
+# The frame cache hands out shallow copies, which is only safe with copy-on-write
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 dataClassifications = ["Non-categorical", "Categorical", "Numerical", "Date"]
 
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+metrics = Metrics()
+
+def write_and_count(filepath, df):
+    """write_working_file, counting the bytes written"""
+    with metrics.phase('write'):
+        write_working_file(filepath, df)
+    metrics.count('bytes_written', os.path.getsize(filepath))
+
+frame_cache = FrameCache(write_and_count, app.config['FRAME_CACHE_MAX_BYTES'])
+
+parallel.configure(app.config['COLUMN_WORKERS'], app.config['PARALLEL_MIN_ROWS'])
+
+job_queue = JobQueue(app.config['JOB_WORKERS'], app.config['JOB_RETENTION_SECONDS'])
+
+# Steps recorded in lazy mode, keyed by working file path, not yet applied to the data
+lazy_plans = {}
+
+# Date formats and parsed date strings remembered per working file path
+date_parsers = {}
+
+# Column statistics of each working file, keyed by working file path
+column_profiles = {}
+
+# Row hashes of each working file, keyed by working file path
+row_indexes = {}
+
+# Version of each working file the state above was derived from, keyed by working file path
+synced_versions = {}
+
+# Number of the last change made to each working file, keyed by working file path
+edit_versions = {}
+edit_numbers = itertools.count(1)
+
+# Odd while a request replaces a working file's base frame or lazy steps, keyed by working file path
+frame_generations = {}
+
+def forget_working_file(filepath):
+    """Drop everything held in memory for a working file"""
+    frame_cache.discard(filepath)
+    lazy_plans.pop(filepath, None)
+    date_parsers.pop(filepath, None)
+    column_profiles.pop(filepath, None)
+    row_indexes.pop(filepath, None)
+    synced_versions.pop(filepath, None)
+    edit_versions.pop(filepath, None)
+
+def remove_working_file(filepath):
+    """Forget a working file and delete it from disk"""
+    forget_working_file(filepath)
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+def remove_session_files(values):
+    """Remove the working file of a session that has ended"""
+    if values.get('current_file'):
+        remove_working_file(os.path.join(app.config['UPLOAD_FOLDER'], values['current_file']))
+
+def upload_folder_bytes():
+    folder = app.config['UPLOAD_FOLDER']
+    with os.scandir(folder) as entries:
+        return sum(entry.stat().st_size for entry in entries if entry.is_file())
+
+def make_room(needed, keep):
+    """Evict idle sessions, least recently seen first, until needed more bytes fit in the disk quota"""
+    while upload_folder_bytes() + needed > app.config['UPLOAD_DISK_QUOTA_BYTES']:
+        evicted = session_store.evict_idle(app.config['SESSION_EVICT_IDLE_SECONDS'], limit=1, keep=keep)
+        if not evicted:
+            return False
+        remove_session_files(evicted[0])
+    return True
+
+def sweep_sessions():
+    """Remove expired sessions and any file under UPLOAD_FOLDER no live session owns.
+
+    Unowned files are only removed once they are older than the session TTL,
+    so an upload still being written is never taken.
+    """
+    for values in session_store.sweep():
+        remove_session_files(values)
+    folder = app.config['UPLOAD_FOLDER']
+    if not os.path.isdir(folder):
+        return
+    owned = {values.get('current_file') for values in session_store.values()}
+    cutoff = time.time() - app.config['SESSION_TTL_SECONDS']
+    with os.scandir(folder) as entries:
+        abandoned = [entry.path for entry in entries
+                     if entry.is_file() and entry.name not in owned and entry.stat().st_mtime < cutoff]
+    for filepath in abandoned:
+        remove_working_file(filepath)
+    if app.config['SHARED_WORKING_STORE']:
+        session_locks.sweep(app.config['SESSION_TTL_SECONDS'])
+
+# Started by start_app() in the process that serves requests
+sweeper = None
+
+def start_app(workers=1):
+    """Apply the deployment's settings and start background work, once per serving process.
+
+    Called by gunicorn.conf.py in every worker and below for the development
+    server, rather than at import, so settings changed after import apply:
+    DATA_SWEEP_<NAME> environment variables override app.config[NAME]. One
+    of several worker processes always uses the shared store, since none of
+    them may keep sessions or unsaved changes to itself.
+    """
+    global sweeper
+    if sweeper is not None:
+        return
+    app.config.from_prefixed_env('DATA_SWEEP')
+    if workers > 1:
+        app.config['SHARED_WORKING_STORE'] = True
+    if app.config['SHARED_WORKING_STORE']:
+        use_shared_store(app.config['SHARED_SESSION_INDEX'])
+    sweeper = Sweeper(sweep_sessions, app.config['SESSION_SWEEP_SECONDS'])
+    sweeper.start()
+    if not app.config['SHARED_WORKING_STORE']:
+        # Changes held in memory reach the working file within seconds, so
+        # a restart loses little. The shared store writes them at once
+        interval = app.config['FRAME_WRITE_BACK_SECONDS']
+        Sweeper(lambda: frame_cache.write_back(interval), interval, name='frame-write-back').start()
+
+def working_version(filepath):
+    """Version of the working file cached frames must match, None when this process holds the latest"""
+    return file_version(filepath) if app.config['SHARED_WORKING_STORE'] else None
+
+def data_version(filepath):
+    """Version of a working file's data, sent as the ETag clients return in If-Match with a change"""
+    if app.config['SHARED_WORKING_STORE']:
+        version = file_version(filepath)
+        return None if version is None else '-'.join(f'{part:x}' for part in version)
+    if not os.path.exists(filepath):
+        return None
+    return str(edit_versions.setdefault(filepath, next(edit_numbers)))
+
+def new_data_version(filepath):
+    edit_versions[filepath] = next(edit_numbers)
+
+def sync_working_file(filepath):
+    """Drop what this process derived from a working file another worker has since replaced"""
+    version = file_version(filepath)
+    if synced_versions.get(filepath, version) != version:
+        forget_working_file(filepath)
+    synced_versions[filepath] = version
+
+def out_of_core(filepath):
+    """Whether a working file is too large to load, so it is only ever read a chunk or a few columns at a time"""
+    limit = app.config['OUT_OF_CORE_MIN_BYTES']
+    return limit is not None and os.path.exists(filepath) and os.path.getsize(filepath) >= limit
+
+def working_columns(filepath):
+    if out_of_core(filepath):
+        return working_schema(filepath).names
+    return load_base_df(filepath).columns.tolist()
+
+def load_base_df(filepath):
+    """Return the working dataframe as last saved, parsing the file only on a cache miss"""
+    version = working_version(filepath)
+    df = frame_cache.get(filepath, version)
+    if df is None:
+        with metrics.phase('load'):
+            df = read_working_file(filepath)
+        metrics.count('bytes_read', os.path.getsize(filepath))
+        frame_cache.put(filepath, df, dirty=False, version=version)
+    return df
+
+@contextmanager
+def changing_frame(filepath):
+    """Mark a working file's base frame and lazy steps as changing, for readers that do not take the session lock"""
+    frame_generations[filepath] = frame_generations.get(filepath, 0) + 1
+    try:
+        yield
+    finally:
+        frame_generations[filepath] += 1
+
+def frame_snapshot(filepath):
+    """The base dataframe and a copy of its pending lazy steps, as they were at one moment.
+
+    Reads such as /rows do not wait for the session lock, so a change may
+    apply the steps to the base frame while they read. They read again
+    until no change ran meanwhile, like a seqlock.
+    """
+    while True:
+        generation = frame_generations.get(filepath, 0)
+        if generation % 2 == 0:
+            plan = lazy_plans.get(filepath)
+            plan = Plan(plan.steps) if plan else None
+            df = load_base_df(filepath)
+            if frame_generations.get(filepath, 0) == generation:
+                return df, plan
+        time.sleep(0.001)
+
+def load_working_df(filepath):
+    """Return the working dataframe with any pending lazy steps applied and saved"""
+    df = load_base_df(filepath)
+    plan = lazy_plans.get(filepath)
+    if plan:
+        original = df
+        with metrics.phase('transform'):
+            df = plan.execute(df.copy(deep=False))
+        metrics.count('rows_processed', len(original))
+        with changing_frame(filepath):
+            # The steps were counted as a change when they were recorded
+            save_working_df(filepath, df, new_version=False)
+            lazy_plans.pop(filepath, None)
+        update_row_index(filepath, original, df, [step.column for step in plan.optimized()])
+    return df
+
+def load_working_columns(filepath, columns):
+    """Return the current values of some columns without committing pending lazy steps"""
+    if out_of_core(filepath) and not lazy_plans.get(filepath):
+        return read_working_columns(filepath, columns)
+    df, plan = frame_snapshot(filepath)
+    if plan:
+        with metrics.phase('transform'):
+            return plan.execute(df, columns=columns)
+    return df
+
+def save_working_df(filepath, df, new_version=True):
+    """Keep the modified dataframe in memory; it is written back on eviction, download or after FRAME_WRITE_BACK_SECONDS.
+
+    With a shared working store it is published as a new version of the
+    working file straight away, and the frame kept as a clean copy of it.
+    """
+    if new_version:
+        new_data_version(filepath)
+    with metrics.phase('save'):
+        if app.config['SHARED_WORKING_STORE']:
+            write_and_count(filepath, df)
+            version = synced_versions[filepath] = file_version(filepath)
+            frame_cache.put(filepath, df, dirty=False, version=version)
+        else:
+            frame_cache.put(filepath, df, dirty=True)
+
+def working_profile(filepath):
+    """Column profile of the working data, built from the data if none is held"""
+    profile = column_profiles.get(filepath)
+    if profile is None:
+        if out_of_core(filepath):
+            index_out_of_core(filepath)
+            return column_profiles[filepath]
+        profile = column_profiles[filepath] = ColumnProfile.of(load_working_columns(filepath, None))
+    return profile
+
+def column_scan(filepath):
+    """Reads some columns of a working file a chunk at a time, when it is too large to load them whole"""
+    if out_of_core(filepath) and not lazy_plans.get(filepath):
+        return lambda columns: iter_working_file(filepath, app.config['OUT_OF_CORE_CHUNK_ROWS'], columns=columns)
+    return None
+
+def column_stats(filepath, columns):
+    """Profile stats of some columns, rescanning only those changed since they were last read"""
+    return working_profile(filepath).stats(columns, lambda stale: load_working_columns(filepath, stale),
+                                           scan=column_scan(filepath))
+
+def working_row_index(filepath):
+    """Row hashes of the working data, hashed from the data if none are held"""
+    # The index follows the data only as lazy steps are applied
+    if lazy_plans.get(filepath):
+        load_working_df(filepath)
+    row_index = row_indexes.get(filepath)
+    if row_index is None:
+        if out_of_core(filepath):
+            index_out_of_core(filepath)
+            return row_indexes[filepath]
+        row_index = row_indexes[filepath] = RowHashIndex.of(load_working_df(filepath))
+    elif isinstance(row_index, SpilledRowHashIndex) and not out_of_core(filepath):
+        # Hashes spilled while the file was written are loaded once it fits in memory
+        row_index = row_indexes[filepath] = row_index.load()
+    return row_index
+
+def working_duplicate_count(filepath):
+    """Rows of the working data identical to an earlier row, comparing only rows whose hashes repeat"""
+    row_index = working_row_index(filepath)
+    if out_of_core(filepath):
+        return row_index.duplicate_count(lambda positions: read_working_rows(filepath, positions))
+    df = load_working_df(filepath)
+    return row_index.duplicate_count(lambda positions: df.iloc[positions])
+
+def index_out_of_core(filepath):
+    """Profile and hash the rows of a working file too large to load, a chunk at a time"""
+    with metrics.phase('load'):
+        column_profiles[filepath], row_indexes[filepath] = index_working_file(
+            filepath, app.config['OUT_OF_CORE_CHUNK_ROWS'])
+
+def update_row_index(filepath, original, df, columns):
+    row_index = row_indexes.get(filepath)
+    if isinstance(row_index, SpilledRowHashIndex):
+        # Spilled hashes are not updated in place, and are rehashed when next needed
+        row_indexes.pop(filepath, None)
+    elif row_index is not None:
+        row_index.update(original, df, columns)
+
+def update_profile(filepath, df, columns):
+    profile = column_profiles.get(filepath)
+    if profile is not None:
+        profile.update(df, columns)
+
+def record_change(filepath, original, df, columns):
+    """Update the profile and row hashes for the columns an operation rewrote, not the whole dataframe"""
+    update_row_index(filepath, original, df, columns)
+    update_profile(filepath, df, columns)
+
+def run_steps(filepath, steps):
+    """Apply cleaning steps to the working data, or record them when running lazily"""
+    # Pending steps would only exist in this process, so a shared store applies them at once
+    if app.config['LAZY_PIPELINE'] and not app.config['SHARED_WORKING_STORE'] and not out_of_core(filepath):
+        df = load_base_df(filepath)
+        missing = [step.column for step in steps if step.column not in df.columns]
+        if missing:
+            raise KeyError(missing[0])
+        with changing_frame(filepath):
+            plan = lazy_plans.setdefault(filepath, Plan())
+            plan.extend(steps)
+        new_data_version(filepath)
+        row_count = plan.row_count(df)
+        if filepath in column_profiles:
+            column_profiles[filepath].mark_changed([step.column for step in steps], row_count)
+        return {'rowCount': row_count, 'columnCount': len(df.columns)}
+
+    original = load_working_df(filepath)
+    with metrics.phase('transform'):
+        df = Plan(steps).execute(original.copy(deep=False))
+    metrics.count('rows_processed', len(original))
+    save_working_df(filepath, df)
+    record_change(filepath, original, df, list(dict.fromkeys(step.column for step in steps)))
+    return frame_counts(df)
+
+def transform(df, name, data, **kwargs):
+    """apply_operation, timed and counted for the metrics"""
+    with metrics.phase('transform'):
+        result = apply_operation(df, name, data, **kwargs)
+    metrics.count('rows_processed', len(df))
+    return result
+
+def frame_counts(df):
+    """Row and column counts returned by routes instead of a rendered table"""
+    return {'rowCount': len(df), 'columnCount': len(df.columns)}
+
+def csv_chunks(frames):
+    """Serialize dataframes to CSV one chunk at a time, with the header on the first"""
+    header = True
+    for frame in frames:
+        with metrics.phase('serialize'):
+            chunk = frame.to_csv(index=False, header=header).encode('utf-8')
+        metrics.count('rows_processed', len(frame))
+        yield chunk
+        header = False
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into a single gzip stream"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def run_pipeline(filepath, operations, job=None):
+    """Apply a list of operations to the working data, returning the response body and status"""
+    if out_of_core(filepath):
+        return run_chunked_pipeline(filepath, operations, job=job)
+
+    # Run every operation on one in-memory frame, read once and saved once.
+    # Nothing is saved if any operation fails.
+    df = load_working_df(filepath)
+    date_parser = date_parsers.get(filepath, DateParser()).copy()
+    row_index = working_row_index(filepath).copy()
+    results = []
+    # Columns rewritten by any step, in order, so the profile rescans only those
+    touched = {}
+    for index, op in enumerate(operations):
+        name = op['operation']
+        payload = op.get('payload', {})
+        started = time.perf_counter()
+        if job is not None:
+            job.report(index / len(operations), f'Running {name}')
+        try:
+            original = df
+            df = transform(df, name, payload, date_parser=date_parser, row_index=row_index)
+            row_index.update(original, df, operation_columns(name, payload))
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'{name} failed: {str(e)}',
+                'failedStep': index,
+                'steps': results
+            }, 400
+        touched.update(dict.fromkeys(operation_columns(name, payload)))
+        results.append({
+            'operation': name,
+            'durationMs': round((time.perf_counter() - started) * 1000, 3),
+            **frame_counts(df)
+        })
+
+    if job is not None:
+        # A job cancelled while its last operation ran stops here, before anything is saved
+        job.report(1.0, 'Saving')
+    save_working_df(filepath, df)
+    date_parsers[filepath] = date_parser
+    row_indexes[filepath] = row_index
+    update_profile(filepath, df, list(touched))
+
+    return {
+        'success': True,
+        'steps': results,
+        'columns': df.columns.tolist(),
+        **frame_counts(df)
+    }, 200
+
+def run_chunked_pipeline(filepath, operations, job=None):
+    """run_pipeline for a working file too large to load, streaming it through the operations a chunk at a time.
+
+    Operations that need statistics of whole columns (mean, median and
+    mode fills, deduplication) get a first pass over the file to gather
+    them, unless the sketches in the file's profile already give them.
+    Nothing is saved if any operation fails.
+    """
+    # Anything changed in memory is on disk before the file is read
+    if lazy_plans.get(filepath):
+        load_working_df(filepath)
+    frame_cache.flush(filepath)
+
+    date_parser = date_parsers.get(filepath, DateParser()).copy()
+    report = None if job is None else job.report
+    rows = working_row_count(filepath)
+    try:
+        chunked = [chunked_operation(op['operation'], op.get('payload', {}), date_parser) for op in operations]
+        # The first operation sees the file as profiled, so its statistics may need no pass
+        if chunked and filepath in column_profiles:
+            chunked[0].use_profile(column_profiles[filepath])
+        with metrics.phase('transform'):
+            result = run_chunked(filepath, chunked, app.config['OUT_OF_CORE_CHUNK_ROWS'], report=report)
+    except OperationError as e:
+        return {
+            'success': False,
+            'error': f'{operations[e.index]["operation"]} failed: {str(e)}',
+            'failedStep': e.index,
+            'steps': []
+        }, 400
+    metrics.count('rows_processed', rows)
+    metrics.count('bytes_written', os.path.getsize(filepath))
+
+    # The file was replaced, and what was held for it is rebuilt from the pass that wrote it
+    frame_cache.discard(filepath)
+    new_data_version(filepath)
+    if app.config['SHARED_WORKING_STORE']:
+        synced_versions[filepath] = file_version(filepath)
+    date_parsers[filepath] = date_parser
+    column_profiles[filepath] = result.profile
+    row_indexes[filepath] = result.row_index
+
+    counts = {'rowCount': result.row_count, 'columnCount': len(result.columns)}
+    return {
+        'success': True,
+        'steps': [{'operation': op['operation']} for op in operations],
+        'columns': result.columns,
+        **counts
+    }, 200
+
+def run_operations(filepath, operations):
+    """Respond to a route with run_pipeline, for working files too large to load"""
+    result, status = run_pipeline(filepath, operations)
+    return jsonify(result), status
+
+def async_requested():
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+def pipeline_job(filepath, operations, owner, route='job'):
+    """Work for a background job that runs operations like /apply-pipeline"""
+    measured = app.config['METRICS_ENABLED']
+    timeout = app.config['SESSION_LOCK_TIMEOUT_SECONDS']
+    def work(job):
+        # Jobs are measured apart from the request that queued them
+        if measured:
+            metrics.start(f'{route} (job)')
+        try:
+            # A job changes the data like a request, so it takes its session's lock
+            with session_locks.hold(owner, timeout):
+                if app.config['SHARED_WORKING_STORE']:
+                    sync_working_file(filepath)
+                result, status = run_pipeline(filepath, operations, job=job)
+        except LockTimeout:
+            # Fails like a request that finds its session busy, rather than with the session id
+            raise ValueError('Another request for this file is still running') from None
+        finally:
+            if measured:
+                metrics.finish()
+        if status != 200:
+            job.result = result
+            raise ValueError(result['error'])
+        return result
+    return work
+
+def submit_operations(filepath, operations):
+    """Run operations in a background job and point the client at where to poll for it"""
+    try:
+        job = job_queue.submit(session.sid, pipeline_job(filepath, operations, session.sid, request.url_rule.rule),
+                               limit=app.config['JOBS_PER_SESSION'])
+    except JobLimitError as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+    response = jsonify({'success': True, 'jobId': job.id, 'status': job.status})
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-def check_duplicates(df):
-    """Check for duplicate rows in the dataframe"""
-    duplicate_count = df.duplicated().sum()
-    return bool(duplicate_count), duplicate_count
+def changes_data():
+    """Whether a request may change its session's data, and so must not overlap another that does"""
+    if request.endpoint == 'get_job':
+        # Cancelling a job must not wait for the job it cancels
+        return False
+    # Downloads apply pending lazy steps and remove the working file
+    return request.method != 'GET' or request.endpoint == 'download_file'
+
+@app.before_request
+def start_metrics():
+    if app.config['METRICS_ENABLED'] and request.url_rule is not None:
+        g.timing = metrics.start(request.url_rule.rule)
+
+@app.before_request
+def lock_session():
+    """Wait for the session's other changes, so concurrent requests (e.g. a double click) cannot interleave"""
+    # A session without a cookie yet has no other requests
+    if session.new or not changes_data():
+        return None
+    with metrics.phase('lock'):
+        locked = session_locks.acquire(session.sid, app.config['SESSION_LOCK_TIMEOUT_SECONDS'])
+    if not locked:
+        return jsonify({'success': False, 'error': 'Another request for this file is still running'}), 409
+    g.session_lock = session.sid
+    # Pick up what the requests waited for saved in the session
+    app.session_interface.refresh(session)
+    return None
+
+@app.before_request
+def sync_session_file():
+    if app.config['SHARED_WORKING_STORE'] and 'current_file' in session:
+        sync_working_file(os.path.join(app.config['UPLOAD_FOLDER'], session['current_file']))
 
-def remove_duplicate_rows(df):
-    """Remove duplicate rows from the dataframe"""
-    original_rows = len(df)
-    df = df.drop_duplicates()
-    rows_removed = original_rows - len(df)
-    return df, rows_removed
+@app.before_request
+def check_data_version():
+    """Reject a change made to a version of the data another request has since replaced"""
+    if 'session_lock' not in g or not request.if_match or 'current_file' not in session:
+        return None
+    version = data_version(os.path.join(app.config['UPLOAD_FOLDER'], session['current_file']))
+    if version is not None and not request.if_match.contains(version):
+        return jsonify({'success': False, 'error': 'The data was changed by another request, reload it and try again'}), 412
+    return None
+
+@app.after_request
+def tag_data_version(response):
+    if 'current_file' in session:
+        version = data_version(os.path.join(app.config['UPLOAD_FOLDER'], session['current_file']))
+        if version is not None:
+            response.set_etag(version)
+    return response
+
+@app.teardown_request
+def unlock_session(exc):
+    sid = g.pop('session_lock', None)
+    if sid is not None:
+        session_locks.release(sid)
+
+def keep_session_lock():
+    """Take the request's session lock past its teardown, for a body streamed after it.
+
+    Returns the function that releases the lock, which does so only the first time it is called.
+    """
+    sid = g.pop('session_lock', None)
+    released = []
+
+    def release():
+        if sid is not None and not released:
+            released.append(sid)
+            session_locks.release(sid)
+    return release
+
+@app.after_request
+def finish_metrics(response):
+    timing = g.pop('timing', None)
+    if timing is None:
+        return response
+    response.headers['Server-Timing'] = timing.server_timing()
+    if response.is_streamed:
+        # Streamed bodies are produced after this, so their phases are added
+        # to the totals once the response is closed
+        response.call_on_close(metrics.finish)
+    else:
+        metrics.finish()
+    return response
 
 @app.route('/')
 def index():
@@ -44,38 +696,49 @@ def upload_file():
         return jsonify({'error': 'No selected file'}), 400
 
     if file and allowed_file(file.filename):
+        if not make_room(request.content_length or 0, keep=session.sid):
+            return jsonify({'error': 'The server is out of space for uploads, please try again later'}), 507
+
         # Create a unique filename using timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
         filename = timestamp + secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        # Store the filename in session
-        session['current_file'] = filename
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], working_filename(filename))
 
         try:
-            # Read CSV using pandas
-            df = pd.read_csv(filepath)
-            if df.empty:
+            # Parse the upload stream chunk by chunk straight into the typed
+            # working file that later routes memory-map, collecting duplicate
+            # and missing value statistics on the way
+            with metrics.phase('ingest'):
+                result = ingest_csv(file.stream, filepath, chunksize=app.config['INGEST_CHUNK_ROWS'])
+            metrics.count('bytes_read', request.content_length or 0)
+            metrics.count('bytes_written', os.path.getsize(filepath))
+            metrics.count('rows_processed', result.row_count)
+            if result.row_count == 0:
+                os.remove(filepath)
                 return jsonify({'error': 'The CSV file is empty'}), 400
 
-            # Store the dataframe in the session
-            session['df'] = df.to_json()
+            # Store the working filename in session, dropping the file it replaces
+            previous = session.get('current_file')
+            session['current_file'] = working_filename(filename)
+            session.pop('classifications', None)
+            if previous and previous != session['current_file']:
+                remove_working_file(os.path.join(app.config['UPLOAD_FOLDER'], previous))
 
-            # Get column names
-            columns = df.columns.tolist()
-            # Convert DataFrame to HTML table
-            table_html = df.to_html(classes='table table-striped', index=False)
+            # Forget anything held for an earlier file of the same name
+            forget_working_file(filepath)
+            column_profiles[filepath] = result.profile
+            row_indexes[filepath] = result.row_index
 
-            # Check for duplicates
-            has_duplicates, duplicate_count = check_duplicates(df)
+            duplicate_count = result.duplicate_count
 
             return jsonify({
                 'filename': filename,
-                'columns': columns,
-                'table': table_html,
+                'columns': result.columns,
+                'rowCount': result.row_count,
+                'columnCount': len(result.columns),
+                'emptyCounts': result.null_counts,
                 'success': True,
-                'hasDuplicates': has_duplicates,
+                'hasDuplicates': duplicate_count > 0,
                 'duplicateCount': int(duplicate_count)
             })
         except Exception as e:
@@ -83,6 +746,87 @@ def upload_file():
 
     return jsonify({'error': 'Only CSV files are accepted'}), 400
 
+@app.route('/rows', methods=['GET'])
+def get_rows():
+    try:
+        if 'current_file' not in session:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 400
+
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = request.args.get('limit', 100, type=int)
+        limit = min(max(limit, 0), app.config['MAX_PREVIEW_ROWS'])
+        columns = request.args.getlist('columns')
+
+        names = working_columns(filepath)
+        missing = [col for col in columns if col not in names]
+        if missing:
+            return jsonify({'error': f'Unknown columns: {", ".join(missing)}'}), 400
+
+        # Only the requested window is serialized, whatever the size of the file.
+        # Pending lazy steps are applied to the window alone.
+        if out_of_core(filepath) and not lazy_plans.get(filepath):
+            # Only the window is read from a file too large to load
+            window = read_working_columns(filepath, columns or None, offset=offset, limit=limit)
+            counts = {'rowCount': working_row_count(filepath), 'columnCount': len(names)}
+        else:
+            # Read without the session lock, so the steps and the frame they apply to are read together
+            df, plan = frame_snapshot(filepath)
+            if plan:
+                with metrics.phase('transform'):
+                    window = plan.window(df, offset, limit, columns=columns or None)
+                counts = {'rowCount': plan.row_count(df), 'columnCount': len(df.columns)}
+            else:
+                window = df.iloc[offset:offset + limit]
+                if columns:
+                    window = window[columns]
+                counts = frame_counts(df)
+
+        with metrics.phase('serialize'):
+            rows = json.loads(window.to_json(orient='values', date_format='iso'))
+
+        return jsonify({
+            'success': True,
+            'offset': offset,
+            'limit': limit,
+            'columns': window.columns.tolist(),
+            'rows': rows,
+            **counts
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/profile', methods=['GET'])
+def get_profile():
+    try:
+        if 'current_file' not in session:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 400
+
+        profile = working_profile(filepath)
+        columns = request.args.getlist('columns') or list(profile.columns)
+        missing = [col for col in columns if col not in profile.columns]
+        if missing:
+            return jsonify({'error': f'Unknown columns: {", ".join(missing)}'}), 400
+
+        stats = column_stats(filepath, columns)
+        return jsonify({
+            'success': True,
+            'rowCount': profile.row_count,
+            'duplicateCount': working_duplicate_count(filepath),
+            'columns': {column: stats[column].to_dict() for column in columns}
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/delete-columns', methods=['POST'])
 def delete_columns():
     try:
@@ -90,45 +834,34 @@ def delete_columns():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        columns_to_delete = data.get('columns', [])
-        delete_duplicates = data.get('deleteDuplicates', False)
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Delete selected columns
-        df = df.drop(columns=columns_to_delete)
-        
-        # Remove duplicates if requested
-        if delete_duplicates:
-            df, rows_removed = remove_duplicate_rows(df)
-        
-        # Check if any columns remain
-        if len(df.columns) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'Cannot delete all columns. At least one column must remain.'
-            }), 400
-            
-        # Check if any rows remain
-        if len(df) == 0:
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'delete-columns', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'delete-columns', 'payload': data}])
+
+        original = load_working_df(filepath)
+
+        # Delete selected columns and duplicates, refusing to leave nothing behind
+        try:
+            df = transform(original, 'delete-columns', data, row_index=working_row_index(filepath))
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': 'No data rows remaining after deletion.'
+                'error': str(e)
             }), 400
         
-        # Save the modified CSV
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        # Save the modified DataFrame
+        save_working_df(filepath, df)
+        record_change(filepath, original, df, [])
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **frame_counts(df),
             'columns': df.columns.tolist()
         })
         
@@ -144,15 +877,23 @@ def show_classification():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
-            
-        df = pd.read_csv(filepath)
-        
+
+        # Suggestions come from the column profile's samples, not a scan of the data
+        columns = working_columns(filepath)
+        profile = working_profile(filepath)
+        stats = column_stats(filepath, columns)
+        suggestions = {column: suggest_classification(stats[column], profile.row_count).to_dict()
+                       for column in columns}
+
         return jsonify({
             'success': True,
-            'columns': df.columns.tolist(),
-            'classifications': dataClassifications
+            'columns': columns,
+            'classifications': dataClassifications,
+            'suggestions': suggestions,
+            'submitted': {column: kind for column, kind in session.get('classifications', {}).items()
+                          if column in columns}
         })
-        
+
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -160,12 +901,29 @@ def show_classification():
 def submit_classifications():
     try:
         data = request.get_json()
-        classifications = data.get('classifications', {})
         
-        # Here you can process the classifications dictionary
-        # For example, save to a file or database
         # The classifications dictionary will look like:
         # { "column_name": "classification_type", ... }
+        if 'current_file' in session:
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
+            if os.path.exists(filepath):
+                # Store Categorical columns as category dtype
+                if out_of_core(filepath):
+                    result, status = run_pipeline(filepath, [{'operation': 'submit-classifications', 'payload': data}])
+                    if status != 200:
+                        return jsonify(result), status
+                    columns = result['columns']
+                else:
+                    original = load_working_df(filepath)
+                    df = transform(original, 'submit-classifications', data)
+                    save_working_df(filepath, df)
+                    record_change(filepath, original, df, operation_columns('submit-classifications', data))
+                    columns = df.columns
+                # Kept in the session so every worker sees them
+                session['classifications'] = {**session.get('classifications', {}), **{
+                    column: kind for column, kind in data.get('classifications', {}).items()
+                    if column in columns and kind in dataClassifications
+                }}
         
         return jsonify({
             'success': True,
@@ -189,19 +947,17 @@ def check_empty_fields():
             return jsonify({'error': 'No file uploaded'}), 400
             
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
-        df = pd.read_csv(filepath)
-        
-        # For categorical data, also treat '<NA>' strings as empty values
-        if classificationType == 'Categorical':
-            columnsWithEmpty = []
-            for column in columns:
-                # Check for both NaN and '<NA>' values
-                is_empty = df[column].isna() | (df[column].astype(str) == '<NA>')
-                if is_empty.any():
-                    columnsWithEmpty.append(column)
-        else:
-            # For other types, just check for NaN
-            columnsWithEmpty = [col for col in columns if df[col].isna().any()]
+        # Answered from the column profile rather than by scanning the columns
+        stats = column_stats(filepath, columns)
+        
+        # Without a classificationType, each column's submitted classification is used
+        submitted = session.get('classifications', {})
+        kinds = {col: classificationType or submitted.get(col) for col in columns}
+
+        # For categorical data, also treat '<NA>' strings as empty values.
+        # For other types, just check for NaN
+        columnsWithEmpty = [col for col in columns
+                            if (stats[col].empty_count if kinds[col] == 'Categorical' else stats[col].null_count) > 0]
         
         return jsonify({
             'success': True,
@@ -222,35 +978,23 @@ def handle_empty_name_fields():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        name_empty_handling = data.get('nameEmptyHandling', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'handle-empty-name-fields', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'handle-empty-name-fields', 'payload': data}])
+
         # Process each name column according to the empty handling choice
-        for column, handling in name_empty_handling.items():
-            if handling == 'delete-empty-rows':
-                # Delete rows where this name column is empty
-                df = df.dropna(subset=[column])
-            elif handling == 'fill-with-"none"':
-                df[column].fillna('None', inplace=True)
-            elif handling == 'fill-with-"unknown"':
-                df[column].fillna('Unknown', inplace=True)
-            elif handling == 'fill-with-"n/a"':
-                df[column].fillna('N/A', inplace=True)
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        steps = name_empty_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **counts,
             'message': 'Empty name fields handled successfully'
         })
         
@@ -267,41 +1011,23 @@ def apply_name_formats():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        name_formats = data.get('nameFormats', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Process each name column according to the format choice
-        for column, format_type in name_formats.items():
-            # First clean up the text (remove extra spaces and handle underscores)
-            df[column] = df[column].astype(str)
-            df[column] = df[column].apply(lambda x: ' '.join(x.replace('_', ' ').split()))
-            
-            # Apply the chosen format
-            if format_type == 'uppercase':
-                df[column] = df[column].str.upper()
-            elif format_type == 'lowercase':
-                df[column] = df[column].str.lower()
-            elif format_type == 'title-case':
-                # Use pandas built-in title() method
-                df[column] = df[column].str.title()
-            elif format_type == 'sentence-case':
-                # First make everything lowercase, then capitalize first character
-                df[column] = df[column].str.lower().str.capitalize()
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-name-formats', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-name-formats', 'payload': data}])
+
+        # Clean up the text of every name column, then apply the chosen format to each
+        steps = name_format_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **counts,
             'message': 'Name formats applied successfully'
         })
         
@@ -319,41 +1045,23 @@ def apply_formats():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Process each column according to the format choice
-        for column, format_type in selections.items():
-            # Fill NaN values with empty string before formatting
-            df[column] = df[column].fillna('')
-            df[column] = df[column].astype(str)
-            
-            if format_type == 'uppercase':
-                df[column] = df[column].str.upper()
-            elif format_type == 'lowercase':
-                df[column] = df[column].str.lower()
-            elif format_type == 'title-case':
-                df[column] = df[column].str.title()
-            elif format_type == 'sentence-case':
-                df[column] = df[column].str.lower().str.capitalize()
-            
-            # Convert empty strings back to NaN
-            df[column] = df[column].replace('', pd.NA)
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-formats', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-formats', 'payload': data}])
+
+        # Process each column according to the format choice, empty values stay empty
+        steps = format_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **counts,
             'message': 'Formats applied successfully'
         })
         
@@ -371,34 +1079,23 @@ def handle_empty_fields():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'handle-empty-fields', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'handle-empty-fields', 'payload': data}])
+
         # Process each column according to the empty handling choice
-        for column, handling in selections.items():
-            if handling == 'delete-empty-rows':
-                df = df.dropna(subset=[column])
-            elif handling == 'fill-none':
-                df[column].fillna('None', inplace=True)
-            elif handling == 'fill-unknown':
-                df[column].fillna('Unknown', inplace=True)
-            elif handling == 'fill-na':
-                df[column].fillna('N/A', inplace=True)
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        steps = empty_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **counts
         })
         
     except Exception as e:
@@ -414,32 +1111,23 @@ def handle_empty_date_fields():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'handle-empty-date-fields', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'handle-empty-date-fields', 'payload': data}])
+
         # Process each date column according to the empty handling choice
-        for column, handling in selections.items():
-            if handling == 'delete-empty-rows':
-                df = df.dropna(subset=[column])
-            elif handling == 'fill-current-date':
-                df[column].fillna(datetime.now().strftime('%Y-%m-%d'), inplace=True)
-            elif handling == 'fill-na':
-                df[column].fillna('N/A', inplace=True)
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        steps = date_empty_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **counts
         })
         
     except Exception as e:
@@ -455,54 +1143,26 @@ def apply_date_formats():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         
-        df = pd.read_csv(filepath)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-date-formats', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-date-formats', 'payload': data}])
+
+        original = load_working_df(filepath)
         
-        # Process each date column
-        for column, format_type in selections.items():
-            try:
-                # Store original values
-                original_values = df[column].copy()
-                
-                # Convert to datetime WITHOUT formatting first
-                temp_series = pd.to_datetime(df[column], format='mixed', errors='coerce')
-                
-                # Create mask for valid dates
-                valid_dates = temp_series.notna()
-                
-                # Format valid dates according to selection
-                format_mapping = {
-                    'mm/dd/yyyy': '%m/%d/%Y',
-                    'dd/mm/yyyy': '%d/%m/%Y',
-                    'yyyy/mm/dd': '%Y/%m/%d',
-                    'mm-dd-yyyy': '%m-%d-%Y',
-                    'dd-mm-yyyy': '%d-%m-%Y',
-                    'yyyy-mm-dd': '%Y-%m-%d'
-                }
-                
-                if format_type in format_mapping:
-                    pattern = format_mapping[format_type]
-                    # Format only valid dates using the selected format
-                    df.loc[valid_dates, column] = temp_series[valid_dates].dt.strftime(pattern)
-                    
-                # Keep original values for invalid dates
-                df.loc[~valid_dates, column] = original_values[~valid_dates]
-                
-            except Exception as e:
-                print(f"Error processing column {column}: {str(e)}")
-                continue
+        # Reformat each date column, leaving values that are not dates as they are
+        df = transform(original, 'apply-date-formats', data,
+                             date_parser=date_parsers.setdefault(filepath, DateParser()))
         
         # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        save_working_df(filepath, df)
+        record_change(filepath, original, df, operation_columns('apply-date-formats', data))
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **frame_counts(df)
         })
         
     except Exception as e:
@@ -519,55 +1179,28 @@ def handle_empty_categorical_fields():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'handle-empty-categorical-fields', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'handle-empty-categorical-fields', 'payload': data}])
+
+        original = load_working_df(filepath)
         
         # Process each column according to the empty handling choice
-        for column, handling in selections.items():
-            # Create mask for both NaN and '<NA>' values
-            empty_mask = df[column].isna() | (df[column].astype(str) == '<NA>')
-            
-            if handling == 'delete-empty-rows':
-                df = df.loc[~empty_mask]
-            
-            elif handling in ['fill-mode', 'fill-mean']:
-                # Get only valid values (not NaN or '<NA>')
-                valid_values = df.loc[~empty_mask, column]
-                
-                # Get unique values and create rank mapping
-                unique_values = sorted(valid_values.unique())
-                value_ranks = {val: idx + 1 for idx, val in enumerate(unique_values)}
-                rank_values = {idx + 1: val for idx, val in enumerate(unique_values)}
-                
-                if handling == 'fill-mode':
-                    # Get most common value excluding NaN and '<NA>'
-                    mode_value = valid_values.mode()[0]
-                    df.loc[empty_mask, column] = mode_value
-                else:  # fill-mean
-                    # Convert to numeric ranks
-                    numeric_series = valid_values.map(value_ranks)
-                    # Calculate mean of ranks
-                    mean_rank = numeric_series.mean()
-                    # Round to nearest rank
-                    nearest_rank = round(mean_rank)
-                    # Get corresponding value
-                    fill_value = rank_values.get(nearest_rank, rank_values[1])
-                    df.loc[empty_mask, column] = fill_value
+        df = transform(original, 'handle-empty-categorical-fields', data)
 
         # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        save_working_df(filepath, df)
+        record_change(filepath, original, df, operation_columns('handle-empty-categorical-fields', data))
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **frame_counts(df)
         })
         
     except Exception as e:
@@ -584,41 +1217,23 @@ def apply_categorical_formats():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Process each column according to the format choice
-        for column, format_type in selections.items():
-            # Fill NaN values with empty string before formatting
-            df[column] = df[column].fillna('')
-            df[column] = df[column].astype(str)
-            
-            if format_type == 'uppercase':
-                df[column] = df[column].str.upper()
-            elif format_type == 'lowercase':
-                df[column] = df[column].str.lower()
-            elif format_type == 'title-case':
-                df[column] = df[column].str.title()
-            elif format_type == 'sentence-case':
-                df[column] = df[column].str.lower().str.capitalize()
-            
-            # Convert empty strings back to NaN
-            df[column] = df[column].replace('', pd.NA)
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-categorical-formats', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-categorical-formats', 'payload': data}])
+
+        # Process each column according to the format choice, empty values stay empty
+        steps = format_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **counts,
             'message': 'Formats applied successfully'
         })
         
@@ -637,22 +1252,55 @@ def get_unique_values():
 
         data = request.get_json()
         columns = data.get('columns', [])
+        # 'value' lists values in sorted order, 'count' the most frequent first
+        order = data.get('order', 'value')
+        prefix = str(data.get('prefix', ''))
+        cursors = data.get('cursors', {})
+        limit = int(data.get('limit', app.config['MAX_UNIQUE_VALUES']))
+        limit = min(max(limit, 0), app.config['MAX_UNIQUE_VALUES'])
+
+        if order not in ('value', 'count'):
+            return jsonify({'error': f'Unknown order: {order}'}), 400
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
+        profile = working_profile(filepath)
+        missing = [col for col in columns if col not in profile.columns]
+        if missing:
+            return jsonify({'error': f'Unknown columns: {", ".join(missing)}'}), 400
         
-        # Get unique values for each column
+        # Page through each column's cached value counts, so the response stays
+        # small however many distinct values a column has
         unique_values = {}
+        value_counts = {}
+        distinct_counts = {}
+        exact_counts = {}
+        match_counts = {}
+        next_cursors = {}
         for column in columns:
-            unique_values[column] = sorted(df[column].dropna().unique().tolist())
-            print(f"Column {column} unique values:", unique_values[column])  # Debug print
+            counts = profile.counts(column, lambda stale: load_working_columns(filepath, stale),
+                                    scan=column_scan(filepath))
+            offset = int(cursors.get(column) or 0)
+            page, matched = counts.page(order=order, prefix=prefix, offset=offset, limit=limit)
+            values = page.index.tolist()
+            unique_values[column] = values
+            value_counts[column] = [{'value': value, 'count': count} for value, count in zip(values, page.tolist())]
+            # Past the values a large file's counts hold, the profile's estimate is closer
+            distinct_counts[column] = len(counts) if counts.exact else column_stats(filepath, [column])[column].distinct_count
+            exact_counts[column] = counts.exact
+            match_counts[column] = matched
+            next_cursors[column] = str(offset + limit) if offset + limit < matched else None
         
         return jsonify({
             'success': True,
-            'uniqueValues': unique_values
+            'uniqueValues': unique_values,
+            'valueCounts': value_counts,
+            'distinctCounts': distinct_counts,
+            'exactCounts': exact_counts,
+            'matchCounts': match_counts,
+            'nextCursors': next_cursors
         })
         
     except Exception as e:
@@ -680,22 +1328,18 @@ def apply_standardization():
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Apply standardizations
-        for column, value_map in standardizations.items():
-            # Replace values according to the mapping
-            df[column] = df[column].map(lambda x: value_map.get(x, x))
-        
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-standardization', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-standardization', 'payload': data}])
+
+        # Replace values in each column according to its mapping
+        steps = standardization_steps(data)
+        counts = run_steps(filepath, steps)
         
         return jsonify({
             'success': True,
-            'table': table_html,
+            **counts,
             'message': 'Standardization applied successfully'
         })
         
@@ -713,70 +1357,28 @@ def apply_numerical_rounding():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Store rounding precision in DataFrame attributes
-        if 'rounding_precision' not in df.attrs:
-            df.attrs['rounding_precision'] = {}
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'apply-numerical-rounding', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'apply-numerical-rounding', 'payload': data}])
+
+        original = load_working_df(filepath)
         
-        # Process each numerical column
-        for column, precision in selections.items():
-            try:
-                # First, clean the numbers (remove non-numeric chars except decimal point and negative sign)
-                def clean_number(value):
-                    if pd.isna(value):
-                        return value
-                    # Convert to string first
-                    str_val = str(value)
-                    # Keep only digits, decimal point, and negative sign
-                    cleaned = ''.join(c for c in str_val if c.isdigit() or c in '.-')
-                    # Handle multiple decimal points or negative signs
-                    if cleaned.count('.') > 1:
-                        # Keep only the first decimal point
-                        parts = cleaned.split('.')
-                        cleaned = parts[0] + '.' + ''.join(parts[1:])
-                    if cleaned.count('-') > 1:
-                        # Keep only the first negative sign
-                        cleaned = '-' + cleaned.replace('-', '')
-                    return cleaned if cleaned else None
-
-                # Clean and convert to numeric
-                df[column] = df[column].apply(clean_number).astype(float)
-                
-                # Store the precision for this column
-                df.attrs['rounding_precision'][column] = precision
-
-                # Apply rounding based on selection
-                if precision != 'keep':
-                    rounding_map = {
-                        'whole': 0,
-                        'tenths': 1,
-                        'hundredths': 2,
-                        'thousandths': 3,
-                        'ten-thousandths': 4
-                    }
-                    if precision in rounding_map:
-                        df[column] = df[column].round(rounding_map[precision])
-
-            except Exception as e:
-                print(f"Error processing column {column}: {str(e)}")
-                continue
+        # Clean and round each numerical column, remembering its precision
+        df = transform(original, 'apply-numerical-rounding', data)
 
         # Save the modified DataFrame with attributes
-        df.to_csv(filepath, index=False)
-        
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        save_working_df(filepath, df)
+        record_change(filepath, original, df, operation_columns('apply-numerical-rounding', data))
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **frame_counts(df)
         })
         
     except Exception as e:
@@ -793,64 +1395,28 @@ def handle_empty_numerical_fields():
             return jsonify({'error': 'No file uploaded'}), 400
 
         data = request.get_json()
-        selections = data.get('selections', {})
         
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
             
-        df = pd.read_csv(filepath)
-        
-        # Get the previously applied rounding precision for each column
-        rounding_map = {
-            'whole': 0,
-            'tenths': 1,
-            'hundredths': 2,
-            'thousandths': 3,
-            'ten-thousandths': 4
-        }
-        
-        # Process each numerical column
-        for column, handling in selections.items():
-            # Convert to numeric, handling any non-numeric values as NaN
-            df[column] = pd.to_numeric(df[column], errors='coerce')
-            
-            # Get the column's current rounding precision from the DataFrame's metadata
-            # If not found, default to original precision
-            precision = None
-            if 'rounding_precision' in df.attrs:
-                precision = df.attrs['rounding_precision'].get(column)
-            
-            if handling == 'delete-empty-rows':
-                df = df.dropna(subset=[column])
-            
-            elif handling == 'fill-mean':
-                mean_value = df[column].mean()
-                if precision is not None and precision != 'keep':
-                    mean_value = round(mean_value, rounding_map.get(precision, 2))
-                df[column].fillna(mean_value, inplace=True)
-            
-            elif handling == 'fill-median':
-                median_value = df[column].median()
-                if precision is not None and precision != 'keep':
-                    median_value = round(median_value, rounding_map.get(precision, 2))
-                df[column].fillna(median_value, inplace=True)
-            
-            elif handling == 'fill-mode':
-                mode_value = df[column].mode()[0]
-                if precision is not None and precision != 'keep':
-                    mode_value = round(mode_value, rounding_map.get(precision, 2))
-                df[column].fillna(mode_value, inplace=True)
+        if async_requested():
+            return submit_operations(filepath, [{'operation': 'handle-empty-numerical-fields', 'payload': data}])
+        if out_of_core(filepath):
+            return run_operations(filepath, [{'operation': 'handle-empty-numerical-fields', 'payload': data}])
 
-        # Save the modified DataFrame
-        df.to_csv(filepath, index=False)
+        original = load_working_df(filepath)
         
-        # Convert updated DataFrame to HTML table
-        table_html = df.to_html(classes='table table-striped', index=False)
+        # Process each numerical column according to the empty handling choice
+        df = transform(original, 'handle-empty-numerical-fields', data)
+
+        # Save the modified DataFrame
+        save_working_df(filepath, df)
+        record_change(filepath, original, df, operation_columns('handle-empty-numerical-fields', data))
         
         return jsonify({
             'success': True,
-            'table': table_html
+            **frame_counts(df)
         })
         
     except Exception as e:
@@ -860,6 +1426,55 @@ def handle_empty_numerical_fields():
             'error': str(e)
         }), 400
 
+@app.route('/apply-pipeline', methods=['POST'])
+def apply_pipeline():
+    try:
+        if 'current_file' not in session:
+            return jsonify({'error': 'No file uploaded'}), 400
+
+        data = request.get_json()
+        operations = data.get('operations', [])
+        if not operations:
+            return jsonify({'error': 'No operations provided'}), 400
+
+        unknown = [op.get('operation') for op in operations
+                   if op.get('operation') not in STEP_OPERATIONS and op.get('operation') not in FRAME_OPERATIONS]
+        if unknown:
+            return jsonify({'error': f'Unknown operations: {", ".join(map(str, unknown))}'}), 400
+
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], session['current_file'])
+        if not os.path.exists(filepath):
+            return jsonify({'error': 'File not found'}), 400
+
+        if async_requested():
+            return submit_operations(filepath, operations)
+
+        result, status = run_pipeline(filepath, operations)
+        return jsonify(result), status
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def get_job(job_id):
+    job = job_queue.get(job_id, session.sid)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if request.method == 'DELETE':
+        job_queue.cancel(job)
+
+    return jsonify(job.to_dict())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download-file', methods=['GET'])
 def download_file():
     try:
@@ -872,24 +1487,61 @@ def download_file():
         if not os.path.exists(filepath):
             return jsonify({'error': 'File not found'}), 400
 
-        # Read the file content first
-        with open(filepath, 'rb') as f:
-            file_content = f.read()
+        # Apply any pending lazy steps so the stream reads the final data
+        if lazy_plans.get(filepath):
+            load_working_df(filepath)
 
-        # Delete the file immediately
-        try:
-            os.remove(filepath)
-            print(f"File deleted successfully: {filepath}")
-        except Exception as e:
-            print(f"Error deleting file: {str(e)}")
+        # Convert the working data back to CSV a chunk of rows at a time, the
+        # only point after upload where CSV is produced
+        chunk_rows = app.config['DOWNLOAD_CHUNK_ROWS']
+        df = frame_cache.get(filepath, working_version(filepath))
+        if df is not None:
+            frames = (df.iloc[i:i + chunk_rows] for i in range(0, max(len(df), 1), chunk_rows))
+        else:
+            frames = iter_working_file(filepath, chunk_rows)
+        chunks = csv_chunks(frames)
+
+        download_name = 'cleaned_data.csv'
+        mimetype = 'text/csv'
+        if request.args.get('compression') == 'gzip':
+            chunks = gzip_chunks(chunks)
+            download_name += '.gz'
+            mimetype = 'application/gzip'
+
+        # The body is sent after the request ends, and no change may slip in
+        # before the file is removed, so the stream holds the session's lock
+        unlock = keep_session_lock()
+        sid = session.sid
+
+        def generate():
+            try:
+                for chunk in chunks:
+                    metrics.count('bytes_written', len(chunk))
+                    yield chunk
+
+                # Delete the file only once the whole file has been sent, so an
+                # interrupted download can be retried
+                forget_working_file(filepath)
+                try:
+                    os.remove(filepath)
+                    print(f"File deleted successfully: {filepath}")
+                except Exception as e:
+                    print(f"Error deleting file: {str(e)}")
 
-        # Clear the session
-        session.pop('current_file', None)
+                # The request's session was saved before the body was sent, so
+                # the file is forgotten in the store, not the session
+                values = session_store.load(sid)
+                if values is not None and values.get('current_file') == timestamped_filename:
+                    del values['current_file']
+                    session_store.save(sid, values)
+            finally:
+                unlock()
 
-        # Create response with file content
-        response = make_response(file_content)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=cleaned_data.csv'
+        # Stream the response with chunked transfer
+        response = Response(generate(), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        # A body the client never started reading is closed without running generate()
+        response.call_on_close(unlock)
         
         return response
         
@@ -898,4 +1550,7 @@ def download_file():
         return jsonify({'error': str(e)}), 400
 
 if __name__ == '__main__':
+    # The reloader's parent process only watches for changes, its child serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_app()
     app.run(debug=True)
@@ -0,0 +1,65 @@
+"""Compare date formatting of many columns one at a time with the column executor.
+
+Usage: python benchmarks/bench_column_parallel.py [rows] [columns] [workers ...]
+
+Workers default to 1, 2, 4, ... up to the number of CPUs. How close to
+linear the timings scale depends on how much of the column work runs
+outside the GIL.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import parallel
+from operations import apply_operation
+
+
+def make_frame(rows, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-01-01", periods=3000, freq="D")
+    iso = days.strftime("%Y-%m-%d").to_numpy()
+    us = days.strftime("%m/%d/%Y").to_numpy()
+    frame = {}
+    for i in range(columns):
+        dates = np.where(rng.random(rows) < 0.9, rng.choice(iso, rows), rng.choice(us, rows)).astype(object)
+        dates[rng.random(rows) < 0.02] = None
+        frame[f"date_{i}"] = dates
+    return pd.DataFrame(frame)
+
+
+def worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main():
+    rows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    workers = [int(w) for w in sys.argv[3:]] or worker_counts()
+    df = make_frame(rows, columns)
+    payload = {"selections": {column: "dd/mm/yyyy" for column in df.columns}}
+    print(f"{rows:,} rows x {columns} date columns, {os.cpu_count()} CPUs")
+
+    expected = None
+    baseline = None
+    for count in workers:
+        parallel.configure(max_workers=count, min_rows=0)
+        start = time.perf_counter()
+        result = apply_operation(df, "apply-date-formats", payload)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{count:>3} worker(s){elapsed:>10.3f}s{baseline / elapsed:>8.2f}x")
+        if expected is None:
+            expected = result
+        else:
+            pd.testing.assert_frame_equal(result, expected)
+    parallel.column_executor().shutdown()
+
+
+if __name__ == "__main__":
+    main()
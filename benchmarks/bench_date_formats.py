@@ -0,0 +1,54 @@
+"""Compare date parsing per distinct value with format='mixed' over every row.
+
+Usage: python benchmarks/bench_date_formats.py [rows]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cleaning import DateParser, format_dates
+
+
+def make_dates(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-01-01", periods=3000, freq="D")
+    # Mostly ISO dates with some written month first
+    iso = days.strftime("%Y-%m-%d").to_numpy()
+    us = days.strftime("%m/%d/%Y").to_numpy()
+    dates = pd.Series(np.where(rng.random(rows) < 0.9, rng.choice(iso, rows), rng.choice(us, rows)), dtype=object)
+    dates[rng.random(rows) < 0.02] = None
+    return dates
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<40}{time.perf_counter() - start:>8.3f}s")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dates = make_dates(rows)
+    print(f"{rows:,} rows, {dates.nunique():,} distinct values")
+
+    old = timed("mixed parsing per row", lambda: pd.to_datetime(dates, format="mixed", errors="coerce"))
+    parser = DateParser()
+    new = timed("distinct values, format detected", lambda: parser.parse("Date", dates))
+    assert old.isna().equals(new.isna())
+    assert (old.dropna() == new.dropna()).all()
+
+    timed("strftime per row", lambda: old.dropna().dt.strftime("%d/%m/%Y"))
+    formatted = timed("strftime per distinct value", lambda: format_dates(new.dropna(), "%d/%m/%Y"))
+    parser.record_formatted("Date", "%d/%m/%Y", formatted, new.dropna())
+
+    reformatted = dates.copy()
+    reformatted[formatted.index] = formatted
+    timed("reparse after reformatting", lambda: parser.parse("Date", reformatted))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare name normalization with the per-row lambda apply_name_formats used to run.
+
+Names are timed as str columns, the Arrow-backed dtype working files are
+read into, and as object columns, which are converted to str once.
+
+Usage: python benchmarks/bench_name_formats.py [rows]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cleaning import normalize_text, normalize_text_columns
+
+
+def make_names(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    first = np.array(["alice", "BOB", "  carol", "dave_", "Eve  Marie", "frank__o"])
+    last = np.array(["smith", "  JONES ", "de_la_cruz", "o'brien", "lee\t", "van  dyke"])
+    names = pd.Series(
+        np.char.add(np.char.add(rng.choice(first, rows), "_"), rng.choice(last, rows)),
+        dtype=object,
+    )
+    names[rng.random(rows) < 0.05] = None
+    return names
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<40}{time.perf_counter() - start:>8.3f}s")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    names = make_names(rows)
+    print(f"{rows:,} rows")
+
+    # The old kernel needs strings everywhere, so missing values become text
+    old = timed(
+        "lambda per row",
+        lambda: names.apply(lambda x: " ".join(str(x).replace("_", " ").split())),
+    )
+    timed("vectorized, object column", lambda: normalize_text(names))
+    names = names.astype("str")
+    new = timed("vectorized, str column", lambda: normalize_text(names))
+
+    present = names.notna()
+    assert (old[present] == new[present]).all()
+    assert new[~present].isna().all()
+
+    df = pd.DataFrame({"first": names, "last": names.sample(frac=1, random_state=1).values})
+    timed(
+        "lambda per row, 2 columns",
+        lambda: df.apply(
+            lambda col: col.apply(lambda x: " ".join(str(x).replace("_", " ").split()))
+        ),
+    )
+    timed("vectorized, 2 columns in one pass", lambda: normalize_text_columns(df.copy(), ["first", "last"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Time /upload and every cleaning route through the Flask test client.
+
+Usage: python benchmarks/bench_routes.py [--rows 10k,1M,10M] [--users N]
+                                         [--baseline PATH] [--update-baseline]
+                                         [--tolerance 0.5]
+
+For each size a deterministic synthetic CSV (messy names, categories,
+numbers and mixed-format dates, with nulls and duplicate rows) is uploaded
+and taken through every route. Wall time and peak resident memory are
+recorded per route and compared with the baseline file; any route slower
+or larger than its baseline by more than the tolerance makes the run exit
+with status 1. At 10k rows the whole flow must also meet the README's
+"10,000 rows in under 10 seconds".
+
+--users runs that many sessions through the 10k flow at once instead, for
+the README's "50 concurrent users".
+
+A size with no baseline fails the run rather than passing unchecked.
+Baselines depend on the machine they were recorded on. Regenerate them
+with --update-baseline on the machine the comparison runs on.
+tests/testBenchmarks.py runs the 10k comparison with the test suite.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Differences below these are noise, whatever the tolerance
+MIN_SECONDS = 0.05
+MIN_MEGABYTES = 32
+
+# The README's requirement for 10,000 rows
+FLOW_SECONDS_AT_10K = 10
+
+GENERATE_CHUNK_ROWS = 500000
+
+FIRST = np.array(["alice", "BOB", "  carol", "dave_", "Eve  Marie", "frank__o", "grace", "heidi"])
+LAST = np.array(["smith", "  JONES ", "de_la_cruz", "o'brien", "lee\t", "van  dyke", "ng", "ito"])
+REGIONS = np.array(["north", "North", "N", "south", "South", "S", "east", "East", "west", "West"])
+PRODUCTS = np.array(["widget", "Widget", "gadget", "GADGET", "gizmo", "doohickey"])
+PRICES = np.array(["$1,200.50", "3.10", "-7", "12 USD", "0.5", "99.999", "1.2.3", "€45"])
+
+
+def make_chunk(rows, start, rng):
+    """Rows start to start + rows of the synthetic data set"""
+    days = pd.date_range("2015-01-01", periods=3000, freq="D")
+    date_layouts = [days.strftime(layout).to_numpy() for layout in ("%Y-%m-%d", "%m/%d/%Y", "%b %d, %Y")]
+    layout = rng.choice(len(date_layouts), rows, p=[0.8, 0.15, 0.05])
+    day = rng.integers(0, len(days), rows)
+    dates = np.choose(layout, [values[day] for values in date_layouts]).astype(object)
+
+    df = pd.DataFrame({
+        "Id": np.arange(start, start + rows),
+        "Name": np.char.add(np.char.add(rng.choice(FIRST, rows), "_"), rng.choice(LAST, rows)).astype(object),
+        "Region": rng.choice(REGIONS, rows).astype(object),
+        "Product": rng.choice(PRODUCTS, rows).astype(object),
+        "Price": rng.choice(PRICES, rows).astype(object),
+        "Quantity": rng.integers(1, 500, rows).astype(float),
+        "Date": dates,
+    })
+    for column, share in [("Name", 0.03), ("Region", 0.05), ("Price", 0.04), ("Quantity", 0.05), ("Date", 0.02)]:
+        df.loc[rng.random(rows) < share, column] = None
+
+    # About 2% of rows repeat an earlier row of the chunk, Id included
+    repeats = np.flatnonzero(rng.random(rows) < 0.02)
+    repeats = repeats[repeats > 0]
+    df.iloc[repeats] = df.iloc[rng.integers(0, repeats)].to_numpy()
+    return df
+
+
+def make_csv(path, rows, seed=0):
+    """Write the synthetic data set to path, the same for the same rows and seed"""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as out:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk = make_chunk(min(GENERATE_CHUNK_ROWS, rows - start), start, rng)
+            chunk.to_csv(out, index=False, header=start == 0)
+
+
+def route_calls():
+    """(name, method, path, json payload) for every route, in the order a user would go"""
+    return [
+        ("rows", "get", "/rows?offset=0&limit=100", None),
+        ("profile", "get", "/profile", None),
+        ("show-classification", "post", "/show-classification", {}),
+        ("submit-classifications", "post", "/submit-classifications", {"classifications": {
+            "Id": "Numerical", "Name": "Non-categorical", "Region": "Categorical", "Product": "Categorical",
+            "Price": "Numerical", "Quantity": "Numerical", "Date": "Date"}}),
+        ("check-empty-fields", "post", "/check-empty-fields", {
+            "columns": ["Region", "Product"], "classificationType": "Categorical"}),
+        ("get-unique-values", "post", "/get-unique-values", {"columns": ["Region", "Product"]}),
+        ("handle-empty-name-fields", "post", "/handle-empty-name-fields", {
+            "nameEmptyHandling": {"Name": 'fill-with-"unknown"'}}),
+        ("apply-name-formats", "post", "/apply-name-formats", {"nameFormats": {"Name": "title-case"}}),
+        ("apply-formats", "post", "/apply-formats", {"selections": {"Product": "lowercase"}}),
+        ("handle-empty-categorical-fields", "post", "/handle-empty-categorical-fields", {
+            "selections": {"Region": "fill-mode"}}),
+        ("apply-categorical-formats", "post", "/apply-categorical-formats", {"selections": {"Region": "lowercase"}}),
+        ("apply-standardization", "post", "/apply-standardization", {"standardizations": {
+            "Region": {"n": "north", "s": "south"}}}),
+        ("handle-empty-date-fields", "post", "/handle-empty-date-fields", {
+            "selections": {"Date": "delete-empty-rows"}}),
+        ("apply-date-formats", "post", "/apply-date-formats", {"selections": {"Date": "dd/mm/yyyy"}}),
+        ("apply-numerical-rounding", "post", "/apply-numerical-rounding", {"selections": {"Price": "tenths"}}),
+        ("handle-empty-numerical-fields", "post", "/handle-empty-numerical-fields", {
+            "selections": {"Price": "fill-median", "Quantity": "fill-mean"}}),
+        ("handle-empty-fields", "post", "/handle-empty-fields", {"selections": {"Name": "fill-unknown"}}),
+        ("apply-pipeline", "post", "/apply-pipeline", {"operations": [
+            {"operation": "apply-formats", "payload": {"selections": {"Name": "uppercase"}}},
+            {"operation": "apply-date-formats", "payload": {"selections": {"Date": "yyyy-mm-dd"}}},
+        ]}),
+        ("delete-columns", "post", "/delete-columns", {"columns": ["Id"], "deleteDuplicates": True}),
+        ("download-file", "get", "/download-file", None),
+    ]
+
+
+def current_rss():
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Without /proc only the peak so far is known (in KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakMemory:
+    """Highest resident memory seen while the block runs, sampled every few milliseconds"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def call(client, method, path, payload):
+    response = getattr(client, method)(path, json=payload) if payload is not None else getattr(client, method)(path)
+    # Streamed responses only do their work when read
+    body = response.get_data()
+    if response.status_code not in (200, 202):
+        raise RuntimeError(f"{path} returned {response.status_code}: {body[:200]!r}")
+
+
+def run_flow(csv_path, measure=True):
+    """Upload csv_path and call every route, returning {route: {seconds, peakMB}}"""
+    client = app.test_client()
+    results = {}
+    calls = [("upload", "upload", None, None)] + route_calls()
+    for name, method, path, payload in calls:
+        with PeakMemory() if measure else NoMemory() as memory:
+            start = time.perf_counter()
+            if method == "upload":
+                with open(csv_path, "rb") as f:
+                    response = client.post("/upload", data={"file": (f, "bench.csv")},
+                                           content_type="multipart/form-data")
+                if response.status_code != 200:
+                    raise RuntimeError(f"/upload returned {response.status_code}: {response.get_data()[:200]!r}")
+            else:
+                call(client, method, path, payload)
+            seconds = time.perf_counter() - start
+        results[name] = {"seconds": round(seconds, 4), "peakMB": round(memory.peak / 2 ** 20, 1)}
+    return results
+
+
+class NoMemory:
+    peak = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def compare(size, results, baseline, tolerance):
+    """Lines describing every route worse than its baseline"""
+    failures = []
+    for route, result in results.items():
+        base = baseline.get(route)
+        if base is None:
+            continue
+        limit = max(base["seconds"] * (1 + tolerance), base["seconds"] + MIN_SECONDS)
+        if result["seconds"] > limit:
+            failures.append(f"{size:,} rows {route}: {result['seconds']:.3f}s, baseline {base['seconds']:.3f}s")
+        limit = max(base["peakMB"] * (1 + tolerance), base["peakMB"] + MIN_MEGABYTES)
+        if result["peakMB"] > limit:
+            failures.append(f"{size:,} rows {route}: {result['peakMB']:.0f} MB, baseline {base['peakMB']:.0f} MB")
+    return failures
+
+
+def run_sizes(sizes, workdir, baseline, tolerance):
+    """Run the flow at each size, comparing with baseline unless it is None (when recording one)"""
+    recorded = {}
+    failures = []
+    for size in sizes:
+        csv_path = os.path.join(workdir, f"bench_{size}.csv")
+        make_csv(csv_path, size)
+        print(f"\n{size:,} rows ({os.path.getsize(csv_path) / 2 ** 20:.1f} MB CSV)")
+        print(f"{'route':<34}{'seconds':>10}{'peak MB':>10}")
+        results = run_flow(csv_path)
+        for route, result in results.items():
+            print(f"{route:<34}{result['seconds']:>10.3f}{result['peakMB']:>10.1f}")
+        total = sum(result["seconds"] for result in results.values())
+        print(f"{'total':<34}{total:>10.3f}")
+        if size <= 10_000 and total > FLOW_SECONDS_AT_10K:
+            failures.append(f"{size:,} rows took {total:.1f}s, over the {FLOW_SECONDS_AT_10K}s requirement")
+        if baseline is None:
+            pass
+        elif str(size) in baseline:
+            failures += compare(size, results, baseline[str(size)], tolerance)
+        else:
+            failures.append(f"{size:,} rows: no baseline, record one with --update-baseline")
+        recorded[str(size)] = results
+        os.remove(csv_path)
+    return recorded, failures
+
+
+def run_users(users, workdir):
+    """Take users sessions through the 10k flow at once and report how long each took"""
+    csv_path = os.path.join(workdir, "bench_users.csv")
+    make_csv(csv_path, 10_000)
+    durations = []
+    errors = []
+
+    def session():
+        start = time.perf_counter()
+        try:
+            run_flow(csv_path, measure=False)
+            durations.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=session) for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    print(f"{users} concurrent sessions of 10,000 rows in {wall:.2f}s")
+    if durations:
+        print(f"per session: median {np.median(durations):.2f}s, p95 {np.percentile(durations, 95):.2f}s, "
+              f"max {max(durations):.2f}s")
+    failures = [f"session failed: {error}" for error in errors]
+    if durations and max(durations) > FLOW_SECONDS_AT_10K:
+        failures.append(f"slowest of {users} sessions took {max(durations):.1f}s, "
+                        f"over the {FLOW_SECONDS_AT_10K}s requirement")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="10k", help="comma separated sizes, e.g. 10k,1M,10M")
+    parser.add_argument("--users", type=int, default=0, help="concurrent sessions to run instead")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 for 50%%")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_routes_")
+    app.config["UPLOAD_FOLDER"] = workdir
+    try:
+        if args.users:
+            failures = run_users(args.users, workdir)
+        else:
+            baseline = {}
+            if os.path.exists(args.baseline):
+                with open(args.baseline) as f:
+                    baseline = json.load(f)
+            sizes = [parse_size(size) for size in args.rows.split(",")]
+            recorded, failures = run_sizes(sizes, workdir, None if args.update_baseline else baseline, args.tolerance)
+            if args.update_baseline:
+                baseline.update(recorded)
+                with open(args.baseline, "w") as f:
+                    json.dump(baseline, f, indent=2, sort_keys=True)
+                    f.write("\n")
+                print(f"\nBaseline written to {args.baseline}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
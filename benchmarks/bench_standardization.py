@@ -0,0 +1,59 @@
+"""Compare value remapping with the per-cell lambda apply_standardization used to run.
+
+Usage: python benchmarks/bench_standardization.py [cells ...]
+
+Each size is a total number of cells, spread over 10 columns.
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cleaning import remap_values
+
+COLUMNS = 10
+
+VALUES = np.array(
+    ["north", "North", "N", "south", "South", "S", "east", "East", "west", "West", "n/a", "unknown"],
+    dtype=object,
+)
+
+MAPPING = {
+    "North": "north", "N": "north", "South": "south", "S": "south",
+    "East": "east", "West": "west", "n/a": None, "central": "Central",
+}
+
+
+def make_frame(cells, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = cells // COLUMNS
+    return pd.DataFrame({f"region_{i}": VALUES[rng.integers(0, len(VALUES), rows)] for i in range(COLUMNS)})
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<40}{time.perf_counter() - start:>8.3f}s")
+    return result
+
+
+def main():
+    sizes = [int(float(size)) for size in sys.argv[1:]] or [1_000_000, 10_000_000, 50_000_000]
+    for cells in sizes:
+        df = make_frame(cells)
+        print(f"{cells:,} cells ({len(df):,} rows x {COLUMNS} columns)")
+        old = timed(
+            "lambda per cell",
+            lambda: {c: df[c].map(lambda x: MAPPING.get(x, x)) for c in df.columns},
+        )
+        new = timed("factorize and take", lambda: {c: remap_values(df[c], MAPPING) for c in df.columns})
+        for column in df.columns:
+            assert old[column].isna().equals(new[column].isna())
+            assert (old[column].dropna() == new[column].dropna()).all()
+        del df, old, new
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import numpy as np
+import pandas as pd
+from working_store import (BATCH_ROWS, WorkingFileWriter, SchemaMismatch, iter_working_file, working_schema,
+                           working_row_count)
+from column_profile import ProfileBuilder
+from sketches import NumericSketch
+from row_index import SpilledRowHashIndex, repeated_hashes, row_hashes, value_hashes
+from operations import (STEP_OPERATIONS, FRAME_OPERATIONS, CATEGORICAL_FILLS, NUMERICAL_FILLS, apply_operation,
+                        apply_numerical_rounding, categorical_empty_mask, categorical_fill_value,
+                        handle_empty_categorical_fields, handle_empty_numerical_fields, store_classifications,
+                        categorical_columns)
+
+
+class RestartPass(Exception):
+    """Raised by an operation that learned from a chunk how the chunks before it should have been done"""
+
+
+class OperationError(Exception):
+    """Wraps the error of the operation at index in a list of chunked operations"""
+
+    def __init__(self, index, error):
+        super().__init__(str(error))
+        self.index = index
+        self.error = error
+
+
+def add_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+class ChunkedOperation:
+    """An operation applied to a working file one chunk of rows at a time.
+
+    Operations whose output rows each depend only on the same input row just
+    apply() to every chunk. Those that need statistics of a whole column set
+    needs_scan, and prepare() first gathers them in a pass over every chunk,
+    as the operations before them leave it.
+    """
+
+    needs_scan = False
+
+    def __init__(self, name, data, date_parser=None):
+        self.name = name
+        self.data = data
+        self.date_parser = date_parser
+
+    def use_profile(self, profile):
+        """Take what prepare() would gather from the ColumnProfile of the file, when the operation runs first"""
+
+    def prepare(self, chunks):
+        pass
+
+    def start(self):
+        """Forget what a pass applying the operation learned, before another pass"""
+
+    def apply(self, chunk):
+        return apply_operation(chunk, self.name, self.data, date_parser=self.date_parser)
+
+    def finish(self):
+        """Check the result once a pass has applied the operation to every chunk"""
+
+
+class RoundingOperation(ChunkedOperation):
+    """apply-numerical-rounding, leaving a column as it was if any chunk of it cannot be cleaned"""
+
+    def __init__(self, name, data, date_parser=None):
+        super().__init__(name, data, date_parser)
+        self.failed = set()
+        self.applied = False
+
+    def start(self):
+        self.applied = False
+
+    def apply(self, chunk):
+        selections = {column: precision for column, precision in self.data.get('selections', {}).items()
+                      if column not in self.failed}
+        failed = set()
+        df = apply_numerical_rounding(chunk.copy(deep=False), {'selections': selections}, failed=failed)
+        if failed:
+            self.failed |= failed
+            # Earlier chunks of the column were rounded, so they are done again without it
+            if self.applied:
+                raise RestartPass()
+        self.applied = True
+        return df
+
+
+class CategoricalEmptyOperation(ChunkedOperation):
+    """handle-empty-categorical-fields, with mode and mean fills counted over the whole column"""
+
+    def __init__(self, name, data, date_parser=None):
+        super().__init__(name, data, date_parser)
+        self.fill_values = {}
+        self.needs_scan = any(handling in CATEGORICAL_FILLS for handling in data.get('selections', {}).values())
+
+    def prepare(self, chunks):
+        selections = self.data.get('selections', {})
+        counts = {}
+        for chunk in chunks:
+            # Columns are handled in order, so rows an earlier column deletes
+            # are not counted for a later one
+            for column, handling in selections.items():
+                empty_mask = categorical_empty_mask(chunk[column])
+                if handling == 'delete-empty-rows':
+                    chunk = chunk.loc[~empty_mask]
+                elif handling in CATEGORICAL_FILLS:
+                    counts[column] = add_counts(counts.get(column), chunk.loc[~empty_mask, column].value_counts())
+        self.fill_values = {column: categorical_fill_value(counts[column], handling)
+                            for column, handling in selections.items() if handling in CATEGORICAL_FILLS}
+
+    def apply(self, chunk):
+        return handle_empty_categorical_fields(chunk.copy(deep=False), self.data, fill_values=self.fill_values)
+
+
+class NumericalEmptyOperation(ChunkedOperation):
+    """handle-empty-numerical-fields, with mean, median and mode fills taken over the whole column.
+
+    Fills are taken from a NumericSketch of each column, merged chunk by
+    chunk. Unless the payload asks for approximate fills, a median or mode
+    the sketch can no longer give exactly is found by holding the column's
+    present values (8 bytes a row) or counting every value.
+    Fills the working file's profile already has sketches for need no pass.
+    """
+
+    def __init__(self, name, data, date_parser=None):
+        super().__init__(name, data, date_parser)
+        self.approximate = bool(data.get('approximate', False))
+        self.fill_values = {}
+        self.needs_scan = any(handling in NUMERICAL_FILLS for handling in data.get('selections', {}).values())
+
+    def use_profile(self, profile):
+        for column, handling in self.data.get('selections', {}).items():
+            # Later columns are filled after rows empty in this one were deleted
+            if handling == 'delete-empty-rows':
+                break
+            stats = profile.columns.get(column)
+            sketch = None if stats is None or column in profile.stale else stats.sketch
+            if handling in NUMERICAL_FILLS and sketch is not None and (self.approximate or sketch.exact(handling)):
+                self.fill_values[column] = sketch.fill_value(handling)
+        self.needs_scan = any(handling in NUMERICAL_FILLS and column not in self.fill_values
+                              for column, handling in self.data.get('selections', {}).items())
+
+    def prepare(self, chunks):
+        selections = {column: handling for column, handling in self.data.get('selections', {}).items()
+                      if column not in self.fill_values}
+        sketches, parts, counts = {}, {}, {}
+        for chunk in chunks:
+            chunk = chunk.copy(deep=False)
+            for column, handling in selections.items():
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+                if handling == 'delete-empty-rows':
+                    chunk = chunk.dropna(subset=[column])
+                    continue
+                if handling not in NUMERICAL_FILLS:
+                    continue
+                present = chunk[column].dropna()
+                sketches.setdefault(column, NumericSketch()).add(present.to_numpy(dtype=float))
+                if self.approximate:
+                    continue
+                if handling == 'fill-median':
+                    parts.setdefault(column, []).append(present.to_numpy(dtype=float))
+                elif handling == 'fill-mode':
+                    counts[column] = add_counts(counts.get(column), present.value_counts())
+        for column, handling in selections.items():
+            if handling not in NUMERICAL_FILLS:
+                continue
+            sketch = sketches.get(column, NumericSketch())
+            if self.approximate or sketch.exact(handling):
+                self.fill_values[column] = sketch.fill_value(handling)
+            elif handling == 'fill-median':
+                self.fill_values[column] = float(np.median(np.concatenate(parts[column])))
+            else:
+                column_counts = counts[column]
+                # Like mode()[0]: the smallest of the most common values
+                self.fill_values[column] = min(column_counts.index[column_counts == column_counts.max()])
+
+    def apply(self, chunk):
+        return handle_empty_numerical_fields(chunk.copy(deep=False), self.data, fill_values=self.fill_values)
+
+
+class ClassificationOperation(ChunkedOperation):
+    """submit-classifications, giving newly categorical columns the same categories in every chunk"""
+
+    def __init__(self, name, data, date_parser=None):
+        super().__init__(name, data, date_parser)
+        self.categories = {}
+        self.needs_scan = bool(categorical_columns(data))
+
+    def prepare(self, chunks):
+        distinct = {}
+        for chunk in chunks:
+            for column in categorical_columns(self.data):
+                if column in chunk.columns and not isinstance(chunk[column].dtype, pd.CategoricalDtype):
+                    distinct.setdefault(column, {}).update(dict.fromkeys(chunk[column].dropna().unique()))
+        for column, values in distinct.items():
+            # Sorted like astype('category') sorts them, where the values can be
+            try:
+                self.categories[column] = sorted(values)
+            except TypeError:
+                self.categories[column] = list(values)
+
+    def apply(self, chunk):
+        chunk = chunk.copy(deep=False)
+        for column, categories in self.categories.items():
+            chunk[column] = chunk[column].astype(pd.CategoricalDtype(categories))
+        return store_classifications(chunk, self.data)
+
+
+class DeleteColumnsOperation(ChunkedOperation):
+    """delete-columns, finding duplicate rows across chunks.
+
+    A first pass hashes every row without the deleted columns and finds the
+    repeated hashes with repeated_hashes, holding a share of them at a time. Only rows whose hash occurs more
+    than once are compared by value, and only those kept so far are held,
+    so memory grows with the duplicates and with a 1/2**HASH_PARTITION_BITS
+    share of the hashes rather than with the file.
+    """
+
+    def __init__(self, name, data, date_parser=None):
+        super().__init__(name, data, date_parser)
+        self.columns = data.get('columns', [])
+        self.needs_scan = bool(data.get('deleteDuplicates', False))
+        self.candidates = np.empty(0, dtype=np.uint64)
+        self.kept = None
+        self.rows = 0
+
+    def prepare(self, chunks):
+        self.candidates = repeated_hashes(row_hashes(chunk.drop(columns=self.columns)) for chunk in chunks)
+
+    def start(self):
+        self.kept = None
+        self.rows = 0
+
+    def apply(self, chunk):
+        df = chunk.drop(columns=self.columns)
+        if len(df.columns) == 0:
+            raise ValueError('Cannot delete all columns. At least one column must remain.')
+        if self.needs_scan and len(self.candidates):
+            candidates = np.isin(row_hashes(df), self.candidates)
+            if candidates.any():
+                rows = df[candidates]
+                earlier = 0 if self.kept is None else len(self.kept)
+                combined = rows if self.kept is None else pd.concat([self.kept, rows])
+                duplicated = combined.duplicated().to_numpy()[earlier:]
+                self.kept = combined[~combined.duplicated()]
+                drop = np.zeros(len(df), dtype=bool)
+                drop[candidates] = duplicated
+                df = df[~drop]
+        self.rows += len(df)
+        return df
+
+    def finish(self):
+        if self.rows == 0:
+            raise ValueError('No data rows remaining after deletion.')
+
+
+CHUNKED_OPERATIONS = {
+    'apply-numerical-rounding': RoundingOperation,
+    'handle-empty-categorical-fields': CategoricalEmptyOperation,
+    'handle-empty-numerical-fields': NumericalEmptyOperation,
+    'submit-classifications': ClassificationOperation,
+    'delete-columns': DeleteColumnsOperation,
+}
+
+
+def chunked_operation(name, data, date_parser=None):
+    """The ChunkedOperation running a named operation as its route would"""
+    if name not in STEP_OPERATIONS and name not in FRAME_OPERATIONS:
+        raise ValueError(f'Unknown operation: {name}')
+    return CHUNKED_OPERATIONS.get(name, ChunkedOperation)(name, data, date_parser)
+
+
+class ChunkedResult:
+    """What a chunked run left in the working file"""
+
+    def __init__(self, columns, row_count, profile, row_index):
+        self.columns = columns
+        self.row_count = row_count
+        # ColumnProfile and RowHashIndex of the new data, built as it was written
+        self.profile = profile
+        self.row_index = row_index
+
+
+class Progress:
+    """Passes on how far a run has got to report(fraction, message) as its chunks go by"""
+
+    def __init__(self, report, passes, rows):
+        self.report = report
+        self.passes = passes
+        self.rows = max(rows, 1)
+        self.done_passes = 0
+        self.done_rows = 0
+
+    def start(self, done_passes):
+        self.done_passes = done_passes
+        self.done_rows = 0
+
+    def __call__(self, rows):
+        self.done_rows += rows
+        if self.report is not None:
+            fraction = (self.done_passes + min(self.done_rows / self.rows, 1)) / self.passes
+            self.report(fraction, f'Pass {self.done_passes + 1} of {self.passes}')
+
+    def saving(self):
+        """Report the last step, where a cancelled run stops before it replaces the file"""
+        if self.report is not None:
+            self.report(1.0, 'Saving')
+
+
+def transformed_chunks(filepath, operations, chunk_rows, progress=None):
+    """Chunks of a working file with operations applied in order"""
+    for operation in operations:
+        operation.start()
+    for chunk in iter_working_file(filepath, chunk_rows):
+        rows = len(chunk)
+        for index, operation in enumerate(operations):
+            try:
+                chunk = operation.apply(chunk)
+            except (RestartPass, SchemaMismatch):
+                raise
+            except Exception as e:
+                raise OperationError(index, e) from e
+        if progress is not None:
+            progress(rows)
+        yield chunk
+
+
+def run_chunked(filepath, operations, chunk_rows=BATCH_ROWS, report=None):
+    """Apply ChunkedOperations to a working file from input to output, one chunk in memory at a time.
+
+    Operations needing statistics each get a first pass over the file, run
+    through the operations before them. A final pass applies them all,
+    writing the result next to the working file, profiling it and hashing
+    its rows on the way, and replaces the working file only when the pass
+    has succeeded. report(fraction, message) hears of progress.
+    """
+    scans = [index for index, operation in enumerate(operations) if operation.needs_scan]
+    progress = Progress(report, len(scans) + 1, working_row_count(filepath))
+
+    for done, index in enumerate(scans):
+        while True:
+            progress.start(done)
+            try:
+                operations[index].prepare(transformed_chunks(filepath, operations[:index], chunk_rows, progress))
+                break
+            except RestartPass:
+                continue
+            except OperationError:
+                raise
+            except Exception as e:
+                raise OperationError(index, e) from e
+
+    # Types chunks disagreed on, and the types of the columns as they were
+    types = {}
+    fallback = {field.name: field.type for field in working_schema(filepath)}
+    while True:
+        progress.start(len(scans))
+        writer = WorkingFileWriter(filepath, types, fallback)
+        profile = ProfileBuilder()
+        hashes = SpilledRowHashIndex()
+        try:
+            for chunk in transformed_chunks(filepath, operations, chunk_rows, progress):
+                # Profiled and hashed as the file will hold it
+                chunk = writer.write(chunk)
+                values = value_hashes(chunk)
+                profile.add(chunk, values)
+                hashes.add(row_hashes(chunk, values))
+            for index, operation in enumerate(operations):
+                try:
+                    operation.finish()
+                except Exception as e:
+                    raise OperationError(index, e) from e
+            progress.saving()
+        except SchemaMismatch as e:
+            writer.abort()
+            types.update(e.types)
+            continue
+        except RestartPass:
+            writer.abort()
+            continue
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        return ChunkedResult(list(writer.schema.names), profile.row_count, profile.build(), hashes)
+
+
+def index_working_file(filepath, chunk_rows=BATCH_ROWS):
+    """ColumnProfile and SpilledRowHashIndex of a working file, read a chunk at a time"""
+    profile = ProfileBuilder()
+    hashes = SpilledRowHashIndex()
+    for chunk in iter_working_file(filepath, chunk_rows):
+        values = value_hashes(chunk)
+        profile.add(chunk, values)
+        hashes.add(row_hashes(chunk, values))
+    return profile.build(), hashes
@@ -0,0 +1,74 @@
+import re
+import numpy as np
+import pandas as pd
+from cleaning import DETECTABLE_DATE_FORMATS
+
+# Text that reads as a number, allowing a currency sign, thousands separators
+# and a trailing percent sign
+NUMBER_TEXT = re.compile(r'^\s*[-+]?[$€£¥]?\s*(\d{1,3}(,\d{3})+|\d+)?(\.\d+)?\s*%?\s*$')
+
+# Share of sampled values that must parse for a text column to count as numbers or dates
+TYPE_MIN_SHARE = 0.8
+
+# Columns with at most this many distinct values, each repeated on average at
+# least 1 / CATEGORICAL_MAX_RATIO times, look like categories
+CATEGORICAL_MAX_DISTINCT = 100
+CATEGORICAL_MAX_RATIO = 0.5
+
+
+class Suggestion:
+    """A proposed classification for a column and how sure the classifier is of it"""
+
+    def __init__(self, classification, confidence):
+        self.classification = classification
+        self.confidence = round(float(confidence), 3)
+
+    def to_dict(self):
+        return {'classification': self.classification, 'confidence': self.confidence}
+
+
+def number_share(values):
+    """Share of sampled text values that read as numbers"""
+    matches = [bool(NUMBER_TEXT.match(value)) and any(c.isdigit() for c in value) for value in values]
+    return float(np.mean(matches))
+
+
+def date_share(values):
+    """Share of sampled text values that parse with the best fitting detectable date format"""
+    best = 0
+    for date_format in DETECTABLE_DATE_FORMATS:
+        best = max(best, pd.to_datetime(values, format=date_format, errors='coerce').notna().sum())
+    return best / len(values)
+
+
+def suggest_classification(stats, row_count):
+    """Guess the classification of a column of row_count rows from its ColumnStats.
+
+    Number and date detection only look at the column's sample, so the cost
+    does not grow with the size of the file. Categories are judged on the
+    column's exact distinct count.
+    """
+    present = stats.sample
+    if len(present) == 0:
+        return Suggestion('Non-categorical', 0.0)
+    if stats.dtype == 'bool':
+        return Suggestion('Categorical', 1.0)
+    if stats.dtype.startswith(('int', 'uint', 'float')):
+        return Suggestion('Numerical', 1.0)
+    if stats.dtype.startswith('datetime'):
+        return Suggestion('Date', 1.0)
+
+    text = pd.Index(present).astype(str)
+    dates = date_share(text)
+    if dates >= TYPE_MIN_SHARE:
+        return Suggestion('Date', dates)
+    numbers = number_share(text)
+    if numbers >= TYPE_MIN_SHARE:
+        return Suggestion('Numerical', numbers)
+
+    ratio = stats.distinct_count / max(row_count - stats.null_count, 1)
+    if stats.distinct_count <= CATEGORICAL_MAX_DISTINCT and ratio <= CATEGORICAL_MAX_RATIO:
+        return Suggestion('Categorical', 1 - ratio)
+    # Less sure the fewer distinct values there are
+    return Suggestion('Non-categorical', min(1.0, max(ratio / CATEGORICAL_MAX_RATIO,
+                                                       stats.distinct_count / (2 * CATEGORICAL_MAX_DISTINCT))))
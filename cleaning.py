@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Everything that is not a digit, a decimal point or a minus sign
+NON_NUMERIC_CHARS = r'[^\d.\-]'
+
+
+def is_plain_numeric(series):
+    """True for int and float columns, which need no cleaning to become numbers"""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def clean_numbers(series):
+    """Strip values down to digits, one decimal point and a leading minus sign.
+
+    Extra decimal points after the first are dropped, several minus signs
+    collapse into one leading sign and values left empty become missing.
+    Raises ValueError when a cleaned value still is not a number.
+    """
+    if is_plain_numeric(series):
+        return series.astype(float)
+
+    present = series.notna()
+    text = series[present].astype(str).str.replace(NON_NUMERIC_CHARS, '', regex=True)
+
+    # Keep only the first decimal point
+    many_points = text.str.count(r'\.') > 1
+    if many_points.any():
+        parts = text[many_points].str.partition('.')
+        text[many_points] = parts[0] + '.' + parts[2].str.replace('.', '', regex=False)
+
+    # Keep only one negative sign, at the front
+    many_signs = text.str.count('-') > 1
+    if many_signs.any():
+        text[many_signs] = '-' + text[many_signs].str.replace('-', '', regex=False)
+
+    result = pd.Series(np.nan, index=series.index, dtype=float)
+    result[present] = text.replace('', np.nan).astype(float)
+    return result
+
+
+def text_array(series):
+    """Arrow array of a column as text, missing values null.
+
+    Columns of pandas' str dtype are already held in Arrow and are handed
+    over without a copy; other columns are converted to it once.
+    """
+    values = pa.array(series.astype('str').array)
+    return values if isinstance(values, pa.ChunkedArray) else pa.chunked_array([values])
+
+
+def normalize_text_array(values):
+    """Arrow equivalent of ' '.join(x.replace('_', ' ').split())"""
+    values = pc.utf8_trim_whitespace(pc.replace_substring(values, '_', ' '))
+    return pc.binary_join(pc.utf8_split_whitespace(values), pa.scalar(' ', type=values.type))
+
+
+def from_text_array(values, index):
+    """Column of the str dtype wrapping an Arrow array, without a copy"""
+    return pd.Series(pd.array(values, dtype='str'), index=index)
+
+
+def normalize_text(series):
+    """Vectorized ' '.join(x.replace('_', ' ').split()) that keeps missing values, as a str column"""
+    return from_text_array(normalize_text_array(text_array(series)), series.index)
+
+
+def normalize_text_columns(df, columns):
+    """Normalize several text columns with a single pass over all their values"""
+    if not columns:
+        return df
+    arrays = [text_array(df[column]) for column in columns]
+    combined = pa.chunked_array([chunk for values in arrays for chunk in values.chunks], type=arrays[0].type)
+    normalized = normalize_text_array(combined)
+    offset = 0
+    for column, values in zip(columns, arrays):
+        df[column] = from_text_array(normalized.slice(offset, len(values)), df.index)
+        offset += len(values)
+    return df
+
+
+
+def remap_values(series, mapping):
+    """Vectorized series.map(lambda x: mapping.get(x, x)).
+
+    The column is factorized, the mapping is looked up once per distinct
+    value present and the results are spread back over the rows by code.
+    """
+    codes, uniques = pd.factorize(series)
+    mapped = uniques.isin(list(mapping))
+    if not mapped.any():
+        return series
+    labels = uniques.to_numpy(dtype=object, copy=True)
+    labels[mapped] = [mapping[value] for value in uniques[mapped]]
+    # The dtype is inferred from the distinct labels rather than every row,
+    # and code -1 marks a missing value, which take leaves missing
+    labels = pd.Series(labels).infer_objects().array
+    return pd.Series(labels.take(codes, allow_fill=True), index=series.index, name=series.name)
+
+
+# Layouts tried when detecting how a date column is written. Day-first
+# layouts are left out so detection agrees with format='mixed', which reads
+# ambiguous dates month first.
+DETECTABLE_DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%m-%d-%Y']
+
+# Distinct values looked at when detecting a column's date format
+DATE_SAMPLE_SIZE = 100
+
+# Columns with more distinct date strings than this are not remembered
+DATE_CACHE_MAX_VALUES = 100000
+
+
+def detect_date_format(values):
+    """The detectable format that parses the most of a sample of date strings, or None"""
+    sample = values[:DATE_SAMPLE_SIZE]
+    best_format, best_count = None, 0
+    for date_format in DETECTABLE_DATE_FORMATS:
+        count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format
+
+
+def format_dates(dates, pattern):
+    """strftime a datetime column, formatting each distinct date once"""
+    distinct = pd.DatetimeIndex(dates.dropna().unique())
+    return dates.map(pd.Series(distinct.strftime(pattern), index=distinct))
+
+
+class DateParser:
+    """Parses date columns one distinct string at a time and remembers the results.
+
+    For each column it keeps the format detected in its values and the
+    datetime parsed from every distinct string seen. Strings matching the
+    detected format are parsed strictly, which is much faster than
+    format='mixed', and only the rest fall back to mixed parsing. Formatted
+    output is remembered too, so reformatting a column parses nothing again.
+    """
+
+    def __init__(self):
+        self.formats = {}
+        self.parsed = {}
+
+    def copy(self):
+        """Independent parser starting from what this one knows"""
+        parser = DateParser()
+        parser.formats = dict(self.formats)
+        parser.parsed = dict(self.parsed)
+        return parser
+
+    def parse(self, column, series):
+        """Parse a column like pd.to_datetime(series, format='mixed', errors='coerce'), reading its format first.
+
+        Strings that fit the column's format are read by that format and
+        only the rest as format='mixed'. The format is detected month first
+        (DETECTABLE_DATE_FORMATS) or, once the column has been formatted,
+        is the format it was written in. After formatting as dd/mm/yyyy an
+        ambiguous string like '03/04/2020' is read day first, as 3 April,
+        where format='mixed' would read 4 March.
+        """
+        if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+            return pd.to_datetime(series, format='mixed', errors='coerce')
+
+        # Parse each distinct string once and spread the results over the rows
+        codes, distinct = pd.factorize(series)
+        known = self.parsed.get(column)
+        new = distinct if known is None else distinct[~distinct.isin(known.index)]
+        if len(new) or known is None:
+            known = self.remember(column, self.parse_values(column, pd.Index(new)))
+        # Code -1 marks a missing value, which take fills with NaT
+        parsed = known.reindex(distinct).array.take(codes, allow_fill=True)
+        return pd.Series(parsed, index=series.index, name=series.name)
+
+    def parse_values(self, column, values):
+        """Parse distinct strings, strictly where the column's format fits"""
+        if column not in self.formats:
+            detected = detect_date_format(values)
+            if detected is not None:
+                self.formats[column] = detected
+        if column in self.formats:
+            strict = pd.to_datetime(values, format=self.formats[column], errors='coerce')
+            parsed = pd.Series(strict, index=values)
+        else:
+            parsed = pd.Series(pd.NaT, index=values, dtype='datetime64[ns]')
+        unparsed = parsed.isna().to_numpy()
+        if unparsed.any():
+            parsed[unparsed] = pd.to_datetime(values[unparsed], format='mixed', errors='coerce')
+        return parsed
+
+    def remember(self, column, parsed):
+        """Add parsed strings to a column's cache, replacing entries for the same strings"""
+        known = self.parsed.get(column)
+        if known is not None:
+            parsed = pd.concat([known[~known.index.isin(parsed.index)], parsed])
+        if len(parsed) > DATE_CACHE_MAX_VALUES:
+            self.parsed.pop(column, None)
+        else:
+            self.parsed[column] = parsed
+        return parsed
+
+    def record_formatted(self, column, pattern, formatted, dates):
+        """Remember what formatted output parses back to, and expect that format next time"""
+        # The output holds the date only, so it parses back to midnight of that date
+        output = pd.Series(dates.dt.normalize().to_numpy(), index=formatted.to_numpy())
+        self.remember(column, output[~output.index.duplicated()])
+        self.formats[column] = pattern
@@ -0,0 +1,420 @@
+import numpy as np
+import pandas as pd
+from sketches import FrequentValues, HyperLogLog, NumericSketch
+
+# Text that the categorical routes treat as an empty value
+NA_TEXT = '<NA>'
+
+# Non-missing values kept per column for type inference
+SAMPLE_SIZE = 1000
+
+# Fewest new hashes worth merging into a column's distinct hashes
+MERGE_MIN_HASHES = 1 << 20
+
+# Distinct hashes a column keeps before its distinct values are estimated instead
+DISTINCT_EXACT_MAX = 1 << 16
+
+# Values ValueCounts.of_chunks keeps counts of for a column read a chunk at
+# a time; past that many only the most common are kept
+VALUE_COUNTS_MAX = 1 << 16
+
+
+def has_range(series):
+    """True for columns whose min and max are worth reporting"""
+    return ((pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series))
+            or pd.api.types.is_datetime64_any_dtype(series))
+
+
+def scalar(value):
+    """Plain Python value for a numpy or pandas scalar, None when missing"""
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if hasattr(value, 'item') else value
+
+
+def na_text_count(series):
+    if (pd.api.types.is_string_dtype(series) or series.dtype == object
+            or isinstance(series.dtype, pd.CategoricalDtype)):
+        return int(series.eq(NA_TEXT).sum())
+    return 0
+
+
+def is_sketched(series):
+    """True for columns whose values a NumericSketch can summarize"""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def merge_inferred_types(current, new):
+    """Inferred type of a column after seeing a chunk inferred as new"""
+    if current is None or current == 'empty' or current == new:
+        return new
+    if new == 'empty':
+        return current
+    return 'mixed'
+
+
+def sample_values(series, size=SAMPLE_SIZE, seed=0):
+    """Uniform sample of at most size non-missing values of a column"""
+    present = series.dropna().to_numpy(dtype=object)
+    if len(present) <= size:
+        return present
+    rng = np.random.default_rng(seed)
+    return present[np.sort(rng.choice(len(present), size, replace=False))]
+
+
+class Reservoir:
+    """Uniform sample of at most size values from a stream read in chunks.
+
+    Algorithm R, with the random slot of every value of a chunk drawn at once.
+    """
+
+    def __init__(self, size=SAMPLE_SIZE, seed=0):
+        self.size = size
+        self.seen = 0
+        self.values = np.empty(0, dtype=object)
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        """Offer a chunk of values, an array, of which only those kept are converted to objects"""
+        if not hasattr(values, 'dtype'):
+            values = np.asarray(values, dtype=object)
+        # Fill the reservoir before replacing anything
+        fill = min(max(self.size - self.seen, 0), len(values))
+        if fill:
+            self.values = np.concatenate([self.values, np.asarray(values[:fill], dtype=object)])
+        rest = len(values) - fill
+        if rest:
+            # Value number n of the stream replaces a random slot with chance size / n
+            positions = self.seen + fill + np.arange(rest)
+            slots = self.rng.integers(0, positions + 1)
+            kept = np.flatnonzero(slots < self.size)
+            slots = slots[kept]
+            # Of several values drawn for the same slot, the last one stays
+            last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+            self.values[slots[last]] = np.asarray(values[fill + kept[last]], dtype=object)
+        self.seen += len(values)
+
+
+class ColumnStats:
+    """Summary of one column of the working data"""
+
+    def __init__(self, dtype, inferred_type, null_count, na_text_count, distinct_count, min_value, max_value,
+                 sample=None, sketch=None):
+        self.dtype = dtype
+        self.inferred_type = inferred_type
+        self.null_count = null_count
+        # Non-missing values that are the text '<NA>'
+        self.na_text_count = na_text_count
+        self.distinct_count = distinct_count
+        self.min = min_value
+        self.max = max_value
+        # Uniformly sampled non-missing values, for guessing the column's classification
+        self.sample = sample if sample is not None else np.empty(0, dtype=object)
+        # NumericSketch of a numeric column, when it was profiled a chunk at a time
+        self.sketch = sketch
+
+    @classmethod
+    def of(cls, series):
+        """Scan a column and summarize it"""
+        ranged = has_range(series)
+        return cls(
+            dtype=str(series.dtype),
+            inferred_type=pd.api.types.infer_dtype(series, skipna=True),
+            null_count=int(series.isna().sum()),
+            na_text_count=na_text_count(series),
+            distinct_count=int(series.nunique(dropna=True)),
+            min_value=scalar(series.min()) if ranged else None,
+            max_value=scalar(series.max()) if ranged else None,
+            sample=sample_values(series),
+        )
+
+    @property
+    def empty_count(self):
+        """Values the categorical routes treat as empty, missing or '<NA>'"""
+        return self.null_count + self.na_text_count
+
+    def to_dict(self):
+        return {
+            'dtype': self.dtype,
+            'inferredType': self.inferred_type,
+            'nullCount': self.null_count,
+            'naTextCount': self.na_text_count,
+            'distinctCount': self.distinct_count,
+            'min': self.min,
+            'max': self.max,
+        }
+
+
+def sort_by_value(counts):
+    """Value counts ordered by value, by their text when the values cannot be compared"""
+    try:
+        return counts.sort_index()
+    except TypeError:
+        order = np.argsort(counts.index.astype(str).to_numpy(), kind='stable')
+        return counts.iloc[order]
+
+
+def present_counts(series):
+    """value_counts of a column without missing values or categories no row has"""
+    counts = series.value_counts(dropna=True)
+    if isinstance(counts.index, pd.CategoricalIndex):
+        # Leave out categories no row has any more, and sort by value
+        # rather than by category order
+        counts = counts[counts > 0]
+        counts.index = pd.Index(counts.index.to_numpy())
+    return counts
+
+
+class ValueCounts:
+    """How often each distinct value of a column occurs, ready to be paged through.
+
+    Counts built a chunk at a time (of_chunks) hold only the most common
+    VALUE_COUNTS_MAX values of a column with more than that; exact is then
+    False and every count is low by at most error.
+    """
+
+    def __init__(self, counts, error=0):
+        # Most frequent values first
+        self.by_count = counts
+        self.by_value = sort_by_value(counts)
+        self.error = error
+        self._labels = {}
+
+    @classmethod
+    def of(cls, series):
+        # value_counts already puts the most frequent values first
+        return cls(present_counts(series))
+
+    @classmethod
+    def of_chunks(cls, chunks, counters=None):
+        """Counts of a column given as a stream of series, holding at most counters (VALUE_COUNTS_MAX) values at a time"""
+        frequent = FrequentValues(counters or VALUE_COUNTS_MAX)
+        for series in chunks:
+            counts = present_counts(series)
+            frequent.add_counts(counts, int(counts.sum()), 0)
+        counts = frequent.counts.astype('int64').sort_values(ascending=False, kind='stable')
+        return cls(counts, int(frequent.error))
+
+    @property
+    def exact(self):
+        return self.error == 0
+
+    def __len__(self):
+        return len(self.by_count)
+
+    def ordered(self, order):
+        return self.by_count if order == 'count' else self.by_value
+
+    def labels(self, order):
+        """Lower-cased text of each value, for prefix searches"""
+        if order not in self._labels:
+            self._labels[order] = self.ordered(order).index.astype(str).str.lower()
+        return self._labels[order]
+
+    def page(self, order='value', prefix='', offset=0, limit=100):
+        """Counts of at most limit values, starting at offset, and how many values matched"""
+        counts = self.ordered(order)
+        if prefix:
+            counts = counts[self.labels(order).str.startswith(prefix.lower())]
+        return counts.iloc[offset:offset + limit], len(counts)
+
+
+class DistinctHashes:
+    """Distinct values of a column read in chunks, counted from their 64-bit hashes.
+
+    Up to DISTINCT_EXACT_MAX distinct hashes are kept and counted exactly.
+    New hashes wait until there are as many of them as distinct hashes
+    already merged, so merging costs O(n) over the whole file rather than
+    O(n) per chunk. Past that many, the hashes are dropped for a
+    HyperLogLog estimate, so memory does not grow with the column.
+    """
+
+    def __init__(self):
+        self.merged = np.empty(0, dtype=np.uint64)
+        self.pending = []
+        self.pending_count = 0
+        self.estimate = None
+
+    @property
+    def exact(self):
+        return self.estimate is None
+
+    def add(self, hashes):
+        if self.estimate is not None:
+            self.estimate.add(hashes)
+            return
+        hashes = pd.unique(hashes)
+        self.pending.append(hashes)
+        self.pending_count += len(hashes)
+        if self.pending_count >= min(max(len(self.merged), MERGE_MIN_HASHES), DISTINCT_EXACT_MAX):
+            self.merge()
+
+    def merge(self):
+        if self.pending:
+            self.merged = pd.unique(np.concatenate([self.merged] + self.pending))
+            self.pending = []
+            self.pending_count = 0
+        if self.estimate is None and len(self.merged) > DISTINCT_EXACT_MAX:
+            self.estimate = HyperLogLog()
+            self.estimate.add(self.merged)
+            self.merged = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        self.merge()
+        return len(self.merged) if self.estimate is None else len(self.estimate)
+
+
+class ProfileBuilder:
+    """Builds a ColumnProfile from a file read one chunk at a time.
+
+    Distinct values are counted from 64-bit hashes (DistinctHashes, exact
+    up to DISTINCT_EXACT_MAX of them and estimated past that), values are
+    sampled through a fixed-size reservoir and numeric columns are
+    summarized in a NumericSketch, so memory does not grow with the file.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.dtypes = {}
+        self.inferred = {}
+        self.nulls = {}
+        self.na_text = {}
+        self.hashes = {}
+        self.mins = {}
+        self.maxes = {}
+        self.samples = {}
+        # None for columns some chunk of which was not numeric
+        self.sketches = {}
+        self.row_count = 0
+
+    def add(self, chunk, hashes=None):
+        """Profile a chunk, given the hashes of its values by column when they were already taken"""
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+        for column in self.columns:
+            series = chunk[column]
+            present = series.dropna()
+            self.dtypes[column] = str(series.dtype)
+            self.inferred[column] = merge_inferred_types(
+                self.inferred.get(column), pd.api.types.infer_dtype(series, skipna=True))
+            self.nulls[column] = self.nulls.get(column, 0) + len(series) - len(present)
+            self.na_text[column] = self.na_text.get(column, 0) + na_text_count(present)
+            if hashes is None:
+                present_hashes = pd.util.hash_pandas_object(present, index=False).to_numpy()
+            else:
+                present_hashes = hashes[column][series.notna().to_numpy()]
+            self.hashes.setdefault(column, DistinctHashes()).add(present_hashes)
+            self.samples.setdefault(column, Reservoir()).add(present.array)
+            if has_range(series) and len(present):
+                low, high = present.min(), present.max()
+                self.mins[column] = low if column not in self.mins else min(self.mins[column], low)
+                self.maxes[column] = high if column not in self.maxes else max(self.maxes[column], high)
+            if is_sketched(series):
+                if self.sketches.setdefault(column, NumericSketch()) is not None:
+                    self.sketches[column].add(present.to_numpy(dtype=float))
+            elif len(present):
+                self.sketches[column] = None
+        self.row_count += len(chunk)
+
+    def build(self):
+        profile = ColumnProfile(self.row_count)
+        for column in self.columns or []:
+            profile.columns[column] = ColumnStats(
+                dtype=self.dtypes[column],
+                inferred_type=self.inferred[column],
+                null_count=int(self.nulls[column]),
+                na_text_count=int(self.na_text[column]),
+                distinct_count=len(self.hashes[column]),
+                min_value=scalar(self.mins.get(column)),
+                max_value=scalar(self.maxes.get(column)),
+                sample=self.samples[column].values,
+                sketch=self.sketches.get(column),
+            )
+        return profile
+
+
+class ColumnProfile:
+    """Per-column statistics of a working file, kept up to date between requests.
+
+    Routes that change the data refresh only the columns they touched, or
+    mark them stale when the new values are not at hand (lazy mode). Stale
+    columns are rescanned the next time they are read, so checks that read
+    the profile cost O(columns) rather than a scan of the data.
+    """
+
+    def __init__(self, row_count=0):
+        self.row_count = row_count
+        self.columns = {}
+        self.stale = set()
+        # ValueCounts of columns that have been asked for, dropped when they change
+        self.value_counts = {}
+
+    @classmethod
+    def of(cls, df):
+        profile = cls(len(df))
+        profile.refresh(df, df.columns)
+        return profile
+
+    def refresh(self, df, columns):
+        """Rescan the given columns of df, forgetting any columns df no longer has"""
+        for column in [c for c in self.columns if c not in df.columns]:
+            del self.columns[column]
+            self.stale.discard(column)
+            self.value_counts.pop(column, None)
+        for column in columns:
+            if column in df.columns:
+                self.columns[column] = ColumnStats.of(df[column])
+                self.stale.discard(column)
+                self.value_counts.pop(column, None)
+        self.row_count = len(df)
+
+    def update(self, df, columns):
+        """Bring the profile up to date after the given columns of df were rewritten"""
+        if len(df) != self.row_count:
+            # Dropped rows change every column, the others are rescanned when next read
+            self.invalidate()
+        self.refresh(df, columns)
+
+    def mark_changed(self, columns, row_count):
+        """Like update, for when only the new row count is at hand"""
+        self.invalidate(None if row_count != self.row_count else columns)
+        self.row_count = row_count
+
+    def invalidate(self, columns=None):
+        """Mark columns as changed without rescanning them, all columns by default"""
+        columns = list(self.columns) if columns is None else [c for c in columns if c in self.columns]
+        self.stale.update(columns)
+        for column in columns:
+            self.value_counts.pop(column, None)
+
+    def stats(self, columns, load_columns, scan=None):
+        """Stats for the given columns, rescanning stale ones through load_columns(columns).
+
+        scan(columns), when given, yields the columns a chunk at a time
+        instead, for data too large to load, and they are rescanned with a
+        ProfileBuilder.
+        """
+        stale = [column for column in columns if column in self.stale]
+        if stale:
+            if scan is None:
+                df = load_columns(stale)
+                fresh = {column: ColumnStats.of(df[column]) for column in stale}
+            else:
+                builder = ProfileBuilder()
+                for chunk in scan(stale):
+                    builder.add(chunk)
+                fresh = builder.build().columns
+            self.columns.update(fresh)
+            self.stale.difference_update(fresh)
+        return {column: self.columns[column] for column in columns}
+
+    def counts(self, column, load_columns, scan=None):
+        """ValueCounts of a column, counted once and kept until the column changes, see stats for scan"""
+        if column not in self.value_counts:
+            if scan is None:
+                self.value_counts[column] = ValueCounts.of(load_columns([column])[column])
+            else:
+                self.value_counts[column] = ValueCounts.of_chunks(chunk[column] for chunk in scan([column]))
+        return self.value_counts[column]
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedFrame:
+    """A working DataFrame held in memory together with its bookkeeping"""
+
+    def __init__(self, df, dirty, nbytes, version=None):
+        self.df = df
+        self.dirty = dirty
+        self.nbytes = nbytes
+        # When the changes not yet written back were made
+        self.changed = time.time()
+        # Version of the working file the frame was read from or written as
+        self.version = version
+
+
+def frame_nbytes(df):
+    """Estimate the in-memory size of a dataframe in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    """LRU cache of working DataFrames keyed by the path of their working file.
+
+    Frames are written back to disk when they are evicted to stay under the
+    memory budget, when flush() is called explicitly (e.g. on download), and
+    by write_back(), which the app calls every few seconds so a restart
+    loses little.
+    A frame whose write-back fails stays in the cache with its changes
+    unsaved: put() and flush() raise the error, and eviction skips the
+    frame until a flush reports it to its owner.
+    Frames can also be kept as clean copies of a given version of their file,
+    in which case get() only returns them while that version is current.
+    """
+
+    def __init__(self, writer, max_bytes):
+        self.writer = writer
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, version=None):
+        """Return the cached frame for key, or None if it is not cached or not of this version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if version is not None and entry.version != version:
+                # Another process has published a newer version
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # Hand out a shallow copy so a route that fails half way through
+            # cannot leave a partially modified frame behind (copy-on-write)
+            return entry.df.copy(deep=False)
+
+    def put(self, key, df, dirty=True, version=None):
+        """Store df under key, evicting least recently used frames if needed"""
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            if nbytes > self.max_bytes:
+                # A frame bigger than the whole budget is never kept in memory.
+                # If it cannot be written, whatever was cached before is kept
+                if dirty:
+                    self._write(key, df)
+                self._entries.pop(key, None)
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = CachedFrame(df, dirty, nbytes, version)
+            self._evict()
+
+    def flush(self, key):
+        """Write the frame for key back to disk if it has unsaved changes"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.dirty:
+                self._write(key, entry.df)
+                entry.dirty = False
+
+    def write_back(self, older_than=0):
+        """Write back every frame whose changes were made at least older_than seconds ago"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.dirty and entry.changed <= cutoff:
+                    try:
+                        self._write(key, entry.df)
+                    except Exception as e:
+                        # Kept with its changes, the error is raised by the next flush
+                        print(f"Error writing back {key}: {str(e)}")
+                        continue
+                    entry.dirty = False
+
+    def discard(self, key):
+        """Drop the frame for key without writing it back"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for entry in self._entries.values())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def _evict(self):
+        total = self.total_bytes()
+        for key, entry in list(self._entries.items()):
+            if total <= self.max_bytes:
+                break
+            if entry.dirty:
+                try:
+                    self._write(key, entry.df)
+                except Exception as e:
+                    # Kept with its changes, the error is raised by the next flush
+                    print(f"Error writing back {key}: {str(e)}")
+                    continue
+            del self._entries[key]
+            total -= entry.nbytes
+
+    def _write(self, key, df):
+        # The working file disappears once it is downloaded or cleaned up,
+        # in which case there is nothing left to write back to
+        if not os.path.exists(key):
+            return
+        self.writer(key, df)
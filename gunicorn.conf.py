@@ -0,0 +1,14 @@
+# Settings gunicorn reads from the working directory when serving app:app.
+# The number of workers comes from -w / WEB_CONCURRENCY as usual.
+
+
+def post_worker_init(worker):
+    """Start each worker once the app is loaded, sharing its store with the others when there are several"""
+    from app import start_app
+    start_app(workers=worker.cfg.workers)
+
+
+def worker_exit(server, worker):
+    """Write back changes a single worker still holds in memory before it stops"""
+    from app import frame_cache
+    frame_cache.write_back()
@@ -0,0 +1,135 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from working_store import arrow_compatible, read_working_rows
+from column_profile import ProfileBuilder
+from row_index import SpilledRowHashIndex, row_hashes, value_hashes
+
+
+class IngestResult:
+    """What was learned about an uploaded CSV while converting it"""
+
+    def __init__(self, filepath, columns, row_count, null_counts, row_index, profile):
+        self.filepath = filepath
+        self.columns = columns
+        self.row_count = row_count
+        self.null_counts = null_counts
+        # SpilledRowHashIndex of the converted data, loaded once the file is known to fit in memory
+        self.row_index = row_index
+        # ColumnProfile of the converted data
+        self.profile = profile
+
+    @property
+    def duplicate_count(self):
+        """Rows identical to an earlier row, like df.duplicated().sum()"""
+        return self.row_index.duplicate_count(lambda positions: read_working_rows(self.filepath, positions))
+
+
+def merge_dtypes(current, new):
+    """Widen a column's dtype so it can hold the values seen in a new chunk"""
+    if current is None or current == new:
+        return new
+    numeric = [pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in (current, new)]
+    if all(numeric):
+        return np.dtype('float64')
+    # Anything else that disagrees between chunks is kept as text
+    return str
+
+
+class WidenColumns(Exception):
+    """Raised when a chunk has values that columns of the dtypes earlier chunks were written with cannot hold"""
+
+    def __init__(self, dtypes):
+        super().__init__(f'Columns changed type between chunks: {", ".join(dtypes)}')
+        self.dtypes = dtypes
+
+
+def is_text_dtype(dtype):
+    return dtype == object or pd.api.types.is_string_dtype(dtype)
+
+
+def settle_dtypes(chunk, settled):
+    """Give a chunk's columns the dtypes in settled, adding those of columns it is the first to see.
+
+    Raises WidenColumns with the merge_dtypes of the columns settled cannot hold.
+    """
+    wider = {}
+    for column in chunk.columns:
+        series = chunk[column]
+        current = settled.setdefault(column, series.dtype)
+        if current is str or series.dtype == current:
+            continue
+        merged = merge_dtypes(current, series.dtype)
+        if merged == current:
+            # e.g. integers in a column of floats
+            chunk[column] = series.astype(current)
+        elif is_text_dtype(current) and series.isna().all():
+            # A chunk with no values of a text column, read as floats
+            chunk[column] = pd.Series(np.nan, index=series.index, dtype=current)
+        else:
+            wider[column] = merged
+    if wider:
+        raise WidenColumns(wider)
+    return chunk
+
+
+def ingest_csv(stream, filepath, chunksize=100000):
+    """Convert a CSV stream into a working file without loading it all at once.
+
+    The first chunk settles the dtype of each column. Should a later chunk
+    hold values a column's dtype cannot, the column is widened the way
+    merge_dtypes does and the stream is read again from the start, which
+    is rare once a first chunk of the data has been seen. Each chunk is
+    written out, its rows hashed and its columns profiled in the same pass,
+    from one hash of each value.
+    Peak memory depends on the chunk size, not on the size of the file.
+    """
+    dtypes = {}
+    while True:
+        stream.seek(0)
+        try:
+            return write_chunks(stream, filepath, chunksize, dtypes)
+        except WidenColumns as e:
+            dtypes.update(e.dtypes)
+
+
+def write_chunks(stream, filepath, chunksize, dtypes):
+    """One pass of ingest_csv, with dtypes earlier passes widened columns to"""
+    # Text is read as it is in the file, other widened columns are converted after reading
+    text = {column: str for column, dtype in dtypes.items() if dtype is str}
+    settled = dict(dtypes)
+    temp_path = filepath + '.tmp'
+    hashes = SpilledRowHashIndex()
+    row_count = 0
+    columns = []
+    null_counts = {}
+    profile = ProfileBuilder()
+    writer = None
+    schema = None
+    try:
+        reader = pd.read_csv(stream, chunksize=chunksize, dtype=text or None)
+        # Closing the reader, rather than leaving it to be collected, keeps the stream open for another pass
+        with pa.OSFile(temp_path, 'wb') as sink, reader:
+            for chunk in reader:
+                chunk = settle_dtypes(chunk, settled)
+                if writer is None:
+                    columns = chunk.columns.tolist()
+                    null_counts = dict.fromkeys(columns, 0)
+                    schema = pa.Table.from_pandas(arrow_compatible(chunk), preserve_index=False).schema
+                    writer = pa.ipc.new_file(sink, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                values = value_hashes(chunk)
+                hashes.add(row_hashes(chunk, values))
+                profile.add(chunk, values)
+                for column, count in chunk.isna().sum().items():
+                    null_counts[column] += int(count)
+                row_count += len(chunk)
+            if writer is not None:
+                writer.close()
+        os.replace(temp_path, filepath)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return IngestResult(filepath, columns, row_count, null_counts, hashes, profile.build())
@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sessions import SQLiteFile
+
+# Job states; a job in one of the last three is finished
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = {DONE, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was asked to stop"""
+
+
+class JobLimitError(Exception):
+    """Raised when an owner already has as many unfinished jobs as allowed"""
+
+
+class Job:
+    """A unit of work run by the JobQueue, with progress its work can report"""
+
+    def __init__(self, owner, store=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        # SharedJobStore the job's state is published to, if any
+        self.store = store
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, progress, message=''):
+        """Record how far the work has got, stopping it if it was cancelled"""
+        self.check_cancelled()
+        self.progress = progress
+        self.message = message
+        self.publish()
+
+    def cancel_requested(self):
+        """Whether the job was cancelled here or, through a shared store, by another worker"""
+        return self._cancel.is_set() or (self.store is not None and self.store.cancel_requested(self.id))
+
+    def check_cancelled(self):
+        if self.cancel_requested():
+            raise JobCancelled()
+
+    def publish(self):
+        if self.store is not None:
+            self.store.save(self)
+
+    def to_dict(self):
+        return {
+            'jobId': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class StoredJob:
+    """A job another worker runs, as last published to a SharedJobStore"""
+
+    def __init__(self, state):
+        self.id = state['jobId']
+        self.status = state['status']
+        self.state = state
+
+    def to_dict(self):
+        return dict(self.state)
+
+
+class SharedJobStore(SQLiteFile):
+    """State of every worker's jobs in a SQLite file, so any worker can report on or cancel a job.
+
+    The worker running a job publishes its state as it changes; a cancel
+    from another worker is a flag the running worker checks at the job's
+    next progress report.
+    """
+
+    def __init__(self, path, timeout=30):
+        super().__init__(path, timeout)
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, owner TEXT NOT NULL, '
+                       'state TEXT NOT NULL, cancelled INTEGER NOT NULL DEFAULT 0, finished REAL)')
+
+    def save(self, job):
+        with self._transaction() as db:
+            db.execute('INSERT INTO jobs (id, owner, state, finished) VALUES (?, ?, ?, ?) '
+                       'ON CONFLICT (id) DO UPDATE SET state = excluded.state, finished = excluded.finished',
+                       (job.id, job.owner, json.dumps(job.to_dict()), job.finished))
+
+    def load(self, job_id, owner):
+        """The owner's job with this id, or None"""
+        row = self._connection().execute('SELECT state FROM jobs WHERE id = ? AND owner = ?',
+                                         (job_id, owner)).fetchone()
+        return None if row is None else StoredJob(json.loads(row[0]))
+
+    def cancel(self, job_id):
+        with self._transaction() as db:
+            db.execute('UPDATE jobs SET cancelled = 1 WHERE id = ?', (job_id,))
+
+    def cancel_requested(self, job_id):
+        row = self._connection().execute('SELECT cancelled FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row is not None and bool(row[0])
+
+    def active_count(self, owner):
+        return self._connection().execute('SELECT COUNT(*) FROM jobs WHERE owner = ? AND finished IS NULL',
+                                          (owner,)).fetchone()[0]
+
+    def prune(self, cutoff):
+        with self._transaction() as db:
+            db.execute('DELETE FROM jobs WHERE finished < ?', (cutoff,))
+
+
+class JobQueue:
+    """Runs jobs on a small local thread pool, outside the request threads.
+
+    Each owner (a session) may only have a limited number of unfinished
+    jobs. Finished jobs are kept for retention seconds so their results
+    can be collected, then forgotten. With a SharedJobStore, jobs count
+    towards the limit, and can be polled and cancelled, in every worker.
+    """
+
+    def __init__(self, max_workers, retention, store=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.retention = retention
+        self.store = store
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, owner, work, limit):
+        """Queue work(job) for owner and return its Job"""
+        with self.lock:
+            self._prune()
+            if self.store is not None:
+                active = self.store.active_count(owner)
+            else:
+                active = sum(1 for job in self.jobs.values() if job.owner == owner and job.status not in FINISHED)
+            if active >= limit:
+                raise JobLimitError(f'At most {limit} job(s) may run at once')
+            job = Job(owner, self.store)
+            job.publish()
+            self.jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id, owner):
+        """The owner's job with this id, or None, looked up in the shared store when another worker runs it"""
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            return self.store.load(job_id, owner)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def cancel(self, job):
+        """Stop a job: queued jobs never start, running jobs stop at their next progress report.
+
+        Work reports once more after its last step and before it saves, so
+        a job cancelled while running leaves nothing saved. A job another
+        worker runs is flagged in the shared store for it to stop.
+        """
+        if isinstance(job, StoredJob):
+            self.store.cancel(job.id)
+            return
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+
+    def _run(self, job, work):
+        if job.cancel_requested():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.publish()
+        try:
+            job.result = work(job)
+            job.progress = 1.0
+            self._finish(job, DONE)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.publish()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [i for i, job in self.jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self.jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
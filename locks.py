@@ -0,0 +1,120 @@
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LockTimeout(Exception):
+    """Raised when a session's lock is still held by another request after the timeout"""
+
+
+class SessionLocks:
+    """One lock per session id, so requests of a session run one at a time.
+
+    Sessions never wait on each other. A session's lock exists only while
+    some request holds or waits for it.
+    """
+
+    def __init__(self):
+        self._locks = {}  # Session id -> [lock, number of holders and waiters]
+        self._guard = threading.Lock()
+
+    def acquire(self, key, timeout):
+        """Take the session's lock, returning False if it is still held after timeout seconds"""
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        if entry[0].acquire(timeout=timeout):
+            return True
+        self._leave(key, entry)
+        return False
+
+    def release(self, key):
+        with self._guard:
+            entry = self._locks[key]
+        entry[0].release()
+        self._leave(key, entry)
+
+    def _leave(self, key, entry):
+        with self._guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    @contextmanager
+    def hold(self, key, timeout):
+        if not self.acquire(key, timeout):
+            raise LockTimeout(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+
+class FileSessionLocks(SessionLocks):
+    """SessionLocks taken with flock on a file per session, so they hold across worker processes.
+
+    A lock file may be removed by sweep() once it is old, so after locking
+    a file the holder checks it is still the one at the path, and starts
+    over if it is not.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._held = {}  # Session id -> descriptor of its locked file
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.folder, f'{key}.lock')
+
+    def acquire(self, key, timeout):
+        path = self.path(key)
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                continue
+            if self._is_current(fd, path):
+                os.utime(fd)
+                self._held[key] = fd
+                return True
+            os.close(fd)
+
+    def release(self, key):
+        fd = self._held.pop(key)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _is_current(self, fd, path):
+        try:
+            return os.stat(path).st_ino == os.fstat(fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def sweep(self, max_age):
+        """Remove lock files not taken in max_age seconds that no one holds"""
+        cutoff = time.time() - max_age
+        with os.scandir(self.folder) as entries:
+            old = [entry.path for entry in entries if entry.is_file() and entry.stat().st_mtime < cutoff]
+        for path in old:
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if self._is_current(fd, path):
+                    os.remove(path)
+            except BlockingIOError:
+                pass
+            finally:
+                os.close(fd)
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import defaultdict
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Counters kept per route, with their help text
+COUNTERS = {
+    'bytes_read': 'Bytes of CSV uploads and working files read',
+    'bytes_written': 'Bytes of working files and downloads written',
+    'rows_processed': 'Rows passed through a cleaning transform',
+}
+
+
+class _NoPhase:
+    """Stands in for Phase when metrics are off, so timing a phase costs one call"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_PHASE = _NoPhase()
+
+
+class Phase:
+    """Times a block as one phase of the request being handled on this thread"""
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class RequestTiming:
+    """Phase timings and counts of one request, or one background job"""
+
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def server_timing(self):
+        """Value of a Server-Timing header, durations in milliseconds"""
+        parts = [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in self.phases.items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.start) * 1000:.2f}')
+        return ', '.join(parts)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Phase latency histograms and counters per route, rendered for Prometheus.
+
+    Work is timed with phase(name) and counted with count(name, amount)
+    while a request is being measured on the current thread (between start
+    and finish). Both return immediately when nothing is being measured, so
+    with metrics disabled the instrumented code costs one call per phase.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current(self):
+        return getattr(self._local, 'timing', None)
+
+    def start(self, route):
+        """Begin measuring a request for route on this thread"""
+        timing = self._local.timing = RequestTiming(route)
+        return timing
+
+    def finish(self):
+        """Stop measuring this thread's request and add it to the totals"""
+        timing = self.current()
+        if timing is None:
+            return None
+        self._local.timing = None
+        total = time.perf_counter() - timing.start
+        with self._lock:
+            for phase, seconds in list(timing.phases.items()) + [('total', total)]:
+                key = (timing.route, phase)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(self.buckets)
+                self.histograms[key].observe(seconds)
+            for name, amount in timing.counts.items():
+                self.counters[(name, timing.route)] += amount
+        return timing
+
+    def phase(self, name):
+        timing = self.current()
+        if timing is None:
+            return NO_PHASE
+        return Phase(timing, name)
+
+    def count(self, name, amount):
+        timing = self.current()
+        if timing is not None:
+            timing.counts[name] += int(amount)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP datasweep_phase_seconds Time spent in each phase of a request',
+            '# TYPE datasweep_phase_seconds histogram',
+        ]
+        with self._lock:
+            for (route, phase), histogram in sorted(self.histograms.items()):
+                labels = f'route="{label(route)}",phase="{label(phase)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'datasweep_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'datasweep_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'datasweep_phase_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'datasweep_phase_seconds_count{{{labels}}} {histogram.count}')
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP datasweep_{name}_total {help_text}')
+                lines.append(f'# TYPE datasweep_{name}_total counter')
+                for (counter, route), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f'datasweep_{name}_total{{route="{label(route)}"}} {value}')
+        return '\n'.join(lines) + '\n'
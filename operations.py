@@ -0,0 +1,347 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from cleaning import clean_numbers, format_dates, DateParser
+from row_index import duplicated_rows
+from parallel import column_executor
+from sketches import NumericSketch
+from pipeline import Plan, NormalizeTextStep, CaseStep, FillStep, DropEmptyStep, MapValuesStep
+
+# Decimal places for each rounding precision choice
+ROUNDING_DECIMALS = {
+    'whole': 0,
+    'tenths': 1,
+    'hundredths': 2,
+    'thousandths': 3,
+    'ten-thousandths': 4
+}
+
+# strftime pattern for each date format choice
+DATE_FORMATS = {
+    'mm/dd/yyyy': '%m/%d/%Y',
+    'dd/mm/yyyy': '%d/%m/%Y',
+    'yyyy/mm/dd': '%Y/%m/%d',
+    'mm-dd-yyyy': '%m-%d-%Y',
+    'dd-mm-yyyy': '%d-%m-%Y',
+    'yyyy-mm-dd': '%Y-%m-%d'
+}
+
+
+def empty_field_steps(selections, fill_values):
+    """Build the steps for an empty-field handling payload"""
+    steps = []
+    for column, handling in selections.items():
+        if handling == 'delete-empty-rows':
+            steps.append(DropEmptyStep(column))
+        elif handling in fill_values:
+            steps.append(FillStep(column, fill_values[handling]))
+    return steps
+
+
+def remove_duplicate_rows(df):
+    """Remove duplicate rows from the dataframe"""
+    original_rows = len(df)
+    df = df.drop_duplicates()
+    rows_removed = original_rows - len(df)
+    return df, rows_removed
+
+
+# Operations made of pipeline steps. Each builds its steps from the same
+# payload its route accepts, so the steps can also be recorded lazily.
+
+def name_empty_steps(data):
+    return empty_field_steps(data.get('nameEmptyHandling', {}), {
+        'fill-with-"none"': 'None',
+        'fill-with-"unknown"': 'Unknown',
+        'fill-with-"n/a"': 'N/A'
+    })
+
+
+def name_format_steps(data):
+    # First clean up the text of every name column (remove extra spaces and
+    # handle underscores), then apply the chosen format to each
+    name_formats = data.get('nameFormats', {})
+    steps = [NormalizeTextStep(column) for column in name_formats]
+    steps += [CaseStep(column, format_type, blank_as_missing=False)
+              for column, format_type in name_formats.items()]
+    return steps
+
+
+def format_steps(data):
+    # Empty values stay empty
+    return [CaseStep(column, format_type) for column, format_type in data.get('selections', {}).items()]
+
+
+def empty_steps(data):
+    return empty_field_steps(data.get('selections', {}), {
+        'fill-none': 'None',
+        'fill-unknown': 'Unknown',
+        'fill-na': 'N/A'
+    })
+
+
+def date_empty_steps(data):
+    return empty_field_steps(data.get('selections', {}), {
+        'fill-current-date': datetime.now().strftime('%Y-%m-%d'),
+        'fill-na': 'N/A'
+    })
+
+
+def standardization_steps(data):
+    return [MapValuesStep(column, value_map) for column, value_map in data.get('standardizations', {}).items()]
+
+
+STEP_OPERATIONS = {
+    'handle-empty-name-fields': name_empty_steps,
+    'apply-name-formats': name_format_steps,
+    'apply-formats': format_steps,
+    'handle-empty-fields': empty_steps,
+    'handle-empty-date-fields': date_empty_steps,
+    'apply-categorical-formats': format_steps,
+    'apply-standardization': standardization_steps,
+}
+
+
+# Operations that work on the whole dataframe. Each takes the dataframe and
+# its route's payload and returns the modified dataframe.
+
+def categorical_columns(data):
+    return [column for column, kind in data.get('classifications', {}).items() if kind == 'Categorical']
+
+
+def store_classifications(df, data):
+    # Categorical columns are kept as category dtype, so formatting and
+    # standardizing them works on their distinct values rather than every row
+    categorical = set(categorical_columns(data))
+    for column in data.get('classifications', {}):
+        if column not in df.columns:
+            continue
+        is_category = isinstance(df[column].dtype, pd.CategoricalDtype)
+        if column in categorical and not is_category:
+            df[column] = df[column].astype('category')
+        elif column not in categorical and is_category:
+            df[column] = df[column].astype(object).infer_objects()
+    return df
+
+
+def delete_columns(df, data, row_index=None):
+    columns = data.get('columns', [])
+    if data.get('deleteDuplicates', False) and row_index is not None:
+        # Row hashes of what is left, by taking out the deleted columns' share
+        hashes = row_index.without(df, columns)
+        df = df.drop(columns=columns)
+        df = df[~duplicated_rows(df, hashes)]
+    else:
+        df = df.drop(columns=columns)
+
+        # Remove duplicates if requested
+        if data.get('deleteDuplicates', False):
+            df, rows_removed = remove_duplicate_rows(df)
+
+    if len(df.columns) == 0:
+        raise ValueError('Cannot delete all columns. At least one column must remain.')
+    if len(df) == 0:
+        raise ValueError('No data rows remaining after deletion.')
+    return df
+
+
+def format_date_column(series, column, format_type, parser):
+    """A date column reformatted, or as it was if it cannot be"""
+    try:
+        temp_series = parser.parse(column, series)
+
+        # Create mask for valid dates, anything else keeps its original value
+        valid_dates = temp_series.notna()
+
+        if format_type in DATE_FORMATS:
+            pattern = DATE_FORMATS[format_type]
+            # Format only valid dates using the selected format
+            formatted = format_dates(temp_series[valid_dates], pattern)
+            series = series.copy()
+            series.loc[valid_dates] = formatted
+            parser.record_formatted(column, pattern, formatted, temp_series[valid_dates])
+
+    except Exception as e:
+        print(f"Error processing column {column}: {str(e)}")
+    return series
+
+
+def apply_date_formats(df, data, parser=None):
+    # Dates are parsed per distinct value, reusing what the parser already
+    # knows. Columns are independent (the parser keeps its state per column),
+    # so they are formatted in parallel.
+    parser = parser or DateParser()
+    selections = {column: format_type for column, format_type in data.get('selections', {}).items()
+                  if column in df.columns}
+    return column_executor().map_columns(
+        df, selections, lambda column, series: format_date_column(series, column, selections[column], parser))
+
+
+# Empty handling choices that fill with a statistic of the column's other values
+CATEGORICAL_FILLS = {'fill-mode', 'fill-mean'}
+NUMERICAL_FILLS = {'fill-mean', 'fill-median', 'fill-mode'}
+
+
+def categorical_empty_mask(series):
+    """Mask of both NaN and '<NA>' values"""
+    return series.isna() | (series.astype(str) == '<NA>')
+
+
+def categorical_fill_value(counts, handling):
+    """Value a categorical fill puts in empty cells, from the counts of the column's valid values"""
+    counts = counts[counts > 0]
+    if handling == 'fill-mode':
+        # Most common value, the first in sorted order on a tie
+        return min(counts.index[counts == counts.max()])
+    # fill-mean: the value whose rank in sorted order is nearest the mean rank
+    # of the valid values
+    unique_values = sorted(counts.index)
+    ranks = pd.Series(range(1, len(unique_values) + 1), index=unique_values)
+    mean_rank = (ranks * counts.reindex(unique_values)).sum() / counts.sum()
+    rank_values = dict(zip(ranks, unique_values))
+    return rank_values.get(round(mean_rank), rank_values[1])
+
+
+def handle_empty_categorical_fields(df, data, fill_values=None):
+    """fill_values gives the fill of each filled column when df is not all of its values"""
+    for column, handling in data.get('selections', {}).items():
+        empty_mask = categorical_empty_mask(df[column])
+
+        if handling == 'delete-empty-rows':
+            df = df.loc[~empty_mask]
+
+        elif handling in CATEGORICAL_FILLS:
+            if fill_values is None:
+                # Count only valid values (not NaN or '<NA>')
+                fill_value = categorical_fill_value(df.loc[~empty_mask, column].value_counts(), handling)
+            else:
+                fill_value = fill_values[column]
+            df.loc[empty_mask, column] = fill_value
+    return df
+
+
+def apply_numerical_rounding(df, data, failed=None):
+    """failed, when given, collects the columns whose values could not be cleaned"""
+    # Store rounding precision in DataFrame attributes
+    if 'rounding_precision' not in df.attrs:
+        df.attrs['rounding_precision'] = {}
+
+    selections = {column: precision for column, precision in data.get('selections', {}).items()
+                  if column in df.columns}
+
+    if failed is None:
+        failed = set()
+
+    def clean(column, series):
+        # First, clean the numbers (remove non-numeric chars except decimal point and negative sign)
+        try:
+            return clean_numbers(series)
+        except Exception as e:
+            print(f"Error processing column {column}: {str(e)}")
+            failed.add(column)
+            return series
+
+    # Columns are cleaned in parallel
+    df = column_executor().map_columns(df, selections, clean)
+
+    decimals = {}
+    for column, precision in selections.items():
+        if column in failed:
+            continue
+
+        # Store the precision for this column
+        df.attrs['rounding_precision'][column] = precision
+
+        # Collect the rounding based on selection
+        if precision in ROUNDING_DECIMALS:
+            decimals[column] = ROUNDING_DECIMALS[precision]
+
+    # Round all selected columns in one call
+    if decimals:
+        df = df.round(decimals)
+    return df
+
+
+def numerical_fill_value(series, handling, approximate=False):
+    """Value a numerical fill puts in empty cells, before rounding.
+
+    approximate takes the median and mode from a NumericSketch, within the
+    error bounds the sketches module gives, rather than sorting and
+    counting every value.
+    """
+    if approximate:
+        return NumericSketch.of(series.to_numpy(dtype=float, na_value=np.nan)).fill_value(handling)
+    if handling == 'fill-mean':
+        return series.mean()
+    if handling == 'fill-median':
+        return series.median()
+    return series.mode()[0]
+
+
+def handle_empty_numerical_fields(df, data, fill_values=None):
+    """fill_values gives the fill of each filled column when df is not all of its values.
+
+    data['approximate'] asks for fills from sketches of the columns, see numerical_fill_value.
+    """
+    approximate = bool(data.get('approximate', False))
+    for column, handling in data.get('selections', {}).items():
+        # Convert to numeric, handling any non-numeric values as NaN
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+
+        # Get the column's current rounding precision from the DataFrame's metadata
+        # If not found, default to original precision
+        precision = None
+        if 'rounding_precision' in df.attrs:
+            precision = df.attrs['rounding_precision'].get(column)
+
+        if handling == 'delete-empty-rows':
+            df = df.dropna(subset=[column])
+
+        elif handling in NUMERICAL_FILLS:
+            if fill_values is None:
+                fill_value = numerical_fill_value(df[column], handling, approximate)
+            else:
+                fill_value = fill_values[column]
+            if precision is not None and precision != 'keep':
+                fill_value = round(fill_value, ROUNDING_DECIMALS.get(precision, 2))
+            df[column] = df[column].fillna(fill_value)
+    return df
+
+
+FRAME_OPERATIONS = {
+    'submit-classifications': store_classifications,
+    'delete-columns': delete_columns,
+    'apply-date-formats': apply_date_formats,
+    'handle-empty-categorical-fields': handle_empty_categorical_fields,
+    'apply-numerical-rounding': apply_numerical_rounding,
+    'handle-empty-numerical-fields': handle_empty_numerical_fields,
+}
+
+
+def apply_operation(df, name, data, date_parser=None, row_index=None):
+    """Apply one named operation, as its route would, to an in-memory dataframe.
+
+    df itself is left as it was. date_parser is the working file's
+    DateParser, so dates parsed by earlier requests are not parsed again,
+    and row_index its RowHashIndex, which saves rehashing rows to find
+    duplicates.
+    """
+    df = df.copy(deep=False)
+    if name == 'apply-date-formats':
+        return apply_date_formats(df, data, parser=date_parser)
+    if name in STEP_OPERATIONS:
+        return Plan(STEP_OPERATIONS[name](data)).execute(df)
+    if name in FRAME_OPERATIONS:
+        if name == 'delete-columns':
+            return delete_columns(df, data, row_index=row_index)
+        return FRAME_OPERATIONS[name](df, data)
+    raise ValueError(f'Unknown operation: {name}')
+
+
+def operation_columns(name, data):
+    """Columns whose values an operation may rewrite"""
+    if name in STEP_OPERATIONS:
+        return list(dict.fromkeys(step.column for step in STEP_OPERATIONS[name](data)))
+    if name == 'submit-classifications':
+        return list(data.get('classifications', {}))
+    return list(data.get('selections', {}))
@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ColumnExecutor:
+    """Runs independent per-column work on a shared thread pool.
+
+    Threads share the dataframe's column buffers (memory-mapped Arrow or
+    numpy), so nothing is pickled or copied to hand a column to a worker.
+    Work only scales where the column operation releases the GIL, as the
+    Arrow string kernels and most numpy loops do. Frames shorter than
+    min_rows, or a single column, are processed inline since the handoff
+    would cost more than it saves.
+    """
+
+    def __init__(self, max_workers=None, min_rows=50000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self._pool = None
+        # Request threads may all find the pool missing at once
+        self._pool_lock = threading.Lock()
+
+    def parallel(self, rows, columns):
+        return self.max_workers > 1 and columns > 1 and rows >= self.min_rows
+
+    def map(self, func, columns, rows):
+        """[func(column) for column in columns], in parallel when worthwhile"""
+        columns = list(columns)
+        if not self.parallel(rows, len(columns)):
+            return [func(column) for column in columns]
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='column')
+            pool = self._pool
+        return list(pool.map(func, columns))
+
+    def map_columns(self, df, columns, func):
+        """Replace each of the given columns of df with func(column, series)"""
+        columns = list(columns)
+        results = self.map(lambda column: func(column, df[column]), columns, len(df))
+        for column, series in zip(columns, results):
+            df[column] = series
+        return df
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Shared by every operation, sized with configure()
+_executor = ColumnExecutor()
+
+
+def column_executor():
+    return _executor
+
+
+def configure(max_workers=None, min_rows=50000):
+    """Replace the shared column executor with one of the given size"""
+    global _executor
+    _executor.shutdown()
+    _executor = ColumnExecutor(max_workers, min_rows)
+    return _executor
@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+from cleaning import normalize_text_columns, remap_values
+from parallel import column_executor
+
+CASE_TRANSFORMS = {
+    'uppercase': lambda s: s.str.upper(),
+    'lowercase': lambda s: s.str.lower(),
+    'title-case': lambda s: s.str.title(),
+    'sentence-case': lambda s: s.str.lower().str.capitalize(),
+}
+
+# Pairs of case transforms, earlier then later, that give the same text as
+# the later one alone. Others do not for all of Unicode: upper then lower
+# turns 'Straße' into 'strasse' where lower alone keeps the 'ß'.
+ABSORBED_CASES = {
+    ('uppercase', 'uppercase'),
+    ('lowercase', 'lowercase'),
+    ('lowercase', 'sentence-case'),
+}
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def relabel_categories(series, labels):
+    """Give each category of a categorical column a new label.
+
+    Categories that end up with the same label are merged and a missing
+    label makes its rows missing, so only the row codes are touched, never
+    the values themselves.
+    """
+    labels = pd.Index(labels)
+    if labels.is_unique and not labels.hasnans:
+        return series.cat.rename_categories(labels)
+    categories = labels.dropna().unique()
+    mapping = categories.get_indexer(labels)
+    codes = series.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, mapping[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name)
+
+
+class Step:
+    """A cleaning operation on a single column of the working dataframe"""
+
+    # Steps that remove rows rather than rewrite values
+    drops_rows = False
+
+    def __init__(self, column):
+        self.column = column
+
+    def apply(self, df):
+        raise NotImplementedError
+
+    def fuse(self, later):
+        """Return one step equivalent to self followed by later, or None"""
+        return None
+
+    def __repr__(self):
+        fields = ', '.join(f'{k}={v!r}' for k, v in vars(self).items())
+        return f'{type(self).__name__}({fields})'
+
+
+class NormalizeTextStep(Step):
+    """Replace underscores with spaces and collapse runs of whitespace"""
+
+    def apply(self, df):
+        return normalize_text_columns(df, [self.column])
+
+    @staticmethod
+    def apply_all(df, steps):
+        # Adjacent normalizations are done together in one pass over their values
+        return normalize_text_columns(df, [step.column for step in steps])
+
+
+class CaseStep(Step):
+    """Change the letter case of a text column.
+
+    With blank_as_missing, missing values are formatted as empty strings and
+    empty results are turned back into missing values.
+    """
+
+    def __init__(self, column, case, blank_as_missing=True):
+        super().__init__(column)
+        self.case = case
+        self.blank_as_missing = blank_as_missing
+
+    def apply(self, df):
+        series = df[self.column]
+        if is_categorical(series):
+            # Format the category labels instead of every row
+            labels = self.format(pd.Series(series.cat.categories))
+            df[self.column] = relabel_categories(series, labels)
+        else:
+            df[self.column] = self.format(series)
+        return df
+
+    def format(self, series):
+        if self.blank_as_missing:
+            series = series.fillna('').astype(str)
+        if self.case in CASE_TRANSFORMS:
+            series = CASE_TRANSFORMS[self.case](series)
+        if self.blank_as_missing:
+            series = series.replace('', pd.NA)
+        return series
+
+    def fuse(self, later):
+        # Only where the later transform alone gives the same text whatever it is given
+        if (isinstance(later, CaseStep) and later.blank_as_missing == self.blank_as_missing
+                and (self.case, later.case) in ABSORBED_CASES):
+            return later
+        return None
+
+
+class FillStep(Step):
+    """Fill missing values with a constant"""
+
+    def __init__(self, column, value):
+        super().__init__(column)
+        self.value = value
+
+    def apply(self, df):
+        series = df[self.column]
+        if is_categorical(series) and self.value not in series.cat.categories:
+            series = series.cat.add_categories([self.value])
+        df[self.column] = series.fillna(self.value)
+        return df
+
+    def fuse(self, later):
+        # Nothing is left for a second fill to fill
+        if isinstance(later, FillStep):
+            return self
+        return None
+
+
+class DropEmptyStep(Step):
+    """Drop rows where the column is missing"""
+
+    drops_rows = True
+
+    def apply(self, df):
+        return df.dropna(subset=[self.column])
+
+    def fuse(self, later):
+        if isinstance(later, DropEmptyStep):
+            return self
+        return None
+
+
+class MapValuesStep(Step):
+    """Replace values according to a mapping, leaving unmapped values as they are"""
+
+    def __init__(self, column, mapping):
+        super().__init__(column)
+        self.mapping = mapping
+
+    def apply(self, df):
+        mapping = self.mapping
+        series = df[self.column]
+        if is_categorical(series):
+            # Remap the category labels instead of every row
+            labels = [mapping.get(x, x) for x in series.cat.categories]
+            df[self.column] = relabel_categories(series, labels)
+        else:
+            df[self.column] = remap_values(series, mapping)
+        return df
+
+    def fuse(self, later):
+        if not isinstance(later, MapValuesStep):
+            return None
+        # Compose the two mappings into one lookup
+        mapping = {old: later.mapping.get(new, new) for old, new in self.mapping.items()}
+        for old, new in later.mapping.items():
+            mapping.setdefault(old, new)
+        return MapValuesStep(self.column, mapping)
+
+
+def run_steps(df, steps):
+    """Apply steps in order, batching adjacent steps of a type that has apply_all"""
+    i = 0
+    while i < len(steps):
+        step = steps[i]
+        # Run of adjacent steps of a type that can be applied together
+        end = i + 1
+        if hasattr(type(step), 'apply_all'):
+            while end < len(steps) and type(steps[end]) is type(step):
+                end += 1
+        if end - i > 1:
+            df = type(step).apply_all(df, steps[i:end])
+        else:
+            df = step.apply(df)
+        i = end
+    return df
+
+
+def optimize_steps(steps):
+    """Reorder and fuse steps without changing what they produce.
+
+    Steps on different columns commute, so row-dropping steps are moved ahead
+    of any step on another column (shrinking the data later steps touch), and
+    consecutive steps on the same column are fused where possible.
+    """
+    ordered = []
+    for step in steps:
+        position = len(ordered)
+        if step.drops_rows:
+            while position > 0 and (ordered[position - 1].drops_rows or ordered[position - 1].column != step.column):
+                position -= 1
+        ordered.insert(position, step)
+
+    fused = []
+    for step in ordered:
+        # The previous step on the same column, anything in between commutes with it
+        previous = next((i for i in range(len(fused) - 1, -1, -1) if fused[i].column == step.column), None)
+        if previous is not None:
+            merged = fused[previous].fuse(step)
+            if merged is not None:
+                fused[previous] = merged
+                continue
+        fused.append(step)
+    return fused
+
+
+class Plan:
+    """Cleaning steps recorded against a working dataframe but not yet applied"""
+
+    def __init__(self, steps=None):
+        self.steps = list(steps or [])
+        self._optimized = None
+        self._kept_rows = None
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def extend(self, steps):
+        self.steps.extend(steps)
+        self._optimized = None
+        self._kept_rows = None
+
+    def optimized(self):
+        if self._optimized is None:
+            self._optimized = optimize_steps(self.steps)
+        return self._optimized
+
+    def execute(self, df, columns=None):
+        """Apply the plan to df, optionally computing only the given columns"""
+        steps = self.optimized()
+        if columns is not None:
+            # Row-dropping steps decide which rows survive, so their columns
+            # are always needed even when they are not asked for
+            needed = list(dict.fromkeys(list(columns) + [s.column for s in steps if s.drops_rows]))
+            df = df[needed]
+            steps = [s for s in steps if s.column in needed]
+        executor = column_executor()
+        start = 0
+        while start < len(steps):
+            # Steps up to the next row-dropping step rewrite their columns
+            # independently of each other, so each column can go to its own worker
+            end = start
+            while end < len(steps) and not steps[end].drops_rows:
+                end += 1
+            segment = steps[start:end]
+            by_column = {}
+            for step in segment:
+                by_column.setdefault(step.column, []).append(step)
+            if executor.parallel(len(df), len(by_column)):
+                df = executor.map_columns(
+                    df, by_column, lambda column, series: run_steps(series.to_frame(), by_column[column])[column])
+            else:
+                df = run_steps(df, segment)
+            if end < len(steps):
+                df = steps[end].apply(df)
+            start = end + 1
+        if columns is not None:
+            df = df[list(columns)]
+        return df
+
+    def kept_rows(self, df):
+        """Index labels of the rows that survive the plan's row-dropping steps"""
+        if self._kept_rows is None:
+            self._kept_rows = self.execute(df, columns=[]).index
+        return self._kept_rows
+
+    def row_count(self, df):
+        return len(self.kept_rows(df))
+
+    def window(self, df, offset, limit, columns=None):
+        """Apply the plan to a window of surviving rows only"""
+        labels = self.kept_rows(df)[offset:offset + limit]
+        return self.execute(df.loc[labels], columns=columns)
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Files row hashes are split into by their top bits when looking for
+# repeated ones, so only one of them is held at a time
+HASH_PARTITION_BITS = 4
+
+# Hashes read from a spilled index at a time
+SPILL_READ_HASHES = 1 << 20
+
+
+def column_weight(column):
+    """Odd 64-bit multiplier that mixes a column's hashes into the row hashes"""
+    return pd.util.hash_array(np.array([str(column)], dtype=object))[0] | np.uint64(1)
+
+
+def column_hashes(series):
+    """One 64-bit hash per value, the same for equal values whatever the dtype's storage"""
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+def weighted_hashes(series):
+    return column_hashes(series) * column_weight(series.name)
+
+
+def value_hashes(df):
+    """column_hashes of every column of df, by column name"""
+    return {column: column_hashes(df[column]) for column in df.columns}
+
+
+def row_hashes(df, values=None):
+    """One 64-bit hash per row, in row order.
+
+    A row's hash is the sum of its values' hashes, each weighted by its
+    column, so a column's share can later be taken out or swapped for new
+    values without hashing the rest of the row again. values are the
+    value_hashes of df, when they were already taken.
+    """
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for column in df.columns:
+        hashes += (column_hashes(df[column]) if values is None else values[column]) * column_weight(column)
+    return hashes
+
+
+def count_duplicates(positions, load_rows):
+    """Rows at the given positions identical to an earlier one of them, loaded with load_rows(positions)"""
+    return int(load_rows(positions).duplicated().sum()) if len(positions) else 0
+
+
+def duplicated_rows(df, hashes):
+    """Exact df.duplicated() for rows whose hashes are given, in row order.
+
+    Only rows whose hash occurs more than once are compared by value, so
+    this costs little more than a pass over the hashes when duplicates are rare.
+    """
+    candidates = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    duplicated = np.zeros(len(df), dtype=bool)
+    if candidates.any():
+        duplicated[candidates] = df[candidates].duplicated().to_numpy()
+    return duplicated
+
+
+def repeated_hashes(chunks, bits=HASH_PARTITION_BITS):
+    """Distinct hashes occurring more than once in a stream of hash arrays.
+
+    The hashes are written to temporary files split by their top bits and
+    the repeats found one file at a time, so a 1/2**bits share of them is
+    held at once.
+    """
+    shift = np.uint64(64 - bits)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, str(part)) for part in range(2 ** bits)]
+        for hashes in chunks:
+            parts = hashes >> shift
+            for part in np.unique(parts):
+                with open(paths[part], 'ab') as f:
+                    hashes[parts == part].tofile(f)
+        repeated = []
+        for path in paths:
+            if os.path.exists(path):
+                hashes = np.fromfile(path, dtype=np.uint64)
+                repeated.append(np.unique(hashes[pd.Series(hashes).duplicated(keep=False).to_numpy()]))
+    return np.concatenate(repeated) if repeated else np.empty(0, dtype=np.uint64)
+
+
+class RowHashIndex:
+    """Row hashes of a working dataframe, kept in step with its changes.
+
+    Dropped rows drop their hashes and rewritten or deleted columns only have
+    their own hashes recomputed, so duplicate checks never rehash whole rows.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self._duplicate_count = None
+
+    @classmethod
+    def of(cls, df):
+        return cls(row_hashes(df))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def copy(self):
+        return RowHashIndex(self.hashes.copy())
+
+    def duplicate_count(self, load_rows):
+        """Rows identical to an earlier row, exactly df.duplicated().sum().
+
+        The hashes only pick out the rows that may be duplicates.
+        load_rows(positions) gives the rows at the given positions, which
+        are then compared by value, so a hash collision is never counted.
+        """
+        if self._duplicate_count is None:
+            candidates = np.flatnonzero(pd.Series(self.hashes).duplicated(keep=False).to_numpy())
+            self._duplicate_count = count_duplicates(candidates, load_rows)
+        return self._duplicate_count
+
+    def without(self, df, columns):
+        """Hashes of df's rows with the given columns left out"""
+        hashes = self.hashes.copy()
+        for column in columns:
+            hashes -= weighted_hashes(df[column])
+        return hashes
+
+    def update(self, old, new, columns):
+        """Follow the change from dataframe old to new, in which the given columns were rewritten"""
+        hashes = self.hashes
+        if len(old) != len(new) or not old.index.equals(new.index):
+            # Keep the hashes of the surviving rows, in their new order
+            positions = old.index.get_indexer(new.index)
+            hashes = hashes[positions]
+            old = old.iloc[positions]
+        else:
+            hashes = hashes.copy()
+        for column in old.columns:
+            if column not in new.columns:
+                hashes -= weighted_hashes(old[column])
+            elif column in columns:
+                hashes += weighted_hashes(new[column]) - weighted_hashes(old[column])
+        self.hashes = hashes
+        self._duplicate_count = None
+
+
+class SpilledRowHashIndex:
+    """Row hashes of a working file too large to load, kept in a temporary file rather than in memory.
+
+    Hashes are appended a chunk at a time with add(). Finding duplicates
+    holds only a share of the hashes at a time (repeated_hashes) and the
+    positions of the rows that may be duplicates. The file is removed
+    once the index is dropped.
+    """
+
+    def __init__(self):
+        self._file = tempfile.NamedTemporaryFile(prefix='row-hashes-')
+        self._count = 0
+        self._duplicate_count = None
+
+    def __len__(self):
+        return self._count
+
+    def add(self, hashes):
+        np.asarray(hashes, dtype=np.uint64).tofile(self._file)
+        self._count += len(hashes)
+
+    def chunks(self):
+        """The hashes in row order, SPILL_READ_HASHES at a time"""
+        self._file.flush()
+        for start in range(0, self._count, SPILL_READ_HASHES):
+            yield np.fromfile(self._file.name, dtype=np.uint64, count=min(SPILL_READ_HASHES, self._count - start),
+                              offset=start * 8)
+
+    def load(self):
+        """RowHashIndex holding every hash in memory, for a file that has become small enough to load"""
+        self._file.flush()
+        return RowHashIndex(np.fromfile(self._file.name, dtype=np.uint64))
+
+    def duplicate_count(self, load_rows):
+        """RowHashIndex.duplicate_count, reading the hashes from disk"""
+        if self._duplicate_count is None:
+            repeated = repeated_hashes(self.chunks())
+            positions = [start + np.flatnonzero(np.isin(hashes, repeated))
+                         for start, hashes in zip(range(0, self._count, SPILL_READ_HASHES), self.chunks())]
+            positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.intp)
+            self._duplicate_count = count_duplicates(positions, load_rows)
+        return self._duplicate_count
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session values held on the server, identified by the id in the session cookie"""
+
+    def __init__(self, sid, initial=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SessionEntry:
+    def __init__(self, values):
+        self.values = values
+        self.last_seen = time.time()
+
+
+class SessionStore:
+    """Values of every live session, kept in memory, forgotten after ttl idle seconds.
+
+    Expired sessions are not cleaned up as they are read; sweep() hands them
+    to the caller so whatever else they hold (working files) can be removed.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, sid):
+        """A live session's values, marking it as seen, or None"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None or entry.last_seen < time.time() - self.ttl:
+                return None
+            entry.last_seen = time.time()
+            return dict(entry.values)
+
+    def save(self, sid, values):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                self._entries[sid] = SessionEntry(dict(values))
+            else:
+                entry.values = dict(values)
+                entry.last_seen = time.time()
+
+    def delete(self, sid):
+        with self._lock:
+            entry = self._entries.pop(sid, None)
+        return None if entry is None else entry.values
+
+    def values(self):
+        """Values of every session, expired or not"""
+        with self._lock:
+            return [dict(entry.values) for entry in self._entries.values()]
+
+    def sweep(self):
+        """Remove the sessions idle for longer than ttl and return their values"""
+        return self.evict_idle(self.ttl)
+
+    def evict_idle(self, idle_seconds, limit=None, keep=None):
+        """Remove up to limit sessions idle for at least idle_seconds, least recent first"""
+        cutoff = time.time() - idle_seconds
+        with self._lock:
+            idle = sorted((entry.last_seen, sid) for sid, entry in self._entries.items()
+                          if entry.last_seen <= cutoff and sid != keep)
+            if limit is not None:
+                idle = idle[:limit]
+            return [self._entries.pop(sid).values for _, sid in idle]
+
+
+class SQLiteFile:
+    """A SQLite file shared by every worker process, with a connection per thread.
+
+    Writes take the database lock up front, so two workers never act on
+    the same rows at once.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+
+class SharedSessionStore(SQLiteFile):
+    """SessionStore kept in a SQLite file, so every worker process sees the same sessions.
+
+    Values are stored as JSON. Workers sweeping or evicting at the same
+    time never hand out the same session twice.
+    """
+
+    def __init__(self, path, ttl, timeout=30):
+        super().__init__(path, timeout)
+        self.ttl = ttl
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS sessions '
+                       '(sid TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def load(self, sid):
+        with self._transaction() as db:
+            row = db.execute('SELECT data, last_seen FROM sessions WHERE sid = ?', (sid,)).fetchone()
+            if row is None or row[1] < time.time() - self.ttl:
+                return None
+            db.execute('UPDATE sessions SET last_seen = ? WHERE sid = ?', (time.time(), sid))
+        return json.loads(row[0])
+
+    def save(self, sid, values):
+        with self._transaction() as db:
+            db.execute('INSERT OR REPLACE INTO sessions (sid, data, last_seen) VALUES (?, ?, ?)',
+                       (sid, json.dumps(dict(values)), time.time()))
+
+    def delete(self, sid):
+        with self._transaction() as db:
+            row = db.execute('SELECT data FROM sessions WHERE sid = ?', (sid,)).fetchone()
+            db.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        return None if row is None else json.loads(row[0])
+
+    def values(self):
+        rows = self._connection().execute('SELECT data FROM sessions').fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def sweep(self):
+        return self.evict_idle(self.ttl)
+
+    def evict_idle(self, idle_seconds, limit=None, keep=None):
+        query = 'SELECT sid, data FROM sessions WHERE last_seen <= ? AND sid IS NOT ? ORDER BY last_seen'
+        params = (time.time() - idle_seconds, keep)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params += (limit,)
+        with self._transaction() as db:
+            rows = db.execute(query, params).fetchall()
+            db.executemany('DELETE FROM sessions WHERE sid = ?', [(sid,) for sid, _ in rows])
+        return [json.loads(data) for _, data in rows]
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session values in a SessionStore and only a signed session id in the cookie"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def signer(self, app):
+        return Signer(app.secret_key, salt='session-id')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self.signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            values = self.store.load(sid) if sid else None
+            if values is not None:
+                return ServerSession(sid, values)
+        return ServerSession(uuid.uuid4().hex, new=True)
+
+    def refresh(self, session):
+        """Reload a session's values saved since it was opened, e.g. by a request it waited for"""
+        values = self.store.load(session.sid)
+        if values is not None:
+            session.clear()
+            session.update(values)
+            session.modified = False
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not (session.new or session.modified):
+            # Opening the session already marked it as seen. Saving the values
+            # it was opened with could undo a change another request saved since
+            return
+        self.store.save(session.sid, session)
+        response.set_cookie(
+            name,
+            self.signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+class Sweeper:
+    """Calls sweep() every interval seconds on a daemon thread"""
+
+    def __init__(self, sweep, interval, name='session-sweeper'):
+        self.sweep = sweep
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error in {self.name}: {str(e)}")
@@ -0,0 +1,274 @@
+"""Mergeable summaries of columns too large to hold, for fills and column profiles.
+
+Every sketch takes values a chunk at a time with add(), and two sketches
+of different parts of a column merge() into the sketch of both, so they
+can be built while a file is ingested or scanned and combined across
+chunks and workers. Memory does not grow with the column.
+
+Error bounds, for a column of n present values:
+
+- Moments: count, mean and variance are exact, up to float rounding.
+- QuantileSketch (KLL, k=200 by default): exact while the column has
+  fewer values than the sketch holds (k). Past that, the rank of the
+  value returned for a quantile is within about 1.7% of n of the true
+  rank with 99% probability, so the median lies between the true 48.3%
+  and 51.7% quantiles. The bound shrinks as 1/k.
+- FrequentValues (Misra-Gries, 1024 counters by default): exact while
+  the column has no more distinct values than counters. Past that, every
+  count is low by at most error <= n / (counters + 1), so the mode
+  returned is the true mode unless some value is within error of it.
+- HyperLogLog (2**14 registers by default): counts distinct values from
+  their 64-bit hashes with a relative standard error of about
+  1.04 / sqrt(2**14), 0.8%.
+"""
+import math
+import numpy as np
+import pandas as pd
+
+# Values the lowest level of a QuantileSketch holds, which sets its accuracy
+QUANTILE_K = 200
+
+# Levels hold at least this many values, however small their share of k
+QUANTILE_MIN_WIDTH = 8
+
+# Each level below the top holds this share of the one above it
+QUANTILE_LEVEL_RATIO = 2 / 3
+
+# Values FrequentValues keeps counts of
+FREQUENT_COUNTERS = 1024
+
+# HyperLogLog registers are picked by this many top bits of a hash
+HLL_BITS = 14
+
+
+def present_values(values):
+    """Values of a column as floats, without missing ones"""
+    values = np.asarray(values, dtype=float)
+    return values[~np.isnan(values)]
+
+
+class Moments:
+    """Count, mean and variance of a stream, merged with Chan's parallel update"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = np.nan
+        self.m2 = 0.0  # Sum of squared differences from the mean
+
+    def add(self, values):
+        values = present_values(values)
+        if len(values):
+            other = Moments()
+            other.count = len(values)
+            other.mean = float(values.mean())
+            other.m2 = float(((values - other.mean) ** 2).sum())
+            self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        """Sample variance, like Series.var()"""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+
+class QuantileSketch:
+    """KLL sketch of a stream of numbers (Karnin, Lang and Liberty, 2016).
+
+    Values are held in levels. A value at level h stands for 2**h values
+    of the stream. When the levels together hold more than their
+    capacity, the lowest full level is sorted and every other value,
+    starting at random, moves up a level while the rest are dropped.
+    """
+
+    def __init__(self, k=QUANTILE_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(QUANTILE_MIN_WIDTH, math.ceil(self.k * QUANTILE_LEVEL_RATIO ** depth))
+
+    @property
+    def exact(self):
+        """True while no value has been dropped"""
+        return len(self.levels) == 1
+
+    def add(self, values):
+        values = present_values(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self.compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self.compress()
+
+    def compress(self):
+        while sum(len(values) for values in self.levels) > sum(map(self.capacity, range(len(self.levels)))):
+            level = next(level for level, values in enumerate(self.levels) if len(values) >= self.capacity(level))
+            self.compact(level)
+
+    def compact(self, level):
+        values = np.sort(self.levels[level])
+        # An odd value out stays where it is
+        keep = values[:len(values) % 2]
+        paired = values[len(values) % 2:]
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+        self.levels[level] = keep
+        self.levels[level + 1] = np.concatenate([self.levels[level + 1], paired[self.rng.integers(2)::2]])
+
+    def quantile(self, q):
+        """Value whose rank is about q of the count, NaN when there are none"""
+        if self.count == 0:
+            return np.nan
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(held), 2 ** level) for level, held in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        ranks = np.cumsum(weights[order])
+        position = min(np.searchsorted(ranks, q * ranks[-1]), len(values) - 1)
+        return float(values[order][position])
+
+    def median(self):
+        if self.exact:
+            # Like Series.median(), the middle two values averaged
+            return float(np.median(self.levels[0])) if self.count else np.nan
+        return self.quantile(0.5)
+
+
+class FrequentValues:
+    """Most common values of a stream, kept in a fixed number of counters (Misra-Gries).
+
+    When there are more values than counters, the count of the one just
+    too rare to keep is taken from every counter and the counters left
+    at zero are dropped. error adds up what was taken, which bounds how
+    far below its true count any count is.
+    """
+
+    def __init__(self, counters=FREQUENT_COUNTERS):
+        self.counters = counters
+        self.count = 0
+        self.error = 0
+        self.counts = pd.Series(dtype=float)
+
+    @property
+    def exact(self):
+        return self.error == 0
+
+    def add(self, values):
+        values = present_values(values)
+        self.add_counts(pd.Series(values).value_counts(), len(values), 0)
+
+    def merge(self, other):
+        self.add_counts(other.counts, other.count, other.error)
+
+    def add_counts(self, counts, count, error):
+        self.count += count
+        self.error += error
+        self.counts = counts.astype(float) if self.counts.empty else self.counts.add(counts, fill_value=0)
+        if len(self.counts) > self.counters:
+            cut = self.counts.nlargest(self.counters + 1).iloc[-1]
+            self.counts = self.counts[self.counts > cut] - cut
+            self.error += cut
+
+    def mode(self):
+        """Value with the highest count, the smallest on a tie like mode()[0], NaN when there are none"""
+        if self.counts.empty:
+            return np.nan
+        return float(min(self.counts.index[self.counts == self.counts.max()]))
+
+
+class HyperLogLog:
+    """Estimated number of distinct values of a stream, given their 64-bit hashes (Flajolet et al., 2007).
+
+    The top bits of a hash pick a register, which keeps the longest run of
+    leading zeros, plus one, seen in the rest of the hashes it was picked by.
+    """
+
+    def __init__(self, bits=HLL_BITS):
+        self.bits = bits
+        self.registers = np.zeros(1 << bits, dtype=np.uint8)
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.bits)).astype(np.intp)
+        # The remaining bits fit a float exactly, whose exponent gives the
+        # position of their highest set bit (0 for no bits set)
+        rest = (hashes & np.uint64((1 << (64 - self.bits)) - 1)).astype(float)
+        rank = (65 - self.bits - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def __len__(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(int)).sum()
+        empty = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and empty:
+            # Few values: count them from the registers none has picked yet
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+
+class NumericSketch:
+    """Moments, quantiles and frequent values of a numeric column, which numerical fills are taken from"""
+
+    def __init__(self, k=QUANTILE_K, counters=FREQUENT_COUNTERS):
+        self.moments = Moments()
+        self.quantiles = QuantileSketch(k)
+        self.frequent = FrequentValues(counters)
+
+    @classmethod
+    def of(cls, values):
+        sketch = cls()
+        sketch.add(values)
+        return sketch
+
+    @property
+    def count(self):
+        return self.moments.count
+
+    def add(self, values):
+        values = present_values(values)
+        self.moments.add(values)
+        self.quantiles.add(values)
+        self.frequent.add(values)
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        self.frequent.merge(other.frequent)
+
+    def exact(self, handling):
+        """True when fill_value(handling) is the exact statistic"""
+        if handling == 'fill-median':
+            return self.quantiles.exact
+        if handling == 'fill-mode':
+            return self.frequent.exact
+        return True
+
+    def fill_value(self, handling):
+        """Value a numerical fill puts in empty cells, within the bounds above"""
+        if handling == 'fill-mean':
+            return self.moments.mean
+        if handling == 'fill-median':
+            return self.quantiles.median()
+        return self.frequent.mode()
@@ -30,6 +30,26 @@ function showErrorPopup(message) {
     }
 }
 
+// Version of the working data this page last saw, from the ETag of every
+// response. Changes are sent with it in If-Match, so a change made to data
+// that another request has replaced in the meantime is rejected, not lost.
+let dataVersion = null;
+
+function fetchData(url, options = {}) {
+    const method = (options.method || 'GET').toUpperCase();
+    // An upload replaces the data rather than changing it
+    if (method !== 'GET' && dataVersion && url !== '/upload') {
+        options = { ...options, headers: { ...(options.headers || {}), 'If-Match': dataVersion } };
+    }
+    return fetch(url, options).then(res => {
+        const version = res.headers.get('ETag');
+        if (version) {
+            dataVersion = version;
+        }
+        return res;
+    });
+}
+
 // Prevent double triggering of file input dialog
 uploadButton.addEventListener('click', (e) => {
   e.stopPropagation(); // Stop the event from propagating to the dropArea
@@ -58,6 +78,189 @@ fileInput.addEventListener('change', () => {
   }
 });
 
+// Table preview. Only the rows currently scrolled into view are rendered, and
+// they are fetched from /rows one page at a time, so the cost of the preview
+// depends on the size of the window rather than the size of the file.
+const PREVIEW_ROW_HEIGHT = 37; // Must match .virtual-table tr in styles.css
+const PREVIEW_PAGE_SIZE = 100;
+const PREVIEW_OVERSCAN = 10;
+const PREVIEW_MAX_CACHED_PAGES = 20;
+// Browsers cap how tall an element can be (Firefox at about 17.9 million
+// pixels), so past this height scroll positions map to rows proportionally
+const PREVIEW_MAX_HEIGHT = 10000000;
+
+let previewState = null;
+
+function refreshPreview() {
+    // Drop every cached page, the data behind them has changed
+    previewState = {
+        columns: [],
+        rowCount: 0,
+        pages: new Map(),
+        loading: new Set(),
+        scheduled: false
+    };
+    const state = previewState;
+
+    return fetchPreviewPage(state, 0)
+        .then(() => {
+            if (state !== previewState) {
+                return;
+            }
+            buildPreviewTable(state);
+            renderPreviewRows(state);
+            return state.rowCount;
+        })
+        .catch(err => {
+            showErrorPopup('Error loading table preview: ' + err.message);
+        });
+}
+
+function fetchPreviewPage(state, page) {
+    state.loading.add(page);
+    const params = new URLSearchParams({
+        offset: page * PREVIEW_PAGE_SIZE,
+        limit: PREVIEW_PAGE_SIZE
+    });
+
+    return fetchData(`/rows?${params}`)
+        .then(res => res.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'Failed to load rows');
+            }
+            state.columns = data.columns;
+            state.rowCount = data.rowCount;
+            state.pages.set(page, data.rows);
+            trimPreviewPages(state, page);
+        })
+        .finally(() => {
+            state.loading.delete(page);
+        });
+}
+
+function trimPreviewPages(state, currentPage) {
+    // Forget the pages furthest away from the one being viewed
+    while (state.pages.size > PREVIEW_MAX_CACHED_PAGES) {
+        let furthest = null;
+        state.pages.forEach((rows, page) => {
+            if (furthest === null || Math.abs(page - currentPage) > Math.abs(furthest - currentPage)) {
+                furthest = page;
+            }
+        });
+        state.pages.delete(furthest);
+    }
+}
+
+function buildPreviewTable(state) {
+    csvArea.innerHTML = '';
+
+    const table = document.createElement('table');
+    table.className = 'table table-striped table-bordered virtual-table';
+
+    const thead = document.createElement('thead');
+    const headerRow = document.createElement('tr');
+    state.columns.forEach(column => {
+        const th = document.createElement('th');
+        th.textContent = column;
+        headerRow.appendChild(th);
+    });
+    thead.appendChild(headerRow);
+
+    table.appendChild(thead);
+    table.appendChild(document.createElement('tbody'));
+    csvArea.appendChild(table);
+    csvArea.scrollTop = 0;
+
+    csvArea.onscroll = () => {
+        // Re-render at most once per animation frame while scrolling
+        if (!state.scheduled) {
+            state.scheduled = true;
+            requestAnimationFrame(() => {
+                state.scheduled = false;
+                renderPreviewRows(state);
+            });
+        }
+    };
+}
+
+function createSpacerRow(height, columnCount) {
+    const tr = document.createElement('tr');
+    tr.className = 'virtual-spacer';
+    const td = document.createElement('td');
+    td.colSpan = Math.max(columnCount, 1);
+    td.style.height = `${height}px`;
+    tr.appendChild(td);
+    return tr;
+}
+
+function renderPreviewRows(state) {
+    if (state !== previewState) {
+        return;
+    }
+    const tbody = csvArea.querySelector('.virtual-table tbody');
+    if (!tbody) {
+        return;
+    }
+
+    const columnCount = state.columns.length;
+    const fullHeight = state.rowCount * PREVIEW_ROW_HEIGHT;
+    const height = Math.min(fullHeight, PREVIEW_MAX_HEIGHT);
+    const scrollTop = csvArea.scrollTop;
+    // Row at the top of the view, a fraction of the way into it
+    let topRow = scrollTop / PREVIEW_ROW_HEIGHT;
+    if (height < fullHeight) {
+        const scrollRange = Math.max(height - csvArea.clientHeight, 1);
+        const rowRange = Math.max(state.rowCount - csvArea.clientHeight / PREVIEW_ROW_HEIGHT, 0);
+        topRow = Math.min(scrollTop / scrollRange, 1) * rowRange;
+    }
+    const first = Math.max(0, Math.floor(topRow) - PREVIEW_OVERSCAN);
+    const visible = Math.ceil(csvArea.clientHeight / PREVIEW_ROW_HEIGHT) + 2 * PREVIEW_OVERSCAN;
+    const last = Math.min(state.rowCount, first + visible);
+    // Rendered rows are placed so topRow sits at the top of the view, which
+    // is first * PREVIEW_ROW_HEIGHT unless the height was capped
+    const before = Math.max(0, scrollTop - (topRow - first) * PREVIEW_ROW_HEIGHT);
+    const after = Math.max(0, height - before - (last - first) * PREVIEW_ROW_HEIGHT);
+
+    const fragment = document.createDocumentFragment();
+    if (before > 0) {
+        fragment.appendChild(createSpacerRow(before, columnCount));
+    }
+
+    for (let i = first; i < last; i++) {
+        const page = Math.floor(i / PREVIEW_PAGE_SIZE);
+        const rows = state.pages.get(page);
+        const tr = document.createElement('tr');
+
+        if (rows) {
+            rows[i - page * PREVIEW_PAGE_SIZE].forEach(value => {
+                const td = document.createElement('td');
+                td.textContent = value === null ? '' : value;
+                tr.appendChild(td);
+            });
+        } else {
+            // Placeholder until the page arrives
+            tr.className = 'virtual-loading';
+            const td = document.createElement('td');
+            td.colSpan = Math.max(columnCount, 1);
+            tr.appendChild(td);
+            if (!state.loading.has(page)) {
+                fetchPreviewPage(state, page)
+                    .then(() => renderPreviewRows(state))
+                    .catch(err => console.log(err.message));
+            }
+        }
+        fragment.appendChild(tr);
+    }
+
+    if (after > 0) {
+        fragment.appendChild(createSpacerRow(after, columnCount));
+    }
+
+    tbody.innerHTML = '';
+    tbody.appendChild(fragment);
+}
+
 function uploadFile(file) {
   const formData = new FormData();
   formData.append('file', file);
@@ -67,7 +270,7 @@ function uploadFile(file) {
   blurOverlay.style.display = 'block';
   mainContent.classList.add('blurred');
 
-  fetch('/upload', {
+  fetchData('/upload', {
     method: 'POST',
     body: formData
   })
@@ -87,13 +290,7 @@ function uploadFile(file) {
         // Display the CSV table
         csvArea.hidden = false;
         csvArea.style.display = 'flex';
-        csvArea.innerHTML = data.table;
-
-        // Add table styling
-        const table = csvArea.querySelector('table');
-        if (table) {
-          table.classList.add('table', 'table-striped', 'table-bordered');
-        }
+        refreshPreview();
         
         const optionsArea = document.querySelector('.options-area');
         optionsArea.innerHTML = ''; 
@@ -217,7 +414,7 @@ function uploadFile(file) {
             mainContent.classList.add('blurred');
 
             // Send delete request to server
-            fetch('/delete-columns', {
+            fetchData('/delete-columns', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -231,11 +428,7 @@ function uploadFile(file) {
             .then(data => {
                 if (data.success) {
                     // Update the table preview
-                    csvArea.innerHTML = data.table;
-                    const table = csvArea.querySelector('table');
-                    if (table) {
-                        table.classList.add('table', 'table-striped', 'table-bordered');
-                    }
+                    refreshPreview();
 
                     // Update the checklist to remove deleted columns
                     const checklistContainer = document.querySelector('.column-checklist');
@@ -295,7 +488,7 @@ function showClassificationInterface() {
     blurOverlay.style.display = 'none';
     mainContent.classList.remove('blurred');
 
-    fetch('/show-classification', {
+    fetchData('/show-classification', {
         method: 'POST'
     })
     .then(res => {
@@ -359,6 +552,15 @@ function showClassificationInterface() {
                 select.appendChild(option);
             });
 
+            // Preselect what was submitted before, or else the suggested classification
+            const suggestion = data.suggestions && data.suggestions[column];
+            if (data.submitted && data.submitted[column]) {
+                select.value = data.submitted[column];
+            } else if (suggestion) {
+                select.value = suggestion.classification;
+                select.title = `Suggested (${Math.round(suggestion.confidence * 100)}% confidence)`;
+            }
+
             columnDiv.appendChild(select);
             columnListContainer.appendChild(columnDiv);
         });
@@ -419,7 +621,7 @@ function submitClassifications() {
     blurOverlay.style.display = 'block';
     mainContent.classList.add('blurred');
 
-    fetch('/submit-classifications', {
+    fetchData('/submit-classifications', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -495,7 +697,7 @@ function submitClassifications() {
 }
 
 function checkEmptyFields(columns, classificationType) {
-    return fetch('/check-empty-fields', {
+    return fetchData('/check-empty-fields', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -662,7 +864,7 @@ function handleEmptyFieldSubmit(columns, type, formatContainer) {
     // Remove categorical endpoint
     const endpoint = type === 'Date' ? '/handle-empty-date-fields' : '/handle-empty-fields';
 
-    fetch(endpoint, {
+    fetchData(endpoint, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -673,11 +875,8 @@ function handleEmptyFieldSubmit(columns, type, formatContainer) {
     .then(data => {
         if (data.success) {
             // Update table
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            
             // Check if all data was deleted
-            if (!table || !table.rows || table.rows.length <= 1) { // Only header row or no rows
+            if (data.rowCount === 0) {
                 // Show warning and reload page
                 console.log('All data has been deleted. Returning to upload page...');
                 setTimeout(() => {
@@ -686,9 +885,7 @@ function handleEmptyFieldSubmit(columns, type, formatContainer) {
                 return;
             }
 
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             // Remove the empty fields container entirely instead of hiding it
             const optionsWrapper = document.querySelector('.options-wrapper');
@@ -738,7 +935,7 @@ function handleFormatSubmit(columns, type) {
         endpoint = '/apply-formats';
     }
 
-    fetch(endpoint, {
+    fetchData(endpoint, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -748,11 +945,8 @@ function handleFormatSubmit(columns, type) {
     .then(res => res.json())
     .then(data => {
         if (data.success) {
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            
             // Check if all data was deleted
-            if (!table || !table.rows || table.rows.length <= 1) {
+            if (data.rowCount === 0) {
                 console.log('No data remaining after processing. Returning to upload page...');
                 setTimeout(() => {
                     location.reload();
@@ -760,9 +954,7 @@ function handleFormatSubmit(columns, type) {
                 return;
             }
 
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             // Remove the options wrapper
             const optionsWrapper = document.querySelector('.options-wrapper');
@@ -803,7 +995,7 @@ function handleFormatSubmit(columns, type) {
                         }
                     }
                 } else if (type === 'Categorical') {
-                    fetch('/get-unique-values', {
+                    fetchData('/get-unique-values', {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
@@ -917,7 +1109,7 @@ function createCategoricalFormatContainer(columns, hidden) {
 }
 
 function handleCategoricalStandardization(columns) {
-    fetch('/get-unique-values', {
+    fetchData('/get-unique-values', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -1033,7 +1225,7 @@ function handleStandardizationSubmit(columns, uniqueValues) {
     blurOverlay.style.display = 'block';
     mainContent.classList.add('blurred');
 
-    fetch('/apply-standardization', {
+    fetchData('/apply-standardization', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -1057,11 +1249,7 @@ function handleStandardizationSubmit(columns, uniqueValues) {
     })
     .then(data => {
         if (data.success) {
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             const optionsWrapper = document.querySelector('.options-wrapper');
             if (optionsWrapper) {
@@ -1147,7 +1335,7 @@ function handleCategoricalEmptyFieldSubmit(columns) {
     mainContent.classList.add('blurred');
 
     // Make the API call
-    fetch('/handle-empty-categorical-fields', {
+    fetchData('/handle-empty-categorical-fields', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -1165,11 +1353,7 @@ function handleCategoricalEmptyFieldSubmit(columns) {
     .then(data => {
         if (data.success) {
             // Update table
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             // Remove the options container
             const optionsWrapper = document.querySelector('.options-wrapper');
@@ -1252,7 +1436,7 @@ function handleRoundingSubmit(columns) {
     blurOverlay.style.display = 'block';
     mainContent.classList.add('blurred');
 
-    fetch('/apply-numerical-rounding', {
+    fetchData('/apply-numerical-rounding', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -1269,11 +1453,7 @@ function handleRoundingSubmit(columns) {
     })
     .then(data => {
         if (data.success) {
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             const optionsWrapper = document.querySelector('.options-wrapper');
             if (optionsWrapper) {
@@ -1328,6 +1508,23 @@ function handleNumericalEmptyFields(columns) {
                     'Apply Empty Field Handling'
                 );
 
+                // Sketched statistics spare a pass over very large files
+                const approximateCheckDiv = document.createElement('div');
+                approximateCheckDiv.className = 'approximate-option';
+
+                const approximateCheckbox = document.createElement('input');
+                approximateCheckbox.type = 'checkbox';
+                approximateCheckbox.id = 'approximate-fills';
+                approximateCheckbox.checked = false;
+
+                const approximateLabel = document.createElement('label');
+                approximateLabel.htmlFor = 'approximate-fills';
+                approximateLabel.textContent = 'Use approximate median and mode (faster on very large files)';
+
+                approximateCheckDiv.appendChild(approximateCheckbox);
+                approximateCheckDiv.appendChild(approximateLabel);
+                emptyContainer.insertBefore(approximateCheckDiv, emptyContainer.querySelector('.submit-button-container'));
+
                 newOptionsWrapper.appendChild(emptyContainer);
                 optionsArea.appendChild(newOptionsWrapper);
             } else {
@@ -1349,16 +1546,18 @@ function handleNumericalEmptyFieldSubmit(columns) {
         }
     });
 
+    const approximate = document.querySelector('#approximate-fills')?.checked || false;
+
     loadingSpinner.hidden = false;
     blurOverlay.style.display = 'block';
     mainContent.classList.add('blurred');
 
-    fetch('/handle-empty-numerical-fields', {
+    fetchData('/handle-empty-numerical-fields', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ selections })
+        body: JSON.stringify({ selections, approximate })
     })
     .then(res => {
         if (!res.ok) {
@@ -1371,11 +1570,7 @@ function handleNumericalEmptyFieldSubmit(columns) {
     .then(data => {
         if (data.success) {
             // Update table
-            csvArea.innerHTML = data.table;
-            const table = csvArea.querySelector('table');
-            if (table) {
-                table.classList.add('table', 'table-striped', 'table-bordered');
-            }
+            refreshPreview();
 
             // Remove the options container
             const optionsWrapper = document.querySelector('.options-wrapper');
@@ -1439,7 +1634,7 @@ function showDownloadPage() {
 }
 
 function handleDownload() {
-    fetch('/download-file', {
+    fetchData('/download-file', {
         method: 'GET'
     })
     .then(res => res.blob())
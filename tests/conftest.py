@@ -0,0 +1,48 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app
+
+SAMPLE = "tests/sample_with_empties.csv"
+
+
+@pytest.fixture
+def client():
+    """A test client with its own upload folder, and app.config put back as it was after the test"""
+    config = dict(app.config)
+    app.config["TESTING"] = True
+    app.config["UPLOAD_FOLDER"] = "test_uploads"
+    if not os.path.exists(app.config["UPLOAD_FOLDER"]):
+        os.makedirs(app.config["UPLOAD_FOLDER"])
+    yield app.test_client()
+    for file in os.listdir(app.config["UPLOAD_FOLDER"]):
+        os.remove(os.path.join(app.config["UPLOAD_FOLDER"], file))
+    os.rmdir(app.config["UPLOAD_FOLDER"])
+    app.config.clear()
+    app.config.update(config)
+
+
+def upload_file(client, source=SAMPLE, name="sample.csv"):
+    """Upload a CSV file, given by path or as a file object, returning the response"""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return upload_file(client, f, name)
+    return client.post("/upload", data={"file": (source, name)}, content_type="multipart/form-data")
+
+
+def current_file(client):
+    """Path of the working file the client's session is cleaning"""
+    with client.session_transaction() as sess:
+        return os.path.join(app.config["UPLOAD_FOLDER"], sess["current_file"])
+
+
+@pytest.fixture
+def upload():
+    return upload_file
+
+
+@pytest.fixture
+def working_file():
+    return current_file
@@ -0,0 +1,58 @@
+OPERATIONS = [
+    {"operation": "apply-formats", "payload": {"selections": {"Name": "uppercase"}}},
+    {"operation": "handle-empty-fields", "payload": {"selections": {"Category": "fill-unknown"}}},
+    {"operation": "handle-empty-numerical-fields", "payload": {"selections": {"Value": "delete-empty-rows"}}},
+    {"operation": "apply-numerical-rounding", "payload": {"selections": {"Value": "whole"}}},
+]
+
+
+def all_rows(client):
+    return client.get("/rows", query_string={"limit": 500}).get_json()["rows"]
+
+
+def test_pipeline_matches_separate_requests(client, upload):
+    upload(client)
+    for op in OPERATIONS:
+        response = client.post(f"/{op['operation']}", json=op["payload"])
+        assert response.status_code == 200
+    expected = all_rows(client)
+
+    upload(client)
+    response = client.post("/apply-pipeline", json={"operations": OPERATIONS})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["success"]
+    assert result["rowCount"] == len(expected)
+    assert all_rows(client) == expected
+
+
+def test_pipeline_reports_each_step(client, upload):
+    upload(client)
+    response = client.post("/apply-pipeline", json={"operations": OPERATIONS})
+    steps = response.get_json()["steps"]
+    assert [step["operation"] for step in steps] == [op["operation"] for op in OPERATIONS]
+    assert [step["rowCount"] for step in steps] == [7, 7, 6, 6]
+    assert all(step["durationMs"] >= 0 for step in steps)
+
+
+def test_pipeline_saves_nothing_when_a_step_fails(client, upload):
+    upload(client)
+    before = all_rows(client)
+    operations = OPERATIONS[:1] + [
+        {"operation": "apply-formats", "payload": {"selections": {"Missing": "uppercase"}}}
+    ]
+    response = client.post("/apply-pipeline", json={"operations": operations})
+    assert response.status_code == 400
+    result = response.get_json()
+    assert result["failedStep"] == 1
+    assert len(result["steps"]) == 1
+    assert all_rows(client) == before
+
+
+def test_pipeline_rejects_unknown_operations(client, upload):
+    upload(client)
+    response = client.post(
+        "/apply-pipeline", json={"operations": [{"operation": "format-disk", "payload": {}}]}
+    )
+    assert response.status_code == 400
+    assert "format-disk" in response.get_json()["error"]
@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+import bench_routes
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_baseline_covers_every_size_and_route():
+    with open(bench_routes.BASELINE) as f:
+        baseline = json.load(f)
+    routes = {"upload"} | {name for name, *_ in bench_routes.route_calls()}
+    for size in ("10k", "1M", "10M"):
+        assert set(baseline[str(bench_routes.parse_size(size))]) == routes
+
+
+def test_sizes_without_a_baseline_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr(bench_routes, "run_flow", lambda csv_path: {"upload": {"seconds": 1.0, "peakMB": 100.0}})
+    _, failures = bench_routes.run_sizes([100], str(tmp_path), {"10000": {}}, 0.5)
+    assert failures == ["100 rows: no baseline, record one with --update-baseline"]
+    _, failures = bench_routes.run_sizes([100], str(tmp_path), None, 0.5)
+    assert failures == []
+
+
+def test_compare_flags_slower_and_larger_routes():
+    baseline = {"rows": {"seconds": 1.0, "peakMB": 100.0}, "profile": {"seconds": 1.0, "peakMB": 100.0}}
+    results = {"rows": {"seconds": 1.6, "peakMB": 100.0}, "profile": {"seconds": 1.4, "peakMB": 160.0}}
+    assert bench_routes.compare(10, results, baseline, 0.5) == [
+        "10 rows rows: 1.600s, baseline 1.000s",
+        "10 rows profile: 160 MB, baseline 100 MB",
+    ]
+
+
+def test_routes_at_10k_rows_are_within_their_baseline():
+    # A process of its own, so peak memory is measured as when the baseline was recorded
+    result = subprocess.run([sys.executable, "benchmarks/bench_routes.py", "--rows", "10k"],
+                            cwd=ROOT, capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,185 @@
+import io
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app, frame_cache
+from chunked import chunked_operation
+from row_index import row_hashes
+from working_store import WorkingFileWriter, read_working_file, SchemaMismatch
+
+ROWS = [
+    "Name,Category,Value,Price,Date",
+    "alice,A,100,$1.50,2023-01-01",
+    "bob,,200,2.25,01/02/2023",
+    "charlie,B,,3.125,2023-01-03",
+    "david,C,400,,",
+    ",A,500,$4.75,2023-01-05",
+    "frank,<NA>,600,5.5,2023-01-06",
+    "grace,B,700,6,NaN",
+    "alice,A,100,$1.50,2023-01-01",
+    "heidi,C,,7.25,2023/01/09",
+    "ivan,,900,8.5,2023-01-10",
+    "bob,,200,2.25,01/02/2023",
+    "judy,A,1000,,2023-01-12",
+    "karl,B,1100,9.75,2023-01-13",
+    "alice,A,100,$1.50,2023-01-01",
+    "liam,C,1200,10,",
+    "mona,A,,11.5,2023-01-16",
+]
+
+
+@pytest.fixture
+def client(client):
+    app.config["OUT_OF_CORE_CHUNK_ROWS"] = 4
+    return client
+
+
+def csv_file(rows=ROWS):
+    return io.BytesIO("\n".join(rows).encode())
+
+
+def download(client):
+    response = client.get("/download-file")
+    text = response.get_data(as_text=True)
+    response.close()
+    return text
+
+
+@pytest.fixture
+def cleaned_both_ways(client, upload, working_file):
+    """The download after running operations in memory and a chunk at a time"""
+    def clean(operations, rows=ROWS):
+        in_memory = app.test_client()
+        upload(in_memory, csv_file(rows), "small.csv")
+        upload(client, csv_file(rows), "big.csv")
+        filepath = working_file(client)
+        app.config["OUT_OF_CORE_MIN_BYTES"] = None
+        expected = in_memory.post("/apply-pipeline", json={"operations": operations})
+        app.config["OUT_OF_CORE_MIN_BYTES"] = 0
+        response = client.post("/apply-pipeline", json={"operations": operations})
+        assert response.status_code == expected.status_code == 200, response.get_json()
+        assert response.get_json()["rowCount"] == expected.get_json()["rowCount"]
+        assert filepath not in frame_cache
+        chunked = download(client)
+        app.config["OUT_OF_CORE_MIN_BYTES"] = None
+        return chunked, download(in_memory)
+    return clean
+
+
+def test_row_local_operations_match_in_memory(cleaned_both_ways):
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "handle-empty-name-fields", "payload": {"nameEmptyHandling": {"Name": 'fill-with-"unknown"'}}},
+        {"operation": "apply-name-formats", "payload": {"nameFormats": {"Name": "title-case"}}},
+        {"operation": "handle-empty-fields", "payload": {"selections": {"Category": "fill-na"}}},
+        {"operation": "apply-standardization", "payload": {"standardizations": {"Category": {"A": "Alpha"}}}},
+        {"operation": "apply-date-formats", "payload": {"selections": {"Date": "dd/mm/yyyy"}}},
+        {"operation": "apply-numerical-rounding", "payload": {"selections": {"Price": "tenths"}}},
+        {"operation": "handle-empty-date-fields", "payload": {"selections": {"Date": "delete-empty-rows"}}},
+    ])
+    assert chunked == in_memory
+
+
+def test_fills_from_whole_column_statistics_match_in_memory(cleaned_both_ways):
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "submit-classifications", "payload": {"classifications": {"Category": "Categorical"}}},
+        {"operation": "handle-empty-categorical-fields", "payload": {"selections": {"Category": "fill-mode"}}},
+        {"operation": "apply-numerical-rounding", "payload": {"selections": {"Price": "whole"}}},
+        {"operation": "handle-empty-numerical-fields",
+         "payload": {"selections": {"Price": "fill-median", "Value": "fill-mean"}}},
+    ])
+    assert chunked == in_memory
+
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "handle-empty-numerical-fields",
+         "payload": {"selections": {"Value": "delete-empty-rows", "Price": "fill-mode"}}},
+        {"operation": "handle-empty-categorical-fields", "payload": {"selections": {"Category": "fill-mean"}}},
+    ])
+    assert chunked == in_memory
+
+
+def test_approximate_fills_match_in_memory(cleaned_both_ways):
+    # Columns this small are sketched exactly, whichever way they are read
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "handle-empty-numerical-fields", "payload": {
+            "selections": {"Value": "fill-median", "Price": "fill-mode"}, "approximate": True}},
+        {"operation": "handle-empty-numerical-fields", "payload": {
+            "selections": {"Price": "delete-empty-rows", "Value": "fill-mean"}, "approximate": True}},
+    ])
+    assert chunked == in_memory
+
+
+def test_columns_failing_in_a_late_chunk_are_left_as_they_were(cleaned_both_ways):
+    # A lone minus sign cannot be cleaned into a number
+    rows = ROWS + ["nick,A,1300,-,2023-01-17"]
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "apply-numerical-rounding", "payload": {"selections": {"Price": "whole", "Value": "whole"}}},
+    ], rows)
+    assert chunked == in_memory
+    assert "$1.50" in chunked
+
+
+def test_duplicates_are_found_across_chunks(cleaned_both_ways):
+    chunked, in_memory = cleaned_both_ways([
+        {"operation": "delete-columns", "payload": {"columns": ["Date"], "deleteDuplicates": True}},
+    ])
+    assert chunked == in_memory
+    assert len(chunked.splitlines()) == len(ROWS) - 3
+
+
+def test_duplicate_hashes_are_found_across_partitions():
+    df = pd.DataFrame({"a": list(range(5000)) * 2, "b": ["x"] * 10000, "c": range(10000)})
+    operation = chunked_operation("delete-columns", {"columns": ["c"], "deleteDuplicates": True})
+    operation.prepare(df.iloc[start:start + 1000] for start in range(0, len(df), 1000))
+    expected = row_hashes(df.drop(columns=["c"]))
+    assert sorted(operation.candidates) == sorted(set(expected))
+    operation.prepare(iter([df.iloc[:5000]]))
+    assert len(operation.candidates) == 0
+
+
+def test_reads_of_a_large_file_do_not_load_it(client, upload, working_file):
+    upload(client, csv_file(), "big.csv")
+    filepath = working_file(client)
+    app.config["OUT_OF_CORE_MIN_BYTES"] = 0
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+
+    rows = client.get("/rows?offset=5&limit=3&columns=Name").get_json()
+    assert rows["rows"] == [["FRANK"], ["GRACE"], ["ALICE"]]
+    assert rows["rowCount"] == len(ROWS) - 1
+    profile = client.get("/profile").get_json()
+    assert profile["duplicateCount"] == 3
+    assert profile["columns"]["Name"]["nullCount"] == 1
+    assert filepath not in frame_cache
+
+
+def test_failed_operations_leave_the_file_as_it_was(client, upload, working_file):
+    upload(client, csv_file(), "big.csv")
+    filepath = working_file(client)
+    before = read_working_file(filepath)
+    app.config["OUT_OF_CORE_MIN_BYTES"] = 0
+    response = client.post("/delete-columns", json={"columns": ["Name", "Category", "Value", "Price", "Date"]})
+    assert response.status_code == 400
+    assert "At least one column must remain" in response.get_json()["error"]
+    pd.testing.assert_frame_equal(read_working_file(filepath), before)
+    assert os.listdir(app.config["UPLOAD_FOLDER"]) == [os.path.basename(filepath)]
+
+
+def test_writer_widens_types_chunks_disagree_on(tmp_path):
+    filepath = str(tmp_path / "out.arrow")
+    writer = WorkingFileWriter(filepath, fallback={"b": pa.string()})
+    writer.write(pd.DataFrame({"a": [1.5, 2.5], "b": [None, None]}))
+    # Integers fit a float column and missing text takes the file's text type
+    writer.write(pd.DataFrame({"a": [3, 4], "b": ["x", None]}))
+    with pytest.raises(SchemaMismatch) as mismatch:
+        writer.write(pd.DataFrame({"a": ["five", "six"], "b": ["y", "z"]}))
+    writer.abort()
+    assert not os.path.exists(filepath + ".tmp")
+
+    writer = WorkingFileWriter(filepath, types=mismatch.value.types)
+    for chunk in ([1.5, 2.5], [3, 4], ["five", "six"]):
+        writer.write(pd.DataFrame({"a": chunk}))
+    writer.commit()
+    assert read_working_file(filepath)["a"].tolist() == ["1.5", "2.5", "3", "4", "five", "six"]
@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from classify import suggest_classification
+from column_profile import ColumnProfile
+
+
+def suggestions(df):
+    profile = ColumnProfile.of(df)
+    return {column: suggest_classification(stats, profile.row_count).classification
+            for column, stats in profile.columns.items()}
+
+
+def test_suggests_each_classification():
+    rng = np.random.default_rng(0)
+    rows = 5000
+    df = pd.DataFrame({
+        "price": rng.choice(["$1,200.50", "3.10", "-7", "12%"], rows),
+        "when": rng.choice(["2023-01-05", "2024-12-31", "2020-02-29"], rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "comment": [f"note {i}" for i in range(rows)],
+        "count": rng.integers(0, 1000, rows),
+    })
+    assert suggestions(df) == {
+        "price": "Numerical",
+        "when": "Date",
+        "region": "Categorical",
+        "comment": "Non-categorical",
+        "count": "Numerical",
+    }
+
+
+def test_empty_column_has_no_confidence():
+    stats = ColumnProfile.of(pd.DataFrame({"empty": [None, None]})).columns["empty"]
+    assert suggest_classification(stats, 2).confidence == 0.0
+
+
+def test_show_classification_suggests_from_the_profile(client, upload):
+    upload(client, "tests/csv.csv")
+    result = client.post("/show-classification").get_json()
+    assert result["suggestions"]["Platform"]["classification"] == "Categorical"
+    assert result["suggestions"]["Name"]["classification"] == "Non-categorical"
+    assert result["suggestions"]["Global_Sales"] == {"classification": "Numerical", "confidence": 1.0}
+    assert result["submitted"] == {}
+
+
+def test_submitted_classifications_are_stored(client, upload):
+    upload(client)
+    client.post("/submit-classifications", json={"classifications": {"Category": "Categorical", "Value": "Numerical"}})
+    assert client.post("/show-classification").get_json()["submitted"] == {
+        "Category": "Categorical", "Value": "Numerical"
+    }
+
+    # check-empty-fields falls back to each column's stored classification,
+    # so '<NA>' text in Category counts as empty there
+    client.post("/handle-empty-fields", json={"selections": {"Category": "fill-unknown"}})
+    client.post("/apply-standardization", json={"standardizations": {"Category": {"A": "<NA>"}}})
+    response = client.post("/check-empty-fields", json={"columns": ["Category", "Name"]})
+    assert response.get_json()["columnsWithEmpty"] == ["Category", "Name"]
+
+    client.post("/delete-columns", json={"columns": ["Value"]})
+    assert client.post("/show-classification").get_json()["submitted"] == {"Category": "Categorical"}
@@ -0,0 +1,163 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cleaning import clean_numbers, normalize_text, normalize_text_columns, DateParser, format_dates, remap_values
+
+
+def reference_clean_number(value):
+    """The per-cell cleaning apply_numerical_rounding used to run"""
+    if pd.isna(value):
+        return value
+    str_val = str(value)
+    cleaned = "".join(c for c in str_val if c.isdigit() or c in ".-")
+    if cleaned.count(".") > 1:
+        parts = cleaned.split(".")
+        cleaned = parts[0] + "." + "".join(parts[1:])
+    if cleaned.count("-") > 1:
+        cleaned = "-" + cleaned.replace("-", "")
+    return cleaned if cleaned else None
+
+
+MESSY_NUMBERS = [
+    "$1,234.50",
+    "1.2.3",
+    "--5",
+    "-3-4",
+    "abc",
+    None,
+    np.nan,
+    "  42 ",
+    "7.",
+    ".5",
+    "1.000.000,5",
+    "USD -12.75",
+]
+
+
+def test_clean_numbers_matches_per_cell_cleaning():
+    series = pd.Series(MESSY_NUMBERS, dtype=object)
+    expected = series.apply(reference_clean_number).astype(float)
+    pd.testing.assert_series_equal(clean_numbers(series), expected)
+
+
+def test_clean_numbers_mixed_object_column():
+    series = pd.Series([1, 2.5, "3 kg", None], dtype=object)
+    expected = series.apply(reference_clean_number).astype(float)
+    pd.testing.assert_series_equal(clean_numbers(series), expected)
+
+
+def test_clean_numbers_numeric_fast_path():
+    series = pd.Series([1.5, np.nan, -2.0])
+    result = clean_numbers(series)
+    assert result.dtype == float
+    pd.testing.assert_series_equal(result, series)
+
+
+def test_clean_numbers_invalid_leftovers_raise():
+    # A lone minus sign is not a number, like the per-cell version
+    with pytest.raises(ValueError):
+        clean_numbers(pd.Series(["-", "1"], dtype=object))
+
+
+ODD_NAMES = [
+    "  alice__smith ",
+    "bob\tjones",
+    "carol\u3000de_la_cruz",
+    "__dave__",
+    "eve\x0bmarie",
+    "",
+    "   ",
+    "frank\u200bo",
+]
+
+
+def test_normalize_text_matches_split_join():
+    series = pd.Series(ODD_NAMES, dtype=object)
+    expected = [" ".join(x.replace("_", " ").split()) for x in ODD_NAMES]
+    assert normalize_text(series).tolist() == expected
+
+
+def test_normalize_text_keeps_missing_values():
+    series = pd.Series(["a_b", None, np.nan, 5.0], dtype=object)
+    result = normalize_text(series)
+    assert result[0] == "a b"
+    assert result[1:3].isna().all()
+    assert result[3] == "5.0"
+
+
+def test_normalize_text_keeps_columns_in_arrow():
+    series = pd.Series(["a_b", None, "c  d"], dtype="str")
+    result = normalize_text(series)
+    assert result.dtype == series.dtype
+    assert isinstance(result.array, pd.arrays.ArrowStringArray)
+    assert result.tolist()[::2] == ["a b", "c d"] and pd.isna(result[1])
+
+
+def test_normalize_text_columns_in_one_pass():
+    df = pd.DataFrame({"first": ["a__b", None], "last": [" c  d", "e_f"]})
+    result = normalize_text_columns(df, ["first", "last"])
+    assert result["first"].tolist()[0] == "a b"
+    assert pd.isna(result["first"][1])
+    assert result["last"].tolist() == ["c d", "e f"]
+
+
+MIXED_DATES = [
+    "2023-01-01", "2023-01-02", "1/2/2023", "13/01/2023", "March 5, 2023",
+    "2023-01-01", None, "not a date", "2023-02-30", "2023/04/05 10:30",
+]
+
+
+def same_datetimes(a, b):
+    return a.isna().equals(b.isna()) and (a[a.notna()] == b[b.notna()]).all()
+
+
+def test_date_parser_matches_mixed_parsing():
+    series = pd.Series(MIXED_DATES, dtype=object)
+    expected = pd.to_datetime(series, format="mixed", errors="coerce")
+    parser = DateParser()
+    assert same_datetimes(parser.parse("Date", series), expected)
+    assert parser.formats["Date"] == "%Y-%m-%d"
+
+
+def test_date_parser_reuses_parsed_output(monkeypatch):
+    series = pd.Series(["2023-02-01", "2023-03-04", None], dtype=object)
+    parser = DateParser()
+    dates = parser.parse("Date", series)
+    formatted = format_dates(dates.dropna(), "%d/%m/%Y")
+    parser.record_formatted("Date", "%d/%m/%Y", formatted, dates.dropna())
+
+    # Reading the day-first output back needs no parsing at all
+    monkeypatch.setattr(DateParser, "parse_values", lambda *args: pytest.fail("parsed again"))
+    reformatted = series.copy()
+    reformatted[formatted.index] = formatted
+    assert same_datetimes(parser.parse("Date", reformatted), dates)
+
+
+def test_date_parser_reads_new_dates_in_the_format_it_wrote():
+    parser = DateParser()
+    dates = parser.parse("Date", pd.Series(["2023-02-01"], dtype=object))
+    parser.record_formatted("Date", "%d/%m/%Y", format_dates(dates, "%d/%m/%Y"), dates)
+    parsed = parser.parse("Date", pd.Series(["03/04/2020"], dtype=object))
+    assert parsed[0] == pd.Timestamp("2020-04-03")
+    assert pd.to_datetime(pd.Series(["03/04/2020"]), format="mixed")[0] == pd.Timestamp("2020-03-04")
+
+
+REMAP_COLUMNS = [
+    pd.Series(["north", "South", None, "north", "east", np.nan], dtype=object),
+    pd.Series(["north", "South", None, "east"], dtype="str"),
+    pd.Series([1.0, 2.0, np.nan, 1.0]),
+    pd.Series([1, "north", 2.5, None], dtype=object),
+]
+
+
+@pytest.mark.parametrize("series", REMAP_COLUMNS)
+def test_remap_values_matches_map(series):
+    mapping = {"north": "North", "South": "South", "east": None, "west": "West"}
+    expected = series.map(lambda x: mapping.get(x, x))
+    result = remap_values(series, mapping)
+    assert result.isna().tolist() == expected.isna().tolist()
+    assert result[result.notna()].tolist() == expected[expected.notna()].tolist()
@@ -0,0 +1,187 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import app as app_module
+import column_profile
+from app import app, column_profiles
+from column_profile import ColumnProfile, ProfileBuilder, Reservoir, ValueCounts
+
+
+def profile_dicts(profile):
+    return {column: stats.to_dict() for column, stats in profile.columns.items()}
+
+
+def test_builder_matches_whole_frame_profile():
+    df = pd.read_csv("tests/csv.csv")
+    builder = ProfileBuilder()
+    for start in range(0, len(df), 1000):
+        builder.add(df.iloc[start:start + 1000])
+    assert profile_dicts(builder.build()) == profile_dicts(ColumnProfile.of(df))
+
+
+def test_upload_profiles_every_column(client, upload):
+    upload(client)
+    result = client.get("/profile").get_json()
+    assert result["rowCount"] == 7
+    assert result["columns"]["Value"]["nullCount"] == 1
+    assert result["columns"]["Value"]["min"] == 100
+    assert result["columns"]["Value"]["max"] == 700
+    assert result["columns"]["Category"]["distinctCount"] == 3
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_profile_follows_changes(client, upload, working_file, lazy):
+    app.config["LAZY_PIPELINE"] = lazy
+    upload(client)
+    filepath = working_file(client)
+    client.post("/handle-empty-fields", json={"selections": {"Category": "fill-unknown"}})
+    client.post("/handle-empty-date-fields", json={"selections": {"Date": "delete-empty-rows"}})
+    client.post("/delete-columns", json={"columns": ["Name"]})
+
+    profile = client.get("/profile").get_json()
+    df = app_module.load_working_df(filepath)
+    assert profile["rowCount"] == len(df)
+    assert profile["columns"] == {
+        column: stats.to_dict() for column, stats in ColumnProfile.of(df).columns.items()
+    }
+
+
+def test_check_empty_fields_reads_the_profile(client, upload, monkeypatch):
+    upload(client)
+    monkeypatch.setattr(app_module, "load_working_columns", lambda *args: pytest.fail("scanned the data"))
+    response = client.post(
+        "/check-empty-fields", json={"columns": ["Name", "Value"], "classificationType": "Numerical"}
+    )
+    assert response.get_json()["columnsWithEmpty"] == ["Name", "Value"]
+
+
+def test_rewritten_columns_are_rescanned_alone(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    assert not column_profiles[filepath].stale
+
+    # Dropping rows leaves the other columns to be rescanned when next read
+    client.post("/handle-empty-fields", json={"selections": {"Category": "delete-empty-rows"}})
+    assert column_profiles[filepath].stale == {"Name", "Value", "Date"}
+
+
+def test_value_counts_sort_mixed_types():
+    counts = ValueCounts.of(pd.Series(["b", 2, "a", 2, None, 10.5], dtype=object))
+    page, matched = counts.page()
+    assert page.index.tolist() == [10.5, 2, "a", "b"]
+    assert matched == 4
+    page, _ = counts.page(order="count", limit=1)
+    assert page.to_dict() == {2: 2}
+
+
+def test_value_counts_of_chunks_bound_their_undercount():
+    values = pd.Series(np.concatenate([np.full(3000, "common"), np.arange(20000).astype(str)]))
+    values = values.sample(frac=1, random_state=0)
+    chunks = [values[start:start + 1000] for start in range(0, len(values), 1000)]
+    assert ValueCounts.of_chunks(chunks).by_count.to_dict() == ValueCounts.of(values).by_count.to_dict()
+
+    counts = ValueCounts.of_chunks(chunks, counters=100)
+    assert not counts.exact
+    assert len(counts) <= 100
+    assert counts.error <= len(values) / 101
+    assert 3000 - counts.error <= counts.by_count["common"] <= 3000
+    page, _ = counts.page(order="count", limit=1)
+    assert page.index.tolist() == ["common"]
+
+
+def test_distinct_counts_are_estimated_past_the_exact_limit(monkeypatch):
+    monkeypatch.setattr(column_profile, "DISTINCT_EXACT_MAX", 1000)
+    builder = ProfileBuilder()
+    for start in range(0, 50000, 5000):
+        builder.add(pd.DataFrame({"id": np.arange(start, start + 5000), "small": np.arange(5000) % 10}))
+    assert builder.hashes["small"].exact and not builder.hashes["id"].exact
+    profile = builder.build()
+    assert profile.columns["small"].distinct_count == 10
+    assert abs(profile.columns["id"].distinct_count - 50000) <= 0.033 * 50000
+
+
+def test_unique_values_of_a_large_file_are_counted_a_chunk_at_a_time(client, upload, monkeypatch):
+    app.config["OUT_OF_CORE_MIN_BYTES"] = 0
+    app.config["OUT_OF_CORE_CHUNK_ROWS"] = 100
+    monkeypatch.setattr(column_profile, "VALUE_COUNTS_MAX", 20)
+    monkeypatch.setattr(app_module, "load_working_columns", None)
+    upload(client, "tests/csv.csv")
+    result = client.post(
+        "/get-unique-values", json={"columns": ["Platform", "Year"], "order": "count", "limit": 3}
+    ).get_json()
+    expected = pd.read_csv("tests/csv.csv")["Platform"].value_counts()
+    # Kept counts are never above the true ones
+    for count in result["valueCounts"]["Platform"]:
+        assert count["value"] in expected.index[:6] and count["count"] <= expected[count["value"]]
+    assert not result["exactCounts"]["Platform"]
+    assert result["distinctCounts"]["Platform"] == len(expected)
+
+
+def test_unique_values_top_k_and_prefix(client, upload):
+    upload(client, "tests/csv.csv")
+    response = client.post(
+        "/get-unique-values", json={"columns": ["Platform"], "order": "count", "limit": 3}
+    )
+    result = response.get_json()
+    expected = pd.read_csv("tests/csv.csv")["Platform"].value_counts()
+    assert result["valueCounts"]["Platform"] == [
+        {"value": value, "count": int(count)} for value, count in expected.head(3).items()
+    ]
+    assert result["distinctCounts"]["Platform"] == len(expected)
+
+    response = client.post("/get-unique-values", json={"columns": ["Platform"], "prefix": "ps"})
+    values = response.get_json()["uniqueValues"]["Platform"]
+    assert values == sorted(v for v in expected.index if v.lower().startswith("ps"))
+
+
+def test_unique_values_pages_are_bounded(client, upload):
+    upload(client, "tests/csv.csv")
+    app.config["MAX_UNIQUE_VALUES"] = 50
+    try:
+        seen = []
+        cursors = {}
+        while True:
+            response = client.post(
+                "/get-unique-values", json={"columns": ["Publisher"], "limit": 500, "cursors": cursors}
+            )
+            result = response.get_json()
+            assert len(result["uniqueValues"]["Publisher"]) <= 50
+            seen += result["uniqueValues"]["Publisher"]
+            if result["nextCursors"]["Publisher"] is None:
+                break
+            cursors = result["nextCursors"]
+    finally:
+        app.config["MAX_UNIQUE_VALUES"] = 1000
+    assert seen == sorted(pd.read_csv("tests/csv.csv")["Publisher"].dropna().unique())
+
+
+def test_unique_values_follow_changes(client, upload):
+    upload(client)
+    client.post("/get-unique-values", json={"columns": ["Name"]})
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    values = client.post("/get-unique-values", json={"columns": ["Name"]}).get_json()["uniqueValues"]
+    assert values["Name"] == ["ALICE", "BOB", "CHARLIE", "DAVID", "FRANK", "GRACE"]
+
+
+def test_reservoir_samples_uniformly_across_chunks():
+    values = np.arange(100000)
+    reservoir = Reservoir(size=1000)
+    for start in range(0, len(values), 7000):
+        reservoir.add(values[start:start + 7000])
+    sample = reservoir.values.astype(int)
+    assert len(sample) == 1000
+    assert len(set(sample)) == 1000
+    # Each tenth of the stream holds about a tenth of the sample
+    assert (np.bincount(sample // 10000) > 60).all()
+
+
+def test_profile_samples_present_values(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    sample = column_profiles[filepath].columns["Value"].sample
+    assert sorted(sample) == [100, 200, 400, 500, 600, 700]
@@ -0,0 +1,65 @@
+import gzip
+import io
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app, frame_cache
+
+
+@pytest.fixture
+def client(client):
+    # Several chunks even for the small sample
+    app.config["DOWNLOAD_CHUNK_ROWS"] = 2
+    return client
+
+
+def expected_csv():
+    return pd.read_csv("tests/sample_with_empties.csv").to_csv(index=False).encode()
+
+
+def test_download_streams_whole_file(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    response = client.get("/download-file")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["Content-Type"].startswith("text/csv")
+    assert response.data == expected_csv()
+    assert not os.path.exists(filepath)
+    # The session no longer points at the removed file
+    with client.session_transaction() as sess:
+        assert "current_file" not in sess
+    assert client.get("/download-file").get_json()["error"] == "No file to download"
+
+
+def test_download_from_memory_matches_file(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    assert filepath in frame_cache  # The change is only held in memory
+    data = client.get("/download-file").data
+    assert pd.read_csv(io.BytesIO(data))["Name"].tolist()[:2] == ["ALICE", "BOB"]
+
+
+def test_download_gzip(client, upload):
+    upload(client)
+    response = client.get("/download-file", query_string={"compression": "gzip"})
+    assert response.headers["Content-Type"] == "application/gzip"
+    assert "cleaned_data.csv.gz" in response.headers["Content-Disposition"]
+    assert gzip.decompress(response.data) == expected_csv()
+
+
+def test_file_kept_until_stream_finishes(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    response = client.get("/download-file", buffered=False)
+    chunks = response.response
+    next(iter(chunks))
+    assert os.path.exists(filepath)  # An interrupted download can be retried
+    response.close()
+    assert os.path.exists(filepath)
+    with client.session_transaction() as sess:
+        assert "current_file" in sess
@@ -1,23 +1,10 @@
 import os
 import sys
-import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from app import app
 
 
-@pytest.fixture
-def client():
-    app.config["TESTING"] = True
-    app.config["UPLOAD_FOLDER"] = "test_uploads"
-    if not os.path.exists(app.config["UPLOAD_FOLDER"]):
-        os.makedirs(app.config["UPLOAD_FOLDER"])
-    yield app.test_client()
-    for file in os.listdir(app.config["UPLOAD_FOLDER"]):
-        os.remove(os.path.join(app.config["UPLOAD_FOLDER"], file))
-    os.rmdir(app.config["UPLOAD_FOLDER"])
-
-
 def test_upload_regular_csv(client):
     data = {"file": (open("tests/sample.csv", "rb"), "sample.csv")}
     response = client.post("/upload", data=data, content_type="multipart/form-data")
@@ -57,7 +44,8 @@ def test_delete_single_column(client):
     assert json_data["success"] is True
     assert column_to_delete not in json_data["columns"]
     assert len(json_data["columns"]) == len(initial_columns) - 1
-    assert "<table" in json_data["table"]  # Check if table HTML is returned
+    assert json_data["columnCount"] == len(initial_columns) - 1
+    assert json_data["rowCount"] > 0  # Counts are returned instead of a table
 
 
 def test_delete_multiple_columns(client):
@@ -74,7 +62,8 @@ def test_delete_multiple_columns(client):
     assert json_data["success"] is True
     assert all(col not in json_data["columns"] for col in columns_to_delete)
     assert len(json_data["columns"]) == len(initial_columns) - 2
-    assert "<table" in json_data["table"]
+    assert json_data["columnCount"] == len(initial_columns) - 2
+    assert "table" not in json_data
 
 
 def test_delete_all_columns(client):
@@ -250,11 +239,10 @@ def test_handle_empty_name_fields_delete_rows(client):
     assert response.status_code == 200
     json_data = response.get_json()
     assert json_data["success"] is True
-    assert "table" in json_data
+    assert json_data["rowCount"] == 6
     # Check that the row with empty Name is gone (original index 4)
-    assert (
-        "><td></td>" not in json_data["table"]
-    )  # Crude check, better would be parsing HTML or checking dataframe state
+    rows = client.get("/rows", query_string={"columns": "Name"}).get_json()["rows"]
+    assert [None] not in rows
 
 
 def test_handle_empty_name_fields_fill_none(client):
@@ -266,7 +254,8 @@ def test_handle_empty_name_fields_fill_none(client):
     assert response.status_code == 200
     json_data = response.get_json()
     assert json_data["success"] is True
-    assert "<td>None</td>" in json_data["table"]  # Check if empty cell was filled
+    rows = client.get("/rows", query_string={"columns": "Name"}).get_json()["rows"]
+    assert ["None"] in rows  # Check if empty cell was filled
 
 
 def test_handle_empty_fields_no_file(client):
@@ -309,7 +298,95 @@ def test_apply_standardization_partial_mapping(client):
     json_data = response.get_json()
     if response.status_code == 200:
         assert json_data["success"] is True
-        assert "table" in json_data
+        assert "rowCount" in json_data
     else:
         assert json_data["success"] is False
         assert "error" in json_data
+
+
+# === Tests for the row window preview ===
+
+
+def test_rows_window(client):
+    upload_file_helper(client, filename="sample_with_empties.csv")
+    response = client.get("/rows", query_string={"offset": 1, "limit": 2})
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data["success"] is True
+    assert json_data["rowCount"] == 7
+    assert json_data["columnCount"] == 4
+    assert json_data["columns"] == ["Name", "Category", "Value", "Date"]
+    assert len(json_data["rows"]) == 2
+    assert json_data["rows"][0][0] == "Bob"
+    assert json_data["rows"][0][1] is None  # Missing values come back as null
+
+
+def test_rows_selected_columns(client):
+    upload_file_helper(client, filename="sample_with_empties.csv")
+    response = client.get(
+        "/rows", query_string=[("columns", "Date"), ("columns", "Name")]
+    )
+    json_data = response.get_json()
+    assert json_data["columns"] == ["Date", "Name"]
+    assert json_data["rows"][0] == ["2023-01-01", "Alice"]
+
+
+def test_rows_limit_is_capped(client):
+    upload_file_helper(client)
+    response = client.get("/rows", query_string={"limit": 10**6})
+    json_data = response.get_json()
+    assert json_data["limit"] == app.config["MAX_PREVIEW_ROWS"]
+    assert len(json_data["rows"]) <= app.config["MAX_PREVIEW_ROWS"]
+
+
+def test_rows_unknown_column(client):
+    upload_file_helper(client, filename="sample_with_empties.csv")
+    response = client.get("/rows", query_string={"columns": "Missing"})
+    assert response.status_code == 400
+    assert "Unknown columns" in response.get_json()["error"]
+
+
+def test_rows_no_file(client):
+    response = client.get("/rows")
+    assert response.status_code == 400
+    assert "No file uploaded" in response.get_json()["error"]
+
+
+def test_apply_numerical_rounding(client):
+    upload_file_helper(client, filename="csv.csv")
+    response = client.post(
+        "/apply-numerical-rounding",
+        json={"selections": {"NA_Sales": "tenths", "EU_Sales": "whole"}},
+    )
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+    rows = client.get(
+        "/rows", query_string=[("columns", "NA_Sales"), ("columns", "EU_Sales"), ("limit", 1)]
+    ).get_json()["rows"]
+    assert rows == [[41.5, 29.0]]
+
+
+def test_apply_name_formats_keeps_empty_names(client):
+    upload_file_helper(client, filename="sample_with_empties.csv")
+    response = client.post(
+        "/apply-name-formats", json={"nameFormats": {"Name": "uppercase"}}
+    )
+    assert response.status_code == 200
+    rows = client.get("/rows", query_string={"columns": "Name"}).get_json()["rows"]
+    assert rows[0] == ["ALICE"]
+    assert rows[4] == [None]  # Not the text 'NAN'
+
+
+def test_apply_date_formats_round_trip(client):
+    upload_file_helper(client, filename="sample_with_empties.csv")
+    original = client.get("/rows", query_string={"columns": "Date"}).get_json()["rows"]
+
+    response = client.post("/apply-date-formats", json={"selections": {"Date": "dd/mm/yyyy"}})
+    assert response.status_code == 200
+    rows = client.get("/rows", query_string={"columns": "Date"}).get_json()["rows"]
+    assert rows[1] == ["02/01/2023"]
+
+    # Day-first output is read back as it was written, not month first
+    client.post("/apply-date-formats", json={"selections": {"Date": "yyyy-mm-dd"}})
+    rows = client.get("/rows", query_string={"columns": "Date"}).get_json()["rows"]
+    assert rows == original
@@ -0,0 +1,116 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from frame_cache import FrameCache, frame_nbytes
+
+
+def make_frame(rows=100):
+    return pd.DataFrame({"a": range(rows), "b": [float(i) for i in range(rows)]})
+
+
+def test_cache_does_not_write_until_flushed(tmp_path):
+    written = []
+    cache = FrameCache(lambda key, df: written.append(key), max_bytes=10**9)
+    path = str(tmp_path / "data.csv")
+    open(path, "w").close()
+
+    cache.put(path, make_frame())
+    assert written == []
+
+    cache.flush(path)
+    assert written == [path]
+
+    # A clean frame is not written again
+    cache.flush(path)
+    assert written == [path]
+
+
+def test_write_back_saves_changes_once_they_are_old_enough(tmp_path):
+    written = []
+    cache = FrameCache(lambda key, df: written.append(key), max_bytes=10**9)
+    path = str(tmp_path / "data.csv")
+    open(path, "w").close()
+
+    cache.put(path, make_frame())
+    cache.write_back(older_than=60)
+    assert written == []
+    cache.write_back()
+    assert written == [path]
+    cache.write_back()
+    assert written == [path]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    written = []
+    frame = make_frame()
+    cache = FrameCache(
+        lambda key, df: written.append(key), max_bytes=frame_nbytes(frame) * 2
+    )
+    paths = [str(tmp_path / f"{name}.csv") for name in "xyz"]
+    for path in paths:
+        open(path, "w").close()
+
+    cache.put(paths[0], make_frame())
+    cache.put(paths[1], make_frame())
+    cache.get(paths[0])  # Touch x so y becomes the oldest entry
+    cache.put(paths[2], make_frame())
+
+    assert paths[1] not in cache
+    assert paths[0] in cache and paths[2] in cache
+    assert written == [paths[1]]  # Dirty frames are written back on eviction
+
+
+def test_cache_skips_write_back_for_deleted_files(tmp_path):
+    written = []
+    cache = FrameCache(lambda key, df: written.append(key), max_bytes=10**9)
+    cache.put(str(tmp_path / "gone.csv"), make_frame())
+    cache.flush(str(tmp_path / "gone.csv"))
+    assert written == []
+
+
+def test_failed_write_backs_keep_the_changes(tmp_path):
+    def writer(key, df):
+        if "fail" in df.columns:
+            raise ValueError("cannot write")
+    frame = make_frame()
+    cache = FrameCache(writer, max_bytes=frame_nbytes(frame) * 2)
+    paths = [str(tmp_path / f"{name}.csv") for name in "xyz"]
+    for path in paths:
+        open(path, "w").close()
+
+    cache.put(paths[0], frame.assign(fail=0))
+    with pytest.raises(ValueError):
+        cache.flush(paths[0])
+    # Eviction passes over the frame rather than lose it
+    cache.put(paths[1], make_frame())
+    cache.put(paths[2], make_frame())
+    assert paths[0] in cache and paths[1] not in cache
+    with pytest.raises(ValueError):
+        cache.flush(paths[0])
+
+    # A frame too large to cache that cannot be written leaves the cached one
+    cache = FrameCache(writer, max_bytes=frame_nbytes(frame) * 2)
+    cache.put(paths[2], make_frame())
+    with pytest.raises(ValueError):
+        cache.put(paths[2], make_frame(1000).assign(fail=0))
+    assert len(cache.get(paths[2])) == 100
+
+
+def test_routes_keep_changes_in_memory_until_download(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    with open(filepath, "rb") as f:
+        original = f.read()
+
+    response = client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    assert response.status_code == 200
+    with open(filepath, "rb") as f:
+        assert f.read() == original  # Nothing written back yet
+
+    response = client.get("/download-file")
+    assert response.status_code == 200
+    assert b"ALICE" in response.data
+    assert not os.path.exists(filepath)
@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app
+from ingest import ingest_csv
+from working_store import read_working_file
+
+
+@pytest.mark.parametrize(
+    "filename, chunksize", [("csv.csv", 1000), ("sample_with_empties.csv", 3)]
+)
+def test_chunked_ingest_matches_full_read(tmp_path, filename, chunksize):
+    path = os.path.join("tests", filename)
+    expected = pd.read_csv(path)
+    target = str(tmp_path / "data.arrow")
+
+    with open(path, "rb") as stream:
+        result = ingest_csv(stream, target, chunksize=chunksize)
+
+    pd.testing.assert_frame_equal(read_working_file(target), expected)
+    assert result.row_count == len(expected)
+    assert result.duplicate_count == expected.duplicated().sum()
+    assert result.null_counts == expected.isna().sum().to_dict()
+
+
+def test_column_types_widen_across_chunks(tmp_path):
+    data = b"a,b\n1,x\n2,y\n3.5,4\n,5\n"
+    target = str(tmp_path / "data.arrow")
+
+    ingest_csv(io.BytesIO(data), target, chunksize=2)
+    df = read_working_file(target)
+
+    assert df["a"].tolist()[:3] == [1.0, 2.0, 3.5]
+    assert df["b"].tolist() == ["x", "y", "4", "5"]
+
+
+def test_each_value_is_read_and_hashed_once(tmp_path, monkeypatch):
+    df = pd.read_csv("tests/csv.csv")
+    reads, hashed = [], []
+    read_csv, hash_pandas_object = pd.read_csv, pd.util.hash_pandas_object
+    monkeypatch.setattr(pd, "read_csv", lambda *args, **kwargs: reads.append(1) or read_csv(*args, **kwargs))
+    monkeypatch.setattr(pd.util, "hash_pandas_object",
+                        lambda obj, **kwargs: hashed.append(len(obj)) or hash_pandas_object(obj, **kwargs))
+
+    with open("tests/csv.csv", "rb") as stream:
+        ingest_csv(stream, str(tmp_path / "data.arrow"), chunksize=1000)
+    assert len(reads) == 1
+    assert sum(hashed) == df.size
+
+
+def test_duplicates_are_counted_across_chunks(tmp_path):
+    data = b"a,b\n1,x\n2,y\n1,x\n2,y\n1,x\n"
+    with io.BytesIO(data) as stream:
+        result = ingest_csv(stream, str(tmp_path / "data.arrow"), chunksize=2)
+    assert result.duplicate_count == 3
+
+
+def test_upload_reports_statistics(client, upload):
+    app.config["INGEST_CHUNK_ROWS"] = 2
+    response = upload(client)
+    json_data = response.get_json()
+    assert json_data["rowCount"] == 7
+    assert json_data["emptyCounts"] == {"Name": 1, "Category": 2, "Value": 1, "Date": 1}
+    assert json_data["hasDuplicates"] is False
+
+
+def test_upload_header_only_csv(client, upload):
+    response = upload(client, io.BytesIO(b"a,b\n"), "empty.csv")
+    assert response.status_code == 400
+    assert "empty" in response.get_json()["error"]
+    assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
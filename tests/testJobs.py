@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import app as app_module
+import chunked
+from app import app
+from jobs import CANCELLED, DONE, FAILED, JobLimitError, JobQueue
+from locks import LockTimeout
+
+
+def wait(client, job_id):
+    for _ in range(200):
+        result = client.get(f"/jobs/{job_id}").get_json()
+        if result["status"] in (DONE, FAILED, CANCELLED):
+            return result
+        time.sleep(0.01)
+    pytest.fail("job did not finish")
+
+
+def wait_for(job):
+    job.future.exception(timeout=2)
+    return job
+
+
+def test_async_route_runs_in_the_background(client, upload):
+    upload(client)
+    response = client.post(
+        "/handle-empty-fields?async=true", json={"selections": {"Category": "delete-empty-rows"}}
+    )
+    assert response.status_code == 202
+    job_id = response.get_json()["jobId"]
+    assert response.headers["Location"] == f"/jobs/{job_id}"
+
+    result = wait(client, job_id)
+    assert result["status"] == DONE
+    assert result["progress"] == 1.0
+    assert result["result"]["rowCount"] == 5
+    assert client.get("/profile").get_json()["rowCount"] == 5
+
+
+def test_async_pipeline_reports_failures(client, upload):
+    upload(client)
+    response = client.post("/apply-pipeline?async=true", json={"operations": [
+        {"operation": "apply-formats", "payload": {"selections": {"Name": "uppercase"}}},
+        {"operation": "delete-columns", "payload": {"columns": ["Missing"]}},
+    ]})
+    result = wait(client, response.get_json()["jobId"])
+    assert result["status"] == FAILED
+    assert result["result"]["failedStep"] == 1
+    # Nothing is saved when a step fails
+    rows = client.get("/rows?limit=1&columns=Name").get_json()
+    assert rows["rows"] == [["Alice"]]
+
+
+def test_jobs_are_private_to_their_session(client, upload):
+    upload(client)
+    response = client.post("/apply-formats?async=true", json={"selections": {"Name": "uppercase"}})
+    job_id = response.get_json()["jobId"]
+    wait(client, job_id)
+
+    other = app.test_client()
+    assert other.get(f"/jobs/{job_id}").status_code == 404
+
+
+def test_session_job_limit(client, upload, monkeypatch):
+    upload(client)
+    release = threading.Event()
+    monkeypatch.setattr(app_module, "pipeline_job", lambda *args: lambda job: release.wait(2))
+    try:
+        first = client.post("/apply-formats?async=true", json={"selections": {"Name": "uppercase"}})
+        assert first.status_code == 202
+        second = client.post("/apply-formats?async=true", json={"selections": {"Name": "lowercase"}})
+        assert second.status_code == 429
+    finally:
+        release.set()
+    wait(client, first.get_json()["jobId"])
+
+
+@pytest.mark.parametrize("chunk_at_a_time", [False, True])
+def test_jobs_cancelled_during_their_last_step_save_nothing(client, upload, monkeypatch, chunk_at_a_time):
+    upload(client)
+    started = threading.Event()
+    release = threading.Event()
+    if chunk_at_a_time:
+        monkeypatch.setitem(app.config, "OUT_OF_CORE_MIN_BYTES", 0)
+        transformed_chunks = chunked.transformed_chunks
+
+        def blocked(*args):
+            yield from transformed_chunks(*args)
+            started.set()
+            release.wait(2)
+        monkeypatch.setattr(chunked, "transformed_chunks", blocked)
+    else:
+        transform = app_module.transform
+
+        def blocked(*args, **kwargs):
+            started.set()
+            release.wait(2)
+            return transform(*args, **kwargs)
+        monkeypatch.setattr(app_module, "transform", blocked)
+
+    response = client.post("/apply-formats?async=true", json={"selections": {"Name": "uppercase"}})
+    job_id = response.get_json()["jobId"]
+    started.wait(2)
+    client.delete(f"/jobs/{job_id}")
+    release.set()
+    assert wait(client, job_id)["status"] == CANCELLED
+    rows = client.get("/rows?limit=1&columns=Name").get_json()
+    assert rows["rows"] == [["Alice"]]
+
+
+def test_jobs_fail_when_their_session_stays_busy(client, upload, monkeypatch):
+    upload(client)
+    def hold(key, timeout):
+        raise LockTimeout(key)
+
+    # Requests take the lock with acquire, jobs with hold
+    monkeypatch.setattr(app_module.session_locks, "hold", hold)
+    response = client.post(
+        "/handle-empty-fields?async=true", json={"selections": {"Category": "delete-empty-rows"}}
+    )
+    result = wait(client, response.get_json()["jobId"])
+    assert result["status"] == FAILED
+    assert result["error"] == "Another request for this file is still running"
+
+
+def test_cancel_stops_a_running_job_at_its_next_report():
+    queue = JobQueue(max_workers=1, retention=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(job):
+        started.set()
+        release.wait(2)
+        job.report(0.5, "half way")
+        return "finished"
+
+    job = queue.submit("owner", work, limit=1)
+    started.wait(2)
+    queue.cancel(job)
+    release.set()
+    assert wait_for(job).status == CANCELLED
+    assert job.result is None
+
+
+def test_cancelled_queued_job_never_runs():
+    queue = JobQueue(max_workers=1, retention=60)
+    release = threading.Event()
+    ran = []
+    blocker = queue.submit("a", lambda job: release.wait(2), limit=1)
+    queued = queue.submit("b", lambda job: ran.append(job), limit=1)
+    queue.cancel(queued)
+    release.set()
+    wait_for(blocker)
+    assert queued.status == CANCELLED
+    assert ran == []
+
+
+def test_finished_jobs_are_forgotten_after_retention():
+    queue = JobQueue(max_workers=1, retention=0)
+    job = wait_for(queue.submit("owner", lambda job: 1, limit=1))
+    assert job.status == DONE
+    time.sleep(0.01)
+    queue.submit("owner", lambda job: 2, limit=1)
+    assert queue.get(job.id, "owner") is None
+
+
+def test_submit_refuses_owners_at_their_limit():
+    queue = JobQueue(max_workers=1, retention=60)
+    with pytest.raises(JobLimitError):
+        queue.submit("owner", lambda job: 1, limit=0)
@@ -0,0 +1,138 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import app as app_module
+from app import app
+from locks import FileSessionLocks
+
+
+def session_id(client):
+    with client.session_transaction() as sess:
+        return sess.sid
+
+
+def uppercase(client, version=None):
+    headers = {"If-Match": version} if version else {}
+    return client.post("/apply-formats", json={"selections": {"Name": "uppercase"}}, headers=headers)
+
+
+def test_changes_to_a_replaced_version_are_rejected(client, upload):
+    version = upload(client).headers["ETag"]
+    assert client.get("/profile").headers["ETag"] == version
+
+    response = uppercase(client, version)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != version
+
+    stale = uppercase(client, version)
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == response.headers["ETag"]
+    assert uppercase(client, response.headers["ETag"]).status_code == 200
+
+
+def test_concurrent_changes_of_a_session_take_turns(client, upload):
+    version = upload(client).headers["ETag"]
+    sid = session_id(client)
+    # A second tab of the same session, e.g. a double click
+    other = app.test_client()
+    other.set_cookie("session", client.get_cookie("session").value)
+
+    app_module.session_locks.acquire(sid, 1)
+    responses = []
+    threads = [threading.Thread(target=lambda c=c: responses.append(uppercase(c, version)))
+               for c in (client, other)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert responses == []
+    app_module.session_locks.release(sid)
+    for thread in threads:
+        thread.join()
+
+    assert sorted(response.status_code for response in responses) == [200, 412]
+
+
+def test_other_sessions_do_not_wait(client, upload):
+    upload(client)
+    other = app.test_client()
+    upload(other)
+    app.config["SESSION_LOCK_TIMEOUT_SECONDS"] = 0.05
+
+    sid = session_id(client)
+    app_module.session_locks.acquire(sid, 1)
+    try:
+        assert uppercase(client).status_code == 409
+        assert uppercase(other).status_code == 200
+        # Reads do not wait either
+        assert client.get("/profile").status_code == 200
+    finally:
+        app_module.session_locks.release(sid)
+    assert uppercase(client).status_code == 200
+
+
+def test_file_locks_exclude_each_other_and_are_swept(tmp_path):
+    first = FileSessionLocks(str(tmp_path))
+    second = FileSessionLocks(str(tmp_path))
+    assert first.acquire("abc", 1)
+    assert not second.acquire("abc", 0.01)
+    assert second.acquire("xyz", 0.01)
+
+    second.sweep(-1)
+    assert os.path.exists(first.path("abc"))
+    assert os.path.exists(second.path("xyz"))
+    first.release("abc")
+    second.release("xyz")
+    second.sweep(-1)
+    assert os.listdir(tmp_path) == []
+    with second.hold("abc", 0.01):
+        assert os.path.exists(first.path("abc"))
+
+
+def test_downloads_hold_the_lock_until_sent(client, upload):
+    version = upload(client).headers["ETag"]
+    sid = session_id(client)
+    other = app.test_client()
+    other.set_cookie("session", client.get_cookie("session").value)
+    app.config["SESSION_LOCK_TIMEOUT_SECONDS"] = 0.05
+
+    download = client.get("/download-file")
+    assert not app_module.session_locks.acquire(sid, 0.01)
+    assert uppercase(other, version).status_code == 409
+    download.get_data()
+    download.close()
+    assert app_module.session_locks.acquire(sid, 0.01)
+    app_module.session_locks.release(sid)
+
+    # Nor does a download whose body is never read keep it
+    upload(client)
+    client.get("/download-file").close()
+    assert app_module.session_locks.acquire(sid, 0.01)
+    app_module.session_locks.release(sid)
+
+
+def test_rows_read_steps_and_frame_together(client, upload, working_file, monkeypatch):
+    app.config["LAZY_PIPELINE"] = True
+    upload(client)
+    filepath = working_file(client)
+    # Applied twice, the step would turn Alice into Charlie
+    client.post("/apply-standardization", json={"standardizations": {"Name": {"Alice": "Bob", "Bob": "Charlie"}}})
+    assert filepath in app_module.lazy_plans
+
+    # Another request applies and saves the steps after /rows has read them,
+    # as it loads the frame (its first load only looks up the column names)
+    load_base_df = app_module.load_base_df
+    loads = []
+
+    def load_after_change(path):
+        loads.append(path)
+        if len(loads) == 2:
+            app_module.load_working_df(path)
+        return load_base_df(path)
+
+    monkeypatch.setattr(app_module, "load_base_df", load_after_change)
+    rows = client.get("/rows?columns=Name&limit=2").get_json()["rows"]
+    assert rows == [["Bob"], ["Charlie"]]
+    assert filepath not in app_module.lazy_plans
@@ -0,0 +1,76 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app, frame_cache, metrics
+from metrics import NO_PHASE, Metrics
+
+
+@pytest.fixture
+def client(client):
+    app.config["METRICS_ENABLED"] = True
+    metrics.histograms.clear()
+    metrics.counters.clear()
+    return client
+
+
+def server_timing(response):
+    """Phase durations of a Server-Timing header"""
+    phases = {}
+    for part in response.headers["Server-Timing"].split(", "):
+        name, duration = part.split(";dur=")
+        phases[name] = float(duration)
+    return phases
+
+
+def test_phases_are_reported_in_server_timing(client, upload, working_file):
+    assert set(server_timing(upload(client))) == {"ingest", "total"}
+
+    frame_cache.discard(working_file(client))
+    response = client.post("/apply-date-formats", json={"selections": {"Date": "dd/mm/yyyy"}})
+    phases = server_timing(response)
+    assert {"load", "transform", "save", "total"} <= set(phases)
+    assert phases["total"] >= phases["transform"]
+
+
+def test_metrics_aggregate_routes_and_phases(client, upload):
+    upload(client)
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    download = client.get("/download-file")
+    download.get_data()
+    download.close()
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'datasweep_phase_seconds_count{route="/apply-formats",phase="transform"} 1' in text
+    assert 'datasweep_phase_seconds_bucket{route="/upload",phase="ingest",le="+Inf"} 1' in text
+    assert 'datasweep_rows_processed_total{route="/apply-formats"} 7' in text
+    # The download is counted once its body has been streamed
+    assert 'datasweep_phase_seconds_count{route="/download-file",phase="serialize"}' in text
+    assert 'datasweep_bytes_written_total{route="/download-file"}' in text
+
+
+def test_background_jobs_are_measured(client, upload):
+    upload(client)
+    response = client.post("/apply-formats?async=true", json={"selections": {"Name": "uppercase"}})
+    job_id = response.get_json()["jobId"]
+    for _ in range(200):
+        if client.get(f"/jobs/{job_id}").get_json()["status"] == "done":
+            break
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'route="/apply-formats (job)",phase="transform"' in text
+
+
+def test_nothing_is_measured_when_disabled(client, upload):
+    app.config["METRICS_ENABLED"] = False
+    response = upload(client)
+    assert "Server-Timing" not in response.headers
+    assert client.get("/metrics").status_code == 404
+
+
+def test_phase_outside_a_request_does_nothing():
+    registry = Metrics()
+    assert registry.phase("transform") is NO_PHASE
+    registry.count("rows_processed", 10)
+    assert registry.finish() is None
+    assert "datasweep_rows_processed_total{" not in registry.render()
@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import parallel
+from operations import apply_operation
+from pipeline import CaseStep, DropEmptyStep, MapValuesStep, NormalizeTextStep, Plan
+
+
+@pytest.fixture
+def serial():
+    previous = parallel.column_executor()
+    yield lambda: parallel.configure(max_workers=1)
+    parallel.configure(previous.max_workers, previous.min_rows)
+
+
+def threaded():
+    return parallel.configure(max_workers=4, min_rows=0)
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    rows = 2000
+    names = np.array(["alice  smith", "bob_jones", None, "carol"], dtype=object)
+    dates = np.array(["2023-01-05", "01/06/2023", "not a date", None], dtype=object)
+    prices = np.array(["$1,200.50", "3.14159", None, "-7"], dtype=object)
+    return pd.DataFrame({
+        "First": names[rng.integers(0, 4, rows)],
+        "Last": names[rng.integers(0, 4, rows)],
+        "Start": dates[rng.integers(0, 4, rows)],
+        "End": dates[rng.integers(0, 4, rows)],
+        "Price": prices[rng.integers(0, 4, rows)],
+        "Cost": prices[rng.integers(0, 4, rows)],
+    })
+
+
+def run_both(serial, func):
+    serial()
+    expected = func()
+    threaded()
+    return expected, func()
+
+
+def test_map_runs_inline_below_min_rows(serial):
+    executor = parallel.configure(max_workers=4, min_rows=100)
+    assert not executor.parallel(99, 2)
+    assert not executor.parallel(100, 1)
+    assert executor.parallel(100, 2)
+    assert executor.map(str.upper, ["a", "b"], rows=100) == ["A", "B"]
+
+
+def test_threads_share_one_pool(serial):
+    executor = parallel.configure(max_workers=4, min_rows=0)
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def first_map():
+        barrier.wait()
+        executor.map(str.upper, ["a", "b"], rows=1)
+        pools.append(executor._pool)
+
+    threads = [threading.Thread(target=first_map) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, pools))) == 1
+
+
+def test_plan_matches_serial_execution(serial, frame):
+    steps = [
+        NormalizeTextStep("First"),
+        NormalizeTextStep("Last"),
+        CaseStep("First", "title-case"),
+        DropEmptyStep("Last"),
+        CaseStep("Last", "uppercase"),
+        MapValuesStep("First", {"Alice Smith": "A. Smith"}),
+    ]
+    expected, result = run_both(serial, lambda: Plan(steps).execute(frame.copy()))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("name,payload", [
+    ("apply-date-formats", {"selections": {"Start": "dd/mm/yyyy", "End": "yyyy-mm-dd"}}),
+    ("apply-numerical-rounding", {"selections": {"Price": "tenths", "Cost": "whole"}}),
+    ("apply-formats", {"selections": {"First": "uppercase", "Last": "lowercase"}}),
+])
+def test_operations_match_serial_execution(serial, frame, name, payload):
+    expected, result = run_both(serial, lambda: apply_operation(frame, name, payload))
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.attrs == expected.attrs
@@ -0,0 +1,200 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app, load_working_df
+from pipeline import (
+    Plan,
+    CaseStep,
+    FillStep,
+    DropEmptyStep,
+    MapValuesStep,
+    NormalizeTextStep,
+    optimize_steps,
+)
+
+
+def make_frame():
+    return pd.DataFrame(
+        {
+            "Name": ["alice_smith", None, "  bob  ", "carol"],
+            "Category": ["a", "b", None, "a"],
+        }
+    )
+
+
+def test_consecutive_case_steps_are_fused():
+    steps = optimize_steps(
+        [
+            CaseStep("Name", "lowercase"),
+            FillStep("Category", "x"),
+            CaseStep("Name", "sentence-case"),
+        ]
+    )
+    assert len(steps) == 2
+    assert [s.case for s in steps if isinstance(s, CaseStep)] == ["sentence-case"]
+
+
+@pytest.mark.parametrize("cases", [("uppercase", "lowercase"), ("uppercase", ""), ("title-case", "title-case")])
+def test_case_steps_are_kept_when_fusing_changes_the_text(cases):
+    steps = [CaseStep("Name", case) for case in cases]
+    assert len(optimize_steps(steps)) == 2
+    df = pd.DataFrame({"Name": ["Straße", "x,y"]})
+    expected = steps[1].apply(steps[0].apply(df.copy()))
+    pd.testing.assert_frame_equal(Plan(steps).execute(df.copy()), expected)
+
+
+def test_drop_steps_move_ahead_of_other_columns():
+    steps = optimize_steps(
+        [
+            CaseStep("Name", "uppercase"),
+            FillStep("Category", "x"),
+            DropEmptyStep("Name"),
+        ]
+    )
+    # Dropping can move past the fill on another column but not past the
+    # case step on its own column
+    assert [type(s) for s in steps] == [CaseStep, DropEmptyStep, FillStep]
+
+
+def test_map_steps_are_composed():
+    steps = optimize_steps(
+        [
+            MapValuesStep("Category", {"a": "b"}),
+            MapValuesStep("Category", {"b": "c", "d": "e"}),
+        ]
+    )
+    assert len(steps) == 1
+    assert steps[0].mapping == {"a": "c", "b": "c", "d": "e"}
+
+
+def test_optimized_plan_matches_step_by_step_execution():
+    steps = [
+        NormalizeTextStep("Name"),
+        CaseStep("Name", "uppercase", blank_as_missing=False),
+        MapValuesStep("Category", {"a": "A"}),
+        CaseStep("Category", "uppercase"),
+        CaseStep("Category", "title-case"),
+        DropEmptyStep("Category"),
+        MapValuesStep("Category", {"A": "Alpha"}),
+    ]
+    expected = make_frame()
+    for step in steps:
+        expected = step.apply(expected)
+
+    result = Plan(steps).execute(make_frame())
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_plan_window_skips_dropped_rows():
+    plan = Plan([DropEmptyStep("Category"), CaseStep("Name", "uppercase")])
+    df = make_frame()
+    assert plan.row_count(df) == 3
+    window = plan.window(df, 1, 2, columns=["Name"])
+    # Row 2 has no category, so the second window row is row 3
+    assert window.index.tolist() == [1, 3]
+    assert window.loc[3, "Name"] == "CAROL"
+
+
+def clean(client):
+    client.post("/apply-name-formats", json={"nameFormats": {"Name": "uppercase"}})
+    client.post("/apply-name-formats", json={"nameFormats": {"Name": "title-case"}})
+    client.post(
+        "/handle-empty-date-fields", json={"selections": {"Date": "delete-empty-rows"}}
+    )
+    client.post(
+        "/apply-standardization", json={"standardizations": {"Category": {"A": "B"}}}
+    )
+    return client.post(
+        "/handle-empty-fields", json={"selections": {"Category": "fill-unknown"}}
+    )
+
+
+def test_lazy_mode_matches_eager_mode(client, upload):
+    upload(client)
+    eager_counts = clean(client).get_json()
+    eager = client.get("/download-file").data
+
+    app.config["LAZY_PIPELINE"] = True
+    upload(client)
+    lazy_counts = clean(client).get_json()
+    lazy = client.get("/download-file").data
+
+    assert lazy_counts["rowCount"] == eager_counts["rowCount"]
+    assert lazy == eager
+
+
+def test_lazy_mode_previews_without_applying(client, upload):
+    app.config["LAZY_PIPELINE"] = True
+    upload(client)
+    response = client.post(
+        "/handle-empty-date-fields", json={"selections": {"Date": "delete-empty-rows"}}
+    )
+    assert response.get_json()["rowCount"] == 6
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+
+    rows = client.get("/rows", query_string={"columns": "Name"}).get_json()
+    assert rows["rowCount"] == 6
+    assert rows["rows"][0] == ["ALICE"]
+    assert ["DAVID"] not in rows["rows"]  # David has no date
+
+
+def test_lazy_mode_rejects_unknown_columns(client, upload):
+    app.config["LAZY_PIPELINE"] = True
+    upload(client)
+    response = client.post(
+        "/apply-formats", json={"selections": {"Missing": "uppercase"}}
+    )
+    assert response.status_code == 400
+
+
+CATEGORY_STEPS = [
+    [CaseStep("Category", "uppercase")],
+    [CaseStep("Category", "title-case", blank_as_missing=False)],
+    [MapValuesStep("Category", {"a": "b", "b": "B"})],
+    [MapValuesStep("Category", {"a": "b"}), CaseStep("Category", "uppercase")],
+    [FillStep("Category", "missing"), CaseStep("Category", "sentence-case")],
+]
+
+
+@pytest.mark.parametrize("steps", CATEGORY_STEPS)
+def test_category_columns_give_the_same_values(steps):
+    df = make_frame()
+    expected = Plan(steps).execute(df.copy())["Category"]
+
+    categorical = df.copy()
+    categorical["Category"] = categorical["Category"].astype("category")
+    result = Plan(steps).execute(categorical)["Category"]
+
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.astype(object).where(result.notna(), None).tolist() == (
+        expected.astype(object).where(expected.notna(), None).tolist()
+    )
+
+
+def test_merged_categories_keep_only_distinct_labels():
+    df = pd.DataFrame({"Category": pd.Series(["a", "A", "b", None], dtype="category")})
+    result = CaseStep("Category", "uppercase").apply(df)["Category"]
+    assert result.cat.categories.tolist() == ["A", "B"]
+    assert result.cat.codes.tolist() == [0, 0, 1, -1]
+
+
+def test_classified_columns_are_stored_as_categories(client, upload):
+    upload(client, "tests/csv.csv", "games.csv")
+    response = client.post(
+        "/submit-classifications",
+        json={"classifications": {"Platform": "Categorical", "Name": "Non-categorical"}},
+    )
+    assert response.status_code == 200
+
+    with client.session_transaction() as sess:
+        filepath = os.path.join(app.config["UPLOAD_FOLDER"], sess["current_file"])
+    df = load_working_df(filepath)
+    assert isinstance(df["Platform"].dtype, pd.CategoricalDtype)
+    assert df["Name"].dtype != "category"
+
+    client.post("/apply-categorical-formats", json={"selections": {"Platform": "lowercase"}})
+    values = client.post("/get-unique-values", json={"columns": ["Platform"]}).get_json()["uniqueValues"]
+    assert values["Platform"] == sorted(pd.read_csv("tests/csv.csv")["Platform"].str.lower().unique())
@@ -0,0 +1,95 @@
+import io
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app
+import row_index
+from row_index import RowHashIndex, SpilledRowHashIndex, duplicated_rows, repeated_hashes, row_hashes
+
+
+@pytest.fixture
+def games():
+    return pd.read_csv("tests/csv.csv")
+
+
+def test_duplicate_count_matches_duplicated(games):
+    df = games[["Platform", "Year", "Genre"]]
+    assert RowHashIndex.of(df).duplicate_count(lambda positions: df.iloc[positions]) == df.duplicated().sum()
+
+
+def test_duplicate_count_ignores_hash_collisions():
+    df = pd.DataFrame({"a": [1, 2, 1]})
+    # Rows 0 and 1 collide, rows 0 and 2 are equal
+    index = RowHashIndex(np.array([7, 7, 7], dtype=np.uint64))
+    assert index.duplicate_count(lambda positions: df.iloc[positions]) == 1
+
+
+def test_spilled_index_counts_duplicates_like_a_loaded_one(games, monkeypatch):
+    monkeypatch.setattr(row_index, "SPILL_READ_HASHES", 100)
+    df = games[["Platform", "Year", "Genre"]]
+    spilled = SpilledRowHashIndex()
+    for start in range(0, len(df), 250):
+        spilled.add(row_hashes(df[start:start + 250]))
+    assert len(spilled) == len(df)
+    assert np.array_equal(spilled.load().hashes, row_hashes(df))
+    assert spilled.duplicate_count(lambda positions: df.iloc[positions]) == df.duplicated().sum()
+
+
+def test_repeated_hashes_across_partitions():
+    hashes = pd.util.hash_array(np.arange(1000))
+    found = repeated_hashes([hashes[:600], hashes[500:], hashes[:10]])
+    assert set(found) == set(hashes[:10]) | set(hashes[500:600])
+
+
+def test_duplicated_rows_is_exact(games):
+    df = games[["Platform", "Genre"]]
+    assert (duplicated_rows(df, row_hashes(df)) == df.duplicated().to_numpy()).all()
+
+
+def test_update_matches_rehashing(games):
+    original = games
+    index = RowHashIndex.of(original)
+
+    df = original.dropna(subset=["Year"]).drop(columns=["Rank", "Name"])
+    df["Genre"] = df["Genre"].str.upper()
+    index.update(original, df, ["Genre"])
+
+    assert np.array_equal(index.hashes, row_hashes(df))
+    assert index.duplicate_count(lambda positions: df.iloc[positions]) == df.duplicated().sum()
+
+
+def test_without_leaves_columns_out(games):
+    index = RowHashIndex.of(games)
+    assert np.array_equal(index.without(games, ["Name", "Rank"]), row_hashes(games.drop(columns=["Name", "Rank"])))
+
+
+def test_delete_columns_removes_duplicates_of_what_is_left(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    response = client.post(
+        "/delete-columns", json={"columns": ["Name", "Value", "Date"], "deleteDuplicates": True}
+    )
+    assert response.status_code == 200
+    expected = pd.read_csv("tests/sample_with_empties.csv")[["Category"]].drop_duplicates()
+    assert response.get_json()["rowCount"] == len(expected)
+    assert client.get("/profile").get_json()["duplicateCount"] == 0
+
+
+def test_duplicate_count_follows_changes(client, upload):
+    upload(client)
+    assert client.get("/profile").get_json()["duplicateCount"] == 0
+    client.post("/delete-columns", json={"columns": ["Name", "Value", "Date"]})
+    # Category is A, NaN, B, C, A, NaN, B
+    assert client.get("/profile").get_json()["duplicateCount"] == 3
+
+
+def test_duplicate_count_applies_pending_lazy_steps(client, upload):
+    app.config["LAZY_PIPELINE"] = True
+    upload(client, io.BytesIO(b"Name,Value\nann,1\nANN,1\n"), "lazy.csv")
+    assert client.get("/profile").get_json()["duplicateCount"] == 0
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    assert client.get("/profile").get_json()["duplicateCount"] == 1
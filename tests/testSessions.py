@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from flask import Response
+from app import app, session_store, sweep_sessions
+
+
+@pytest.fixture
+def client(client):
+    yield client
+    session_store.ttl = app.config["SESSION_TTL_SECONDS"]
+
+
+def test_cookie_holds_only_a_session_id(client, upload):
+    response = upload(client)
+    cookie = response.headers["Set-Cookie"]
+    assert "current_file" not in cookie
+    assert len(cookie) < 200
+    assert client.get("/profile").status_code == 200
+
+
+def test_tampered_cookie_starts_a_new_session(client, upload):
+    upload(client)
+    client.set_cookie("session", "not-a-signed-id")
+    assert client.get("/profile").get_json()["error"] == "No file uploaded"
+
+
+def test_unchanged_sessions_are_not_saved_over_newer_values(client, upload):
+    upload(client)
+    cookie = client.get_cookie("session").value
+    with app.test_request_context("/rows", headers={"Cookie": f"session={cookie}"}) as context:
+        # A read opens the session, then an upload of the same session saves a new file
+        sess = app.session_interface.open_session(app, context.request)
+        session_store.save(sess.sid, {**sess, "current_file": "newer.arrow"})
+        response = Response()
+        app.session_interface.save_session(app, sess, response)
+    assert session_store.load(sess.sid)["current_file"] == "newer.arrow"
+    assert "Set-Cookie" not in response.headers
+
+
+def test_expired_sessions_are_swept_with_their_files(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    session_store.ttl = 0
+    time.sleep(0.01)
+    assert client.get("/profile").get_json()["error"] == "No file uploaded"
+    sweep_sessions()
+    assert not os.path.exists(filepath)
+
+
+def test_sweep_removes_only_old_unowned_files(client, upload, working_file):
+    upload(client)
+    owned = working_file(client)
+    abandoned = os.path.join(app.config["UPLOAD_FOLDER"], "old.arrow")
+    fresh = os.path.join(app.config["UPLOAD_FOLDER"], "fresh.arrow.tmp")
+    for path in (abandoned, fresh):
+        open(path, "wb").close()
+    long_ago = time.time() - 2 * app.config["SESSION_TTL_SECONDS"]
+    os.utime(abandoned, (long_ago, long_ago))
+    os.utime(owned, (long_ago, long_ago))
+
+    sweep_sessions()
+    assert not os.path.exists(abandoned)
+    assert os.path.exists(fresh)
+    assert os.path.exists(owned)
+
+
+def test_new_upload_replaces_the_sessions_file(client, upload, working_file):
+    upload(client, name="first.csv")
+    first = working_file(client)
+    upload(client, name="second.csv")
+    assert not os.path.exists(first)
+    assert os.path.exists(working_file(client))
+
+
+def test_disk_quota_evicts_idle_sessions(client, upload, working_file):
+    other = app.test_client()
+    upload(other, name="other.csv")
+    other_file = working_file(other)
+    app.config["UPLOAD_DISK_QUOTA_BYTES"] = os.path.getsize(other_file) + 100
+
+    # The other session has not been idle long enough to be evicted
+    assert upload(client).status_code == 507
+
+    app.config["SESSION_EVICT_IDLE_SECONDS"] = 0
+    assert upload(client).status_code == 200
+    assert not os.path.exists(other_file)
+    assert other.get("/profile").get_json()["error"] == "No file uploaded"
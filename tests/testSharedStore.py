@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import app as app_module
+from app import app, column_profiles, frame_cache, job_queue, use_shared_store
+from jobs import CANCELLED, DONE, JobLimitError, JobQueue, SharedJobStore
+from sessions import SharedSessionStore
+from working_store import file_version, write_working_file
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def client(client, tmp_path):
+    local = app_module.session_store, app.session_interface, app_module.session_locks, app_module.job_queue.store
+    use_shared_store(str(tmp_path / "sessions.sqlite"))
+    yield client
+    app_module.session_store, app.session_interface, app_module.session_locks, app_module.job_queue.store = local
+
+
+def names(client):
+    return [row[0] for row in client.get("/rows?columns=Name").get_json()["rows"]]
+
+
+def test_changes_are_published_at_once(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    before = file_version(filepath)
+    client.post("/apply-formats", json={"selections": {"Name": "uppercase"}})
+    assert file_version(filepath) != before
+    assert pd.read_feather(filepath)["Name"].iloc[0] == "ALICE"
+
+
+def test_versions_published_elsewhere_replace_what_is_held(client, upload, working_file):
+    upload(client)
+    filepath = working_file(client)
+    client.get("/profile")
+    assert filepath in frame_cache or filepath in column_profiles
+
+    # Another worker publishes a new version of the file
+    df = pd.read_feather(filepath)
+    df["Name"] = df["Name"].str.lower()
+    df = df.iloc[:3]
+    write_working_file(filepath, df)
+
+    assert names(client) == ["alice", "bob", "charlie"]
+    assert client.get("/profile").get_json()["rowCount"] == 3
+
+
+def test_sessions_are_shared_between_stores(tmp_path):
+    first = SharedSessionStore(str(tmp_path / "sessions.sqlite"), ttl=60)
+    second = SharedSessionStore(str(tmp_path / "sessions.sqlite"), ttl=60)
+    first.save("abc", {"current_file": "x.arrow"})
+    assert second.load("abc") == {"current_file": "x.arrow"}
+    assert second.evict_idle(0) == [{"current_file": "x.arrow"}]
+    assert first.load("abc") is None
+
+
+def test_another_worker_process_serves_the_session(client, upload, tmp_path):
+    upload(client)
+    cookie = client.get_cookie("session").value
+
+    # A second process attaches to the same session and working file
+    worker = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        from app import app, use_shared_store
+        app.config["UPLOAD_FOLDER"] = {os.path.abspath(app.config["UPLOAD_FOLDER"])!r}
+        use_shared_store({str(tmp_path / "sessions.sqlite")!r})
+        client = app.test_client()
+        client.set_cookie("session", {cookie!r})
+        response = client.post("/apply-formats", json={{"selections": {{"Name": "uppercase"}}}})
+        assert response.status_code == 200, response.get_data()
+    """)
+    subprocess.run([sys.executable, "-c", worker], check=True, cwd=str(tmp_path), capture_output=True)
+
+    assert names(client)[:2] == ["ALICE", "BOB"]
+
+
+def test_several_workers_start_on_the_shared_store(tmp_path, monkeypatch):
+    for name in ("sweeper", "session_store", "session_locks"):
+        monkeypatch.setattr(app_module, name, getattr(app_module, name))
+    monkeypatch.setattr(app, "session_interface", app.session_interface)
+    monkeypatch.setattr(job_queue, "store", job_queue.store)
+    for name in ("SHARED_WORKING_STORE", "SHARED_SESSION_INDEX", "SESSION_TTL_SECONDS"):
+        monkeypatch.setitem(app.config, name, app.config[name])
+    app.config["SHARED_SESSION_INDEX"] = str(tmp_path / "sessions.sqlite")
+    monkeypatch.setenv("DATA_SWEEP_SESSION_TTL_SECONDS", "120")
+    assert app_module.sweeper is None  # Nothing runs in the background at import
+
+    app_module.start_app(workers=2)
+    app_module.sweeper.stop()
+    assert app.config["SHARED_WORKING_STORE"]
+    assert isinstance(app_module.session_store, SharedSessionStore)
+    assert app_module.session_store.ttl == 120
+    assert isinstance(job_queue.store, SharedJobStore)
+
+
+def test_jobs_can_be_polled_through_another_worker(client, upload):
+    upload(client)
+    response = client.post("/handle-empty-fields?async=true", json={"selections": {"Category": "delete-empty-rows"}})
+    job_id = response.get_json()["jobId"]
+    job_queue.jobs[job_id].future.exception(timeout=2)
+
+    # The worker that ran the job no longer holds it, as if another worker took the poll
+    del job_queue.jobs[job_id]
+    result = client.get(f"/jobs/{job_id}").get_json()
+    assert result["status"] == DONE
+    assert result["result"]["rowCount"] == 5
+
+
+def test_jobs_are_cancelled_through_the_shared_store(tmp_path):
+    store = SharedJobStore(str(tmp_path / "sessions.sqlite"))
+    running, other = JobQueue(1, 60, store), JobQueue(1, 60, SharedJobStore(store.path))
+    started, release = threading.Event(), threading.Event()
+
+    def work(job):
+        started.set()
+        release.wait(2)
+        job.report(0.5)
+        return "finished"
+
+    job = running.submit("owner", work, limit=2)
+    started.wait(2)
+    assert other.get(job.id, "someone else") is None
+    with pytest.raises(JobLimitError):
+        other.submit("owner", work, limit=1)
+    other.cancel(other.get(job.id, "owner"))
+    release.set()
+    job.future.exception(timeout=2)
+    assert job.status == CANCELLED
+    assert other.get(job.id, "owner").status == CANCELLED
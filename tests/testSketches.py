@@ -0,0 +1,151 @@
+import os
+import pickle
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import column_profiles
+from chunked import chunked_operation
+from column_profile import ProfileBuilder
+from operations import handle_empty_numerical_fields
+from sketches import Moments, QuantileSketch, FrequentValues, HyperLogLog, NumericSketch
+
+
+def chunks(values, size=10000):
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def test_moments_merge_like_one_pass():
+    values = np.random.default_rng(0).normal(50, 10, 100000)
+    left, right = Moments(), Moments()
+    for chunk in chunks(values[:30000]):
+        left.add(chunk)
+    for chunk in chunks(values[30000:]):
+        right.add(chunk)
+    left.merge(right)
+    assert left.count == len(values)
+    assert left.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert left.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+
+
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(1).lognormal(size=200000),
+    np.arange(200000.0),
+    np.random.default_rng(2).integers(0, 50, 200000).astype(float),
+])
+def test_quantiles_are_within_the_documented_rank_error(values):
+    sketch = QuantileSketch()
+    for chunk in chunks(values):
+        sketch.add(chunk)
+    assert not sketch.exact
+    # Held values stay a small multiple of k however long the stream
+    assert sum(len(level) for level in sketch.levels) < 4 * sketch.k
+    for q in (0.1, 0.5, 0.9):
+        value = sketch.quantile(q)
+        below, at_most = (values < value).mean(), (values <= value).mean()
+        assert below - 0.017 <= q <= at_most + 0.017
+
+
+def test_small_columns_are_summarized_exactly():
+    values = pd.Series([3.0, 1.0, np.nan, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0])
+    sketch = NumericSketch.of(values)
+    assert sketch.count == 8
+    assert all(sketch.exact(handling) for handling in ("fill-mean", "fill-median", "fill-mode"))
+    assert sketch.fill_value("fill-mean") == pytest.approx(values.mean())
+    assert sketch.fill_value("fill-median") == values.median()
+    assert sketch.fill_value("fill-mode") == values.mode()[0]
+    empty = NumericSketch.of([np.nan])
+    assert np.isnan(empty.fill_value("fill-median")) and np.isnan(empty.fill_value("fill-mode"))
+
+
+def test_frequent_values_bound_their_undercount():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([np.full(5000, 7.0), rng.integers(100, 100000, 95000).astype(float)])
+    rng.shuffle(values)
+    halves = [FrequentValues(counters=100), FrequentValues(counters=100)]
+    for index, chunk in enumerate(chunks(values)):
+        halves[index % 2].add(chunk)
+    halves[0].merge(halves[1])
+    frequent = halves[0]
+    assert not frequent.exact
+    assert frequent.count == len(values)
+    assert frequent.error <= len(values) / 101
+    assert 5000 - frequent.error <= frequent.counts[7.0] <= 5000
+    assert frequent.mode() == 7.0
+
+
+@pytest.mark.parametrize("count", [0, 100, 5000, 300000])
+def test_hyperloglog_is_within_the_documented_error(count):
+    hashes = pd.util.hash_array(np.arange(count))
+    halves = [HyperLogLog(), HyperLogLog()]
+    for index, chunk in enumerate(chunks(np.concatenate([hashes, hashes[:count // 2]]))):
+        halves[index % 2].add(chunk)
+    halves[0].merge(halves[1])
+    # Four standard errors of 0.8%
+    assert abs(len(halves[0]) - count) <= 0.033 * count
+
+
+def test_sketches_merge_across_workers():
+    values = np.random.default_rng(4).normal(size=50000)
+    parts = [NumericSketch.of(chunk) for chunk in chunks(values)]
+    # As they would come back from worker processes
+    parts = [pickle.loads(pickle.dumps(part)) for part in parts]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert merged.fill_value("fill-mean") == pytest.approx(values.mean())
+    median = merged.fill_value("fill-median")
+    assert abs((values < median).mean() - 0.5) <= 0.017
+
+
+def test_approximate_fills_use_sketches():
+    values = np.random.default_rng(5).normal(100, 5, 20000)
+    values[::10] = np.nan
+    df = pd.DataFrame({"Value": values})
+    exact = handle_empty_numerical_fields(df.copy(), {"selections": {"Value": "fill-median"}})
+    approximate = handle_empty_numerical_fields(
+        df.copy(), {"selections": {"Value": "fill-median"}, "approximate": True})
+    assert exact["Value"].isna().sum() == approximate["Value"].isna().sum() == 0
+    fill = approximate["Value"].iloc[0]
+    assert fill != exact["Value"].iloc[0]
+    assert abs((df["Value"].dropna() < fill).mean() - 0.5) <= 0.017
+
+
+def test_profile_sketches_spare_the_statistics_pass():
+    df = pd.DataFrame({"Value": [1.0, np.nan, 3.0, 3.0], "Name": ["a", "b", None, "d"],
+                       "Price": [np.nan, 2.5, 1.5, 4.0]})
+    builder = ProfileBuilder()
+    for start in range(0, len(df), 2):
+        builder.add(df.iloc[start:start + 2])
+    profile = builder.build()
+    assert profile.columns["Name"].sketch is None
+    assert profile.columns["Value"].sketch.count == 3
+
+    operation = chunked_operation("handle-empty-numerical-fields", {"selections": {
+        "Value": "fill-mode", "Price": "fill-median"}})
+    assert operation.needs_scan
+    operation.use_profile(profile)
+    assert not operation.needs_scan
+    assert operation.fill_values == {"Value": 3.0, "Price": 2.5}
+
+    # A column filled after rows were deleted for another needs its own pass
+    operation = chunked_operation("handle-empty-numerical-fields", {"selections": {
+        "Value": "delete-empty-rows", "Price": "fill-mean"}})
+    operation.use_profile(profile)
+    assert operation.needs_scan
+    profile.invalidate(["Price"])
+    operation = chunked_operation("handle-empty-numerical-fields", {"selections": {"Price": "fill-mean"}})
+    operation.use_profile(profile)
+    assert operation.needs_scan
+
+
+def test_uploaded_columns_are_sketched(client, upload, working_file):
+    upload(client)
+    profile = column_profiles[working_file(client)]
+    sketched = [column for column, stats in profile.columns.items() if stats.sketch is not None]
+    assert sketched
+    for column in sketched:
+        assert profile.columns[column].sketch.count == profile.row_count - profile.columns[column].null_count
@@ -0,0 +1,87 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app import app, frame_cache
+from working_store import read_working_file, write_working_file
+
+
+def test_round_trip_keeps_dtypes_and_attrs(tmp_path):
+    df = pd.DataFrame(
+        {
+            "when": pd.to_datetime(["2023-01-01", None]),
+            "value": [1.25, np.nan],
+            "count": [1, 2],
+        }
+    )
+    df.attrs["rounding_precision"] = {"value": "tenths"}
+    path = str(tmp_path / "data.arrow")
+
+    write_working_file(path, df)
+    result = read_working_file(path)
+
+    pd.testing.assert_frame_equal(result, df)
+    assert result.attrs == {"rounding_precision": {"value": "tenths"}}
+
+
+def test_mixed_object_columns_are_stored_as_text(tmp_path):
+    df = pd.DataFrame({"value": pd.Series([1.5, "None", None], dtype=object)})
+    path = str(tmp_path / "data.arrow")
+
+    write_working_file(path, df)
+    result = read_working_file(path)
+
+    assert result["value"].tolist()[:2] == ["1.5", "None"]
+    assert pd.isna(result["value"].tolist()[2])
+
+
+def test_mixed_categories_are_stored_as_text(tmp_path):
+    df = pd.DataFrame({"value": pd.Categorical([5, "y", None, "5"])})
+    path = str(tmp_path / "data.arrow")
+
+    write_working_file(path, df)
+    result = read_working_file(path)
+
+    assert isinstance(result["value"].dtype, pd.CategoricalDtype)
+    assert result["value"].tolist()[:2] == ["5", "y"]
+    assert result["value"].tolist()[3] == "5"
+    assert pd.isna(result["value"].tolist()[2])
+
+
+def test_categories_remapped_to_numbers_are_saved(client, upload):
+    upload(client)
+    client.post("/submit-classifications", json={"classifications": {"Category": "Categorical"}})
+    response = client.post("/apply-standardization", json={"standardizations": {"Category": {"A": 5}}})
+    assert response.status_code == 200
+    with client.session_transaction() as sess:
+        filepath = os.path.join(app.config["UPLOAD_FOLDER"], sess["current_file"])
+
+    frame_cache.flush(filepath)
+    frame_cache.discard(filepath)
+    assert "5" in read_working_file(filepath)["Category"].tolist()
+
+
+def test_upload_keeps_only_the_working_file(client, upload):
+    upload(client)
+    files = os.listdir(app.config["UPLOAD_FOLDER"])
+    assert len(files) == 1
+    assert files[0].endswith(".arrow")
+
+
+def test_evicted_changes_survive_reload(client, upload, working_file):
+    upload(client)
+    client.post("/apply-numerical-rounding", json={"selections": {"Value": "whole"}})
+    filepath = working_file(client)
+
+    # Write the change back and drop it from memory, as eviction would
+    frame_cache.flush(filepath)
+    frame_cache.discard(filepath)
+
+    df = read_working_file(filepath)
+    assert df.attrs["rounding_precision"] == {"Value": "whole"}
+    assert df["Value"].dtype == float
+
+    response = client.get("/download-file")
+    assert b"Name,Category,Value,Date" in response.data
@@ -0,0 +1,228 @@
+import os
+import pandas as pd
+import pyarrow as pa
+
+# Working copies are kept as uncompressed Arrow IPC (Feather v2) files so they
+# can be memory-mapped and keep their dtypes and df.attrs between steps
+WORKING_EXTENSION = '.arrow'
+
+# Largest record batch written, so the file can be read back a batch at a time
+BATCH_ROWS = 65536
+
+# Inferred types of object columns Arrow cannot store as a single type
+MIXED_TYPES = {'mixed', 'mixed-integer'}
+
+
+def working_filename(upload_filename):
+    """Name of the working file kept for an uploaded CSV"""
+    return os.path.splitext(upload_filename)[0] + WORKING_EXTENSION
+
+
+def arrow_compatible(df):
+    """Store mixed-type object columns, and categories of mixed-type labels, as text, the same way a CSV round trip would"""
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in MIXED_TYPES:
+            df[column] = series.where(series.isna(), series.astype(str))
+        elif (isinstance(series.dtype, pd.CategoricalDtype)
+              and pd.api.types.infer_dtype(series.cat.categories, skipna=True) in MIXED_TYPES):
+            # e.g. a label remapped to a number, labels 5 and '5' becoming one category
+            values = series.astype(object)
+            df[column] = values.where(values.isna(), values.astype(str)).astype('category')
+    return df
+
+
+def write_working_file(filepath, df):
+    """Write df to filepath, replacing the previous version in one step"""
+    table = pa.Table.from_pandas(arrow_compatible(df.copy(deep=False)), preserve_index=False)
+    temp_path = filepath + '.tmp'
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=BATCH_ROWS)
+    os.replace(temp_path, filepath)
+
+
+def file_version(filepath):
+    """Identity of the version of a working file now published at filepath, or None.
+
+    Every write replaces the file with a new one (a new inode), so this
+    changes whenever any process publishes a new version.
+    """
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def working_schema(filepath):
+    """Column names and types of a working file, read without touching its data"""
+    return pa.ipc.open_file(pa.memory_map(filepath, 'r')).schema
+
+
+def working_row_count(filepath):
+    reader = pa.ipc.open_file(pa.memory_map(filepath, 'r'))
+    return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def read_working_file(filepath):
+    """Memory-map a working file and return it as a dataframe"""
+    source = pa.memory_map(filepath, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def iter_working_file(filepath, chunk_rows, columns=None):
+    """Yield a working file, or some of its columns, as dataframes of at most chunk_rows rows each"""
+    reader = pa.ipc.open_file(pa.memory_map(filepath, 'r'))
+    if reader.num_record_batches == 0:
+        # Still yield the columns so a header can be written
+        table = reader.schema.empty_table()
+        yield (table if columns is None else table.select(columns)).to_pandas()
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if columns is not None:
+            batch = batch.select(columns)
+        for offset in range(0, batch.num_rows, chunk_rows):
+            piece = batch.slice(offset, chunk_rows)
+            yield pa.Table.from_batches([piece], schema=batch.schema).to_pandas()
+
+
+def read_working_columns(filepath, columns, offset=0, limit=None):
+    """Some columns, and optionally a window of rows, of a working file.
+
+    Only the values asked for are converted to pandas; the rest of the
+    memory-mapped file is never read.
+    """
+    table = pa.ipc.open_file(pa.memory_map(filepath, 'r')).read_all()
+    if offset or limit is not None:
+        table = table.slice(offset, limit)
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def read_working_rows(filepath, positions):
+    """The rows of a working file at the given positions, converting only those to pandas"""
+    table = pa.ipc.open_file(pa.memory_map(filepath, 'r')).read_all()
+    return table.take(pa.array(positions, type=pa.int64())).to_pandas()
+
+
+class SchemaMismatch(Exception):
+    """Raised when a chunk has a column of a type the working file being written cannot hold"""
+
+    def __init__(self, types):
+        super().__init__(f'Columns changed type between chunks: {", ".join(types)}')
+        # Column name -> Arrow type able to hold every chunk seen so far
+        self.types = types
+
+
+def is_text_type(arrow_type):
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def is_number_type(arrow_type):
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def castable(arrow_type, target):
+    """Whether values of arrow_type can be cast to target without changing any of them"""
+    if pa.types.is_null(arrow_type):
+        return True
+    if is_text_type(arrow_type) and is_text_type(target):
+        return True
+    return pa.types.is_integer(arrow_type) and pa.types.is_floating(target)
+
+
+def wider_type(current, new):
+    """Type a column takes when chunks disagree, the same way ingest's merge_dtypes widens them"""
+    if pa.types.is_null(current):
+        return new
+    if is_number_type(current) and is_number_type(new):
+        return pa.float64()
+    # Anything else that disagrees between chunks is kept as text
+    return pa.string()
+
+
+def conform_chunk(df, types):
+    """Convert columns in pandas to text or floats the file has settled on, as a CSV round trip would"""
+    for column, arrow_type in types.items():
+        series = df[column]
+        if is_text_type(arrow_type):
+            df[column] = series.where(series.isna(), series.astype(str)).astype(object)
+        elif pa.types.is_floating(arrow_type):
+            df[column] = series.astype('float64')
+    return df
+
+
+class WorkingFileWriter:
+    """Writes a working file one dataframe chunk at a time, replacing filepath on commit().
+
+    The first chunk settles the type of each column, unless types says
+    otherwise; columns with no values in it take their type from fallback.
+    Later chunks are cast to those types where no value changes, otherwise
+    write() raises SchemaMismatch with the wider types to start over with.
+    """
+
+    def __init__(self, filepath, types=None, fallback=None):
+        self.filepath = filepath
+        self.temp_path = filepath + '.tmp'
+        self.types = dict(types or {})
+        self.fallback = dict(fallback or {})
+        self.schema = None
+        self._sink = None
+        self._writer = None
+
+    def write(self, df):
+        """Append a chunk, returning it as it will read back from the file"""
+        df = conform_chunk(arrow_compatible(df.copy(deep=False)), self.types)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            self.open(table.schema)
+        columns = []
+        wider = {}
+        changed = False
+        for field, column in zip(self.schema, table.columns):
+            if column.type == field.type:
+                columns.append(column)
+            elif castable(column.type, field.type):
+                columns.append(column.cast(field.type))
+                changed = True
+            else:
+                wider[field.name] = wider_type(field.type, column.type)
+        if wider:
+            raise SchemaMismatch(wider)
+        table = pa.Table.from_arrays(columns, schema=self.schema)
+        self._writer.write_table(table, max_chunksize=BATCH_ROWS)
+        return table.to_pandas() if changed else df
+
+    def open(self, schema):
+        fields = []
+        for field in schema:
+            arrow_type = self.types.get(field.name, field.type)
+            if pa.types.is_null(arrow_type):
+                arrow_type = self.fallback.get(field.name, arrow_type)
+            fields.append(pa.field(field.name, arrow_type))
+        self.schema = pa.schema(fields, metadata=schema.metadata)
+        self._sink = pa.OSFile(self.temp_path, 'wb')
+        # Categorical columns may gain categories from one chunk to the next
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        self._writer = pa.ipc.new_file(self._sink, self.schema, options=options)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def commit(self):
+        """Replace the working file with what was written, in one step"""
+        self.close()
+        os.replace(self.temp_path, self.filepath)
+
+    def abort(self):
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)